@@ -0,0 +1,321 @@
+# -*- coding:utf-8 -*-
+
+
+"""
+This script benchmarks the different MVNX parsing and conversion paths on
+synthetic captures of increasing length (see ``mvnx_synth.py``). Usage
+example (1, 5 and 30 minutes at 60 fps)::
+
+  python benchmark_mvnx.py -w /tmp/mvnx_bench -d 60 300 1800 -R /tmp/mvnx_bench/results
+
+Every (path, duration) pair runs in a freshly spawned process, so that peak
+memory measurements (``ru_maxrss``) don't carry over from previous runs and
+no parser state is shared. For each run, the wall time, peak RSS, baseline
+RSS (right after the imports) and throughput in frames per second are
+recorded, and the results are saved as CSV and JSON. Benchmarks that need
+some preparation (e.g. ``cache_load`` needs a cache) run a setup first, in
+its own process and outside of the measurements. If a run dies (e.g. killed
+by OOM), its exit code is reported as error. Generated files are kept in the
+working directory and reused in later runs.
+
+Check the -h flag for help.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import resource
+import multiprocessing as mp
+from queue import Empty
+from argparse import ArgumentParser
+#
+from mvnx import Mvnx
+from mvnx_cache import MvnxCache
+from mvnx_to_csv import MvnxToTabular
+from mvnx_synth import write_synthetic_mvnx
+
+
+__author__ = "Andres FR"
+
+
+###############################################################################
+### BENCHMARKS
+###############################################################################
+# each benchmark takes (mvnx_path, work_dir) and returns the number of
+# normal frames it processed
+def bench_tree_dicts(mvnx_path, work_dir):
+    """
+    """
+    m = Mvnx(mvnx_path)
+    return len(m.extract_frame_info()[2])
+
+
+def bench_stream_dicts(mvnx_path, work_dir):
+    """
+    """
+    m = Mvnx(mvnx_path, streaming=True)
+    return len(m.extract_frame_info()[2])
+
+
+def bench_tree_columnar(mvnx_path, work_dir):
+    """
+    """
+    m = Mvnx(mvnx_path)
+    return len(m.extract_frame_info(columnar=True)[2]["index"])
+
+
+def bench_stream_columnar(mvnx_path, work_dir):
+    """
+    """
+    m = Mvnx(mvnx_path, streaming=True)
+    return len(m.extract_frame_info(columnar=True)[2]["index"])
+
+
+def bench_stream_position(mvnx_path, work_dir):
+    """
+    Streaming columnar extraction of a single field.
+    """
+    m = Mvnx(mvnx_path, streaming=True)
+    return len(m.extract_frame_info(columnar=True,
+                                    fields=["position"])[2]["index"])
+
+
+def bench_cache_build(mvnx_path, work_dir):
+    """
+    """
+    cache_dir = os.path.join(work_dir, "cache")
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    m = Mvnx(mvnx_path, cache=MvnxCache(cache_dir, max_bytes=None))
+    return len(m.extract_frame_info(columnar=True)[2]["index"])
+
+
+def bench_cache_load(mvnx_path, work_dir):
+    """
+    Loads from the cache built by ``setup_cache_load``, and touches all
+    arrays so they are actually read from disk.
+    """
+    cache = MvnxCache(os.path.join(work_dir, "cache"), max_bytes=None)
+    assert cache.is_valid(mvnx_path), \
+        "No cache entry for %s: run setup_cache_load first!" % mvnx_path
+    m = Mvnx(mvnx_path, cache=cache)
+    arrays = m.extract_frame_info(columnar=True)[2]
+    for v in arrays.values():
+        v.sum()
+    return len(arrays["index"])
+
+
+def bench_tabular(mvnx_path, work_dir):
+    """
+    Full conversion into dataframes, saved as CSV.
+    """
+    out_dir = os.path.join(work_dir, "tabular")
+    os.makedirs(out_dir, exist_ok=True)
+    m = Mvnx(mvnx_path, streaming=True)
+    processor = MvnxToTabular(m)
+    for df_name, df in processor(None).items():
+        df.to_csv(os.path.join(out_dir, df_name + ".csv"))
+    return processor.n_frames
+
+
+def bench_export(mvnx_path, work_dir):
+    """
+    """
+    m = Mvnx(mvnx_path, streaming=True)
+    m.export(os.path.join(work_dir, "export.mvnx"))
+    return len(m.get_frame_index()["index"]) - 3
+
+
+BENCHMARKS = {"tree_dicts": bench_tree_dicts,
+              "stream_dicts": bench_stream_dicts,
+              "tree_columnar": bench_tree_columnar,
+              "stream_columnar": bench_stream_columnar,
+              "stream_position": bench_stream_position,
+              "cache_build": bench_cache_build,
+              "cache_load": bench_cache_load,
+              "tabular": bench_tabular,
+              "export": bench_export}
+
+
+# some benchmarks need preparation that shouldn't be measured. Setups take
+# the same arguments as the benchmarks, and run in their own process
+def setup_cache_load(mvnx_path, work_dir):
+    """
+    Builds the cache entry read by ``bench_cache_load``, unless it exists
+    (e.g. built by ``bench_cache_build``).
+    """
+    cache = MvnxCache(os.path.join(work_dir, "cache"), max_bytes=None)
+    if not cache.is_valid(mvnx_path):
+        Mvnx(mvnx_path, cache=cache)
+
+
+BENCHMARK_SETUPS = {"cache_load": setup_cache_load}
+
+
+###############################################################################
+### HELPERS
+###############################################################################
+# how often the benchmark process is checked while waiting for its result
+POLL_SECONDS = 1
+
+
+def max_rss_bytes():
+    """
+    :returns: The peak resident set size of this process, in bytes.
+    """
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def _run_in_child(func, mvnx_path, work_dir, queue):
+    """
+    Entry point of the spawned benchmark (or setup) process.
+    """
+    baseline = max_rss_bytes()
+    try:
+        t0 = time.perf_counter()
+        n_frames = func(mvnx_path, work_dir)
+        seconds = time.perf_counter() - t0
+        queue.put({"n_frames": n_frames, "seconds": seconds,
+                   "peak_rss_bytes": max_rss_bytes(),
+                   "baseline_rss_bytes": baseline, "error": None})
+    except Exception as e:
+        queue.put({"error": "%s: %s" % (type(e).__name__, e)})
+
+
+def _run_in_process(func, mvnx_path, work_dir, timeout=None):
+    """
+    Runs ``_run_in_child`` in a freshly spawned process, and waits for its
+    result. The process is polled, so that if it dies without a result (e.g.
+    killed by OOM or a segfault) this returns instead of blocking forever.
+
+    :returns: The result dict of ``_run_in_child``, or a dict with just the
+      error if the process died or timed out.
+    """
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_run_in_child,
+                       args=(func, mvnx_path, work_dir, queue))
+    proc.start()
+    t0 = time.time()
+    result = None
+    while result is None:
+        try:
+            result = queue.get(timeout=POLL_SECONDS)
+        except Empty:
+            if not proc.is_alive():
+                # the result may have arrived right before the exit
+                try:
+                    result = queue.get(timeout=POLL_SECONDS)
+                except Empty:
+                    result = {"error": "exit code %s" % proc.exitcode}
+            elif timeout is not None and time.time() - t0 > timeout:
+                proc.kill()
+                result = {"error": "timeout after %s seconds" % timeout}
+    proc.join()
+    return result
+
+
+def run_benchmark(bench_name, mvnx_path, work_dir, timeout=None):
+    """
+    Runs the given benchmark in a freshly spawned process, after its setup
+    (if any, see ``BENCHMARK_SETUPS``) in another one.
+
+    :returns: A dict with the measurements (see this module's docstring).
+    """
+    result = None
+    if bench_name in BENCHMARK_SETUPS:
+        setup = _run_in_process(BENCHMARK_SETUPS[bench_name], mvnx_path,
+                                work_dir, timeout)
+        if setup["error"] is not None:
+            result = {"error": "setup failed: " + setup["error"]}
+    if result is None:
+        result = _run_in_process(BENCHMARKS[bench_name], mvnx_path,
+                                 work_dir, timeout)
+    if result["error"] is None:
+        result["frames_per_second"] = result["n_frames"] / result["seconds"]
+    result.update({"benchmark": bench_name,
+                   "mvnx": os.path.basename(mvnx_path),
+                   "mvnx_bytes": os.path.getsize(mvnx_path)})
+    return result
+
+
+def save_results(results, out_prefix):
+    """
+    Saves the given list of result dicts to ``<out_prefix>.json`` and
+    ``<out_prefix>.csv``.
+    """
+    columns = ["benchmark", "mvnx", "mvnx_bytes", "n_frames", "seconds",
+               "frames_per_second", "peak_rss_bytes", "baseline_rss_bytes",
+               "error"]
+    with open(out_prefix + ".json", "w") as f:
+        json.dump(results, f, indent=2)
+    with open(out_prefix + ".csv", "w") as f:
+        f.write(",".join(columns) + "\n")
+        for r in results:
+            f.write(",".join("" if r.get(c) is None else str(r[c]).replace(
+                ",", ";") for c in columns) + "\n")
+
+
+# ###########################################################################
+# # MAIN ROUTINE
+# ###########################################################################
+def main():
+    """
+    """
+    parser = ArgumentParser()
+    parser.add_argument("-w", "--work_dir", type=str, required=True,
+                        help="Directory for the generated MVNX files and " +
+                        "benchmark outputs")
+    parser.add_argument("-d", "--durations", type=float, nargs="+",
+                        default=[60, 300],
+                        help="Durations of the synthetic captures, in seconds")
+    parser.add_argument("--fps", type=int, default=60,
+                        help="Frames per second of the synthetic captures")
+    parser.add_argument("-s", "--segments", type=int, default=23,
+                        help="Number of segments")
+    parser.add_argument("-n", "--sensors", type=int, default=17,
+                        help="Number of sensors")
+    parser.add_argument("-b", "--benchmarks", type=str, nargs="+",
+                        default=list(BENCHMARKS),
+                        help="Benchmarks to run, from " +
+                        str(list(BENCHMARKS)))
+    parser.add_argument("-t", "--timeout", type=float, default=None,
+                        help="Maximum seconds per run")
+    parser.add_argument("-R", "--results", type=str, default=None,
+                        help="Output path prefix for the results. Default: " +
+                        "<work_dir>/benchmark_results")
+    args = parser.parse_args()
+
+    assert all(b in BENCHMARKS for b in args.benchmarks), \
+        f"Error! allowed benchmarks: {list(BENCHMARKS)}"
+    os.makedirs(args.work_dir, exist_ok=True)
+    results_prefix = args.results or os.path.join(args.work_dir,
+                                                  "benchmark_results")
+    results = []
+    for duration in args.durations:
+        mvnx_path = os.path.join(
+            args.work_dir, "synth_%gs_%dfps_%dseg_%dsens.mvnx" % (
+                duration, args.fps, args.segments, args.sensors))
+        if not os.path.isfile(mvnx_path):
+            print("generating", mvnx_path)
+            write_synthetic_mvnx(mvnx_path, duration, args.fps,
+                                 args.segments, args.sensors)
+        for bench_name in args.benchmarks:
+            r = run_benchmark(bench_name, mvnx_path, args.work_dir,
+                              args.timeout)
+            results.append(r)
+            if r["error"] is None:
+                print("%-16s %8gs: %8.2fs %10.0f frames/s %8.1f MB peak" % (
+                    bench_name, duration, r["seconds"],
+                    r["frames_per_second"], r["peak_rss_bytes"] / 1024 ** 2))
+            else:
+                print("%-16s %8gs: %s" % (bench_name, duration, r["error"]))
+            save_results(results, results_prefix)
+    print("saved results to", results_prefix + ".{csv,json}")
+
+
+if __name__ == "__main__":
+    main()
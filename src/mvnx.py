@@ -17,6 +17,17 @@ The official explanation can be found in section 14.4 of the
 __author__ = "Andres FR"
 
 
+import io
+import os
+import re
+import copy
+import mmap
+import datetime
+import warnings
+import itertools
+#
+import pytz
+import numpy as np
 from lxml import etree, objectify  # https://lxml.de/validation.html
 
 
@@ -33,6 +44,48 @@ KNOWN_FLOAT_VEC_FIELDS = {"orientation", "position", "velocity",
                           "sensorMagneticField", "sensorOrientation",
                           "jointAngle", "jointAngleXZY", "jointAngleErgo",
                           "centerOfMass"}
+# boolean vectors, like the 4 flags of footContacts (heels and toes)
+KNOWN_BOOL_VEC_FIELDS = {"footContacts"}
+# per-frame attributes that are gathered as int vectors in columnar form
+FRAME_ATTR_FIELDS = ("index", "time", "ms")
+# number of values per entry (e.g. per segment) of the float vector fields.
+# Fields not listed here are 3-dimensional
+FLOAT_VEC_FIELD_WIDTHS = {"orientation": 4, "sensorOrientation": 4}
+# frames metadata entry with the number of entries of each vector field, e.g.
+# every frame is expected to have segmentCount * 4 orientation values.
+# For fields not listed here, the count is inferred from the first frame
+FIELD_ENTRY_COUNTS = {"orientation": "segmentCount",
+                      "position": "segmentCount",
+                      "velocity": "segmentCount",
+                      "acceleration": "segmentCount",
+                      "angularVelocity": "segmentCount",
+                      "angularAcceleration": "segmentCount",
+                      "sensorFreeAcceleration": "sensorCount",
+                      "sensorMagneticField": "sensorCount",
+                      "sensorOrientation": "sensorCount",
+                      "jointAngle": "jointCount",
+                      "jointAngleXZY": "jointCount"}
+# number of frames whose texts are joined and decoded at once, per field
+FRAME_BLOCK_SIZE = 4096
+# regular expressions for the byte scan of scan_frame_offsets
+FRAME_START_REGEX = re.compile(rb"<(?:\w+:)?frame\s[^>]*>")
+FRAMES_END_REGEX = re.compile(rb"</(?:\w+:)?frames\s*>")
+FRAME_ATTR_REGEX = re.compile(rb'\s(index|time|ms)\s*=\s*"([^"]*)"')
+SECURITY_CODE_REGEX = re.compile(
+    rb"<(?:\w+:)?securityCode\b[^>]*?(?:/>|>.*?</(?:\w+:)?securityCode\s*>)",
+    re.S)
+# order of the frame children, as required by the MVNX schema
+FRAME_CHILDREN_ORDER = ("orientation", "position", "velocity", "acceleration",
+                        "angularVelocity", "angularAcceleration",
+                        "footContacts", "sensorAcceleration",
+                        "sensorFreeAcceleration", "sensorAngularVelocity",
+                        "sensorMagneticField", "sensorOrientation",
+                        "jointAngle", "jointAngleXZY", "jointAngleErgo",
+                        "jointAngleErgoXZY", "centerOfMass", "marker")
+# format of the float values when exporting columnar frames. It matches the
+# MVNX files, but note that float32 arrays don't have enough precision to
+# reproduce the original values: extract with dtype=np.float64 for that
+EXPORT_FLOAT_FMT = "%f"
 
 
 # #############################################################################
@@ -59,6 +112,127 @@ def str_to_vec(x):
         return x
 
 
+def bulk_str_to_array(texts, frame_shape, dtype=np.float32, frame_ids=None,
+                      field="vector"):
+    """
+    Bulk counterpart of ``str_to_vec``: joins the given texts (e.g. the text
+    of the ``<position>`` node of many frames) and decodes them with a single
+    ``np.fromstring`` call.
+
+    :param texts: List of strings, one per frame, each one expected to have
+      ``prod(frame_shape)`` whitespace-separated numbers.
+    :param frame_shape: Shape of the values of a single frame, e.g.
+      ``(segmentCount, 3)``.
+    :param frame_ids: Optional list with one identifier per text (e.g. the
+      frame ``index``), used to report invalid texts. Defaults to positions.
+    :param str field: Field name, used to report invalid texts.
+    :returns: An array of shape ``(len(texts), *frame_shape)``.
+    :raises ValueError: If the texts don't have the expected number of
+      values. The message lists the identifiers of the offending frames.
+    """
+    per_frame = int(np.prod(frame_shape))
+    with warnings.catch_warnings():
+        # older numpy versions only warn on unparseable data
+        warnings.simplefilter("error", DeprecationWarning)
+        try:
+            flat = np.fromstring(" ".join(texts), dtype=dtype, sep=" ")
+        except (ValueError, DeprecationWarning):
+            flat = None
+    if flat is not None and flat.size == len(texts) * per_frame:
+        return flat.reshape((len(texts),) + tuple(frame_shape))
+    # error: find the culprits. Note that this only runs on failure
+    if frame_ids is None:
+        frame_ids = range(len(texts))
+    bad = [fid for fid, t in zip(frame_ids, texts)
+           if len(t.split()) != per_frame]
+    if not bad:
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", DeprecationWarning)
+            for fid, t in zip(frame_ids, texts):
+                try:
+                    np.fromstring(t, dtype=dtype, sep=" ")
+                except (ValueError, DeprecationWarning):
+                    bad.append(fid)
+    raise ValueError("Invalid %s in frames %s: expected %d numbers each" %
+                     (field, bad, per_frame))
+
+
+def frame_to_dict(frame, fields=None):
+    """
+    :param frame: A ``<frame>`` XML node (objectified or plain ``etree``).
+    :param fields: If given, only children with these names are included.
+    :returns: A dict with the frame attributes and the frame children, the
+      latter indexed by their (namespace-free) tag name. This is equivalent to
+      ``{**frame.__dict__, **frame.attrib}`` for objectified nodes, but works
+      also for the plain nodes yielded by ``iterparse_frames``.
+    """
+    children = {etree.QName(ch).localname: ch for ch in frame.iterchildren()}
+    if fields is not None:
+        children = {k: v for k, v in children.items() if k in fields}
+    return {**children, **frame.attrib}
+
+
+def iterparse_frames(mvnx_path, schema=None, fields=None):
+    """
+    Streams the ``<frame>`` nodes of the given MVNX file one by one, using
+    ``lxml.etree.iterparse``. Once the consumer requests the next frame, the
+    previous one is cleared and removed from the (partial) tree, so the
+    memory footprint stays bounded regardless of the file length.
+
+    :param schema: Optional ``etree.XMLSchema``. If given, the document is
+      validated while being parsed. Note that libxml2 only reports schema
+      errors at the end of the document (and without line numbers), so the
+      frames of an invalid file may have been yielded before the exception
+      is raised. See ``validate_xml.stream_validate`` to locate the errors.
+    :param fields: If given, children of each frame whose names aren't in
+      this collection are discarded before the frame is yielded.
+    :returns: A generator of ``<frame>`` nodes, in file order.
+    """
+    context = etree.iterparse(mvnx_path, events=("end",), tag="{*}frame",
+                              remove_comments=True, remove_pis=True,
+                              huge_tree=True, schema=schema)
+    for _, frame in context:
+        if fields is not None:
+            for ch in frame.getchildren():
+                if etree.QName(ch).localname not in fields:
+                    frame.remove(ch)
+        yield frame
+        # free processed frame, and the (already empty) preceding ones
+        frame.clear()
+        while frame.getprevious() is not None:
+            del frame.getparent()[0]
+    del context
+
+
+def scan_frame_offsets(mvnx_path):
+    """
+    Scans the bytes of the given MVNX file (memory-mapped) for ``<frame>``
+    opening tags, without parsing the XML.
+
+    :returns: A dict of int64 arrays, with one entry per frame (config frames
+      included) in file order: ``index``, ``time`` and ``ms`` hold the frame
+      attributes (-1 if absent), and ``offset`` holds the byte position of
+      each ``<frame>`` tag plus a final entry with the position of
+      ``</frames>``. Therefore, frames ``i`` to ``j-1`` are contained in the
+      byte range ``[offset[i], offset[j])``.
+    """
+    offsets = []
+    attrs = {k: [] for k in FRAME_ATTR_FIELDS}
+    with open(mvnx_path, "rb") as f, mmap.mmap(
+            f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for m in FRAME_START_REGEX.finditer(mm):
+            offsets.append(m.start())
+            tag_attrs = dict(FRAME_ATTR_REGEX.findall(m.group()))
+            for k, v in attrs.items():
+                v.append(int(tag_attrs.get(k.encode(), -1)))
+        end = FRAMES_END_REGEX.search(mm, offsets[-1] if offsets else 0)
+        assert end is not None, "No </frames> found in MVNX file?"
+        offsets.append(end.start())
+    result = {k: np.array(v, dtype=np.int64) for k, v in attrs.items()}
+    result["offset"] = np.array(offsets, dtype=np.int64)
+    return result
+
+
 def process_dict(d, str_fields, int_fields, fvec_fields):
     """
     :returns: a copy of the given dict where the values (expected strings)
@@ -92,63 +266,410 @@ class Mvnx:
     """
     def __init__(self, mvnx_path, mvnx_schema_path=None,
                  str_fields=KNOWN_STR_FIELDS, int_fields=KNOWN_INT_FIELDS,
-                 float_vec_fields=KNOWN_FLOAT_VEC_FIELDS):
+                 float_vec_fields=KNOWN_FLOAT_VEC_FIELDS, streaming=False,
+                 cache=None):
         """
         :param str mvnx_path: a valid path pointing to the XML file to load
         :param str mvnx_schema_path: (optional): if given, the given MVNX will
           be validated against this XML schema definition.
         :param collection fields: List of strings with field names that are
           converted to the specified type when calling ``extract_frame_info``.
+        :param bool streaming: If false, the whole MVNX tree is loaded into
+          ``self.mvnx``. If true, ``self.mvnx`` holds only the header (i.e.
+          everything but the ``<frame>`` nodes), and the frames are streamed
+          from disk via ``iterparse_frames`` each time they are extracted. In
+          this case, the schema validation (if any) happens during extraction.
+        :param cache: Optional ``mvnx_cache.MvnxCache``. If given, this object
+          works in streaming mode, and the first time a file is loaded, its
+          columnar frame arrays (see ``extract_frame_arrays``), config frames
+          and skeleton (see ``extract_skeleton``) are written to the cache.
+          Later loads of the unchanged file just read the header and
+          memory-map the arrays, skipping the XML frames and the validation.
         """
         self.mvnx_path = mvnx_path
-        #
-        mvnx = etree.parse(mvnx_path, etree.ETCompatXMLParser())
-        # if a schema is given, load it and validate mvn
+        self.streaming = streaming or (cache is not None)
+        self.cache = cache
+        # if a schema is given, load it
+        self.schema = None
         if mvnx_schema_path is not None:
             self.schema = etree.XMLSchema(file=mvnx_schema_path)
-            self.schema.assertValid(mvnx)
-        #
-        self.mvnx = objectify.fromstring(etree.tostring(mvnx))
         #
         self.str_fields = str_fields
         self.int_fields = int_fields
         self.fvec_fields = float_vec_fields
+        #
+        self._cached_arrays = None
+        self._cached_config_frames = None
+        self._cached_skeleton = None
+        self._frame_index = None
+        if cache is not None:
+            if not self._load_cache():
+                self._build_cache()
+        elif streaming:
+            self.mvnx = self._parse_header(mvnx_path)
+        else:
+            # a single objectify parse, with the same cleanup as the
+            # ETCompatXMLParser (no comments, no processing instructions)
+            parser = objectify.makeparser(remove_comments=True,
+                                          remove_pis=True, huge_tree=True)
+            self.mvnx = objectify.parse(mvnx_path, parser).getroot()
+            if self.schema is not None:
+                self.schema.assertValid(self.mvnx)
+
+    @staticmethod
+    def _parse_header(mvnx_path):
+        """
+        Parses the given MVNX file until the ``<frames>`` node is reached.
+
+        :returns: An objectified tree with all the contents before the
+          ``<frames>`` node, plus the (childless) ``<frames>`` node with its
+          attributes.
+        """
+        context = etree.iterparse(mvnx_path, events=("start",),
+                                  remove_comments=True, remove_pis=True,
+                                  huge_tree=True)
+        frames = None
+        for _, elt in context:
+            if etree.QName(elt).localname == "frames":
+                frames = elt
+                break
+        assert frames is not None, "No <frames> node found in MVNX file?"
+        # iterparse reads in chunks, so some frames may be already there
+        del frames[:]
+        frames.text = None
+        root = frames.getroottree().getroot()
+        del context
+        # the <securityCode> node comes after the frames: fetch from the end
+        tail_size = 65536
+        with open(mvnx_path, "rb") as f:
+            f.seek(max(0, os.path.getsize(mvnx_path) - tail_size))
+            matches = SECURITY_CODE_REGEX.findall(f.read())
+        if matches:
+            ns = etree.QName(root).namespace
+            opening = b"<x>" if ns is None else (
+                b'<x xmlns="%s">' % ns.encode("utf-8"))
+            root.append(etree.fromstring(opening + matches[-1] + b"</x>")[0])
+        return objectify.fromstring(etree.tostring(root))
+
+    def _load_cache(self):
+        """
+        Loads header, config frames, frame arrays and skeleton from
+        ``self.cache``, if it has a valid entry for this MVNX file.
+
+        :returns: True if loaded, False otherwise.
+        """
+        loaded = self.cache.load(self.mvnx_path)
+        if loaded is None:
+            return False
+        arrays, blobs, extras = loaded
+        self.mvnx = objectify.fromstring(blobs["header.xml"])
+        self._cached_config_frames = objectify.fromstring(
+            blobs["config_frames.xml"])
+        self._cached_arrays = {k[len("frames."):]: v
+                               for k, v in arrays.items()
+                               if k.startswith("frames.")}
+        self._cached_skeleton = extras["skeleton"]
+        frame_index = {k[len("frame_index."):]: v for k, v in arrays.items()
+                       if k.startswith("frame_index.")}
+        if frame_index:
+            self._frame_index = frame_index
+        print("[Mvnx] loaded from cache:", self.mvnx_path)
+        return True
+
+    def _build_cache(self):
+        """
+        Streams this MVNX file once, writes its header, config frames, frame
+        arrays and skeleton to ``self.cache`` and loads them back. Float
+        arrays are cached as float64, so they hold the same values as the
+        file (requesting float32 later on just casts them).
+        """
+        self.mvnx = self._parse_header(self.mvnx_path)
+        frames_elt = etree.Element(self.mvnx.subject.frames.tag)
+        #
+
+        def frames():
+            """Keeps a copy of the config frames while streaming"""
+            for f in self.iter_frames():
+                if len(frames_elt) < 3:
+                    frames_elt.append(copy.deepcopy(f))
+                yield f
+        _, _, arrays = self.extract_frame_arrays(
+            self.mvnx, self.str_fields, self.int_fields, self.fvec_fields,
+            frames(), np.float64)
+        joints, seg_detail, seg_names_sorted = self.extract_skeleton()
+        skeleton = {"joints": [(j[0], j[1], j[3]) for j in joints],
+                    "seg_detail": [(seg, pt, pos.tolist()) for (seg, pt), pos
+                                   in seg_detail.items()],
+                    "seg_names_sorted": seg_names_sorted}
+        #
+        self.cache.save(self.mvnx_path,
+                        {"frames." + k: v for k, v in arrays.items()},
+                        {"header.xml": etree.tostring(self.mvnx),
+                         "config_frames.xml": etree.tostring(frames_elt)},
+                        {"skeleton": skeleton})
+        print("[Mvnx] saved to cache:", self.mvnx_path)
+        assert self._load_cache(), "Cache entry not valid after saving?"
+
+    def get_frame_index(self):
+        """
+        :returns: The byte-offset index of all frames in this MVNX file, see
+          ``scan_frame_offsets``. The index is built on first call and kept
+          in memory. If this object has a cache, the index is also persisted
+          there, and reused by later objects with the same cache.
+        """
+        if self._frame_index is None:
+            self._frame_index = scan_frame_offsets(self.mvnx_path)
+            if self.cache is not None:
+                self.cache.update(self.mvnx_path, {
+                    "frame_index." + k: v
+                    for k, v in self._frame_index.items()})
+        return self._frame_index
+
+    def _frame_range_bounds(self, keys, start=None, stop=None):
+        """
+        :param keys: Sorted array with the key value of each normal frame.
+        :returns: The positions ``(i, j)`` such that ``keys[i:j]`` are the
+          keys in ``[start, stop)``. None means unbounded.
+        """
+        i = 0 if start is None else np.searchsorted(keys, start, "left")
+        j = len(keys) if stop is None else np.searchsorted(keys, stop, "left")
+        return int(i), int(max(i, j))
+
+    def _iter_frame_range(self, i, j, fields=None):
+        """
+        :returns: A generator with the 3 config frames followed by the normal
+          frames ``i`` to ``j-1``. In streaming mode, only the corresponding
+          byte ranges of the file are read and parsed. See ``iter_frames``
+          for the ``fields`` parameter.
+        """
+        if not self.streaming:
+            all_frames = self.mvnx.subject.frames.getchildren()
+            return itertools.chain(all_frames[:3], all_frames[3 + i:3 + j])
+        offsets = self.get_frame_index()["offset"]
+        with open(self.mvnx_path, "rb") as f:
+            f.seek(offsets[0])
+            config_bytes = f.read(offsets[3] - offsets[0])
+            f.seek(offsets[3 + i])
+            range_bytes = f.read(offsets[3 + j] - offsets[3 + i])
+        # wrap frames into a <frames> node with the namespace of the file
+        ns = etree.QName(self.mvnx).namespace
+        opening = b"<frames>" if ns is None else (
+            b'<frames xmlns="%s">' % ns.encode("utf-8"))
+        xml = opening + config_bytes + range_bytes + b"</frames>"
+        return iterparse_frames(io.BytesIO(xml), fields=fields)
 
-    def export(self, filepath, pretty_print=True, extra_comment=""):
+    def iter_frames(self, fields=None):
         """
-        Saves the current ``mvnx`` attribute to the given file path as XML and
-        adds the ``self.mvnx.attrib["pythonComment"]`` attribute with
-        a timestamp.
+        :param fields: If given, only frame children with these names are
+          kept, the rest are discarded while streaming.
+        :returns: A generator of ``<frame>`` nodes, streamed from
+          ``self.mvnx_path`` via ``iterparse_frames``. If the object has a
+          schema, the file is validated along the way.
         """
+        return iterparse_frames(self.mvnx_path, self.schema, fields)
+
+    def export(self, filepath, pretty_print=True, extra_comment="",
+               normal_frames=None, start=None, stop=None, key="index",
+               float_fmt=EXPORT_FLOAT_FMT):
+        """
+        Saves this MVNX to the given file path as XML and adds the
+        ``pythonComment`` attribute with a timestamp to the root node.
+        The file is written incrementally via ``etree.xmlfile``: the header
+        (segments, joints...) is copied from ``self.mvnx``, and the frames
+        are written one by one, so the whole document is never held in
+        memory (also in streaming mode).
+
+        :param normal_frames: Optional dict of arrays, like the ones returned
+          by ``extract_frame_info(columnar=True)``. If given, the normal
+          frames are written from these arrays (e.g. after editing them)
+          instead of copied from the source file. See ``arrays_to_frame``.
+        :param start: See ``extract_frame_info``. If start or stop are given,
+          only the normal frames in the range are written.
+        :param float_fmt: Format of float values written from arrays.
+        """
+        msg = "Exported from %s on %s. " % (
+            self.__class__.__name__, make_timestamp()) + extra_comment
+        root = self.mvnx
+        ns = etree.QName(root).namespace
+        nl = "\n" if pretty_print else ""
+        ranged = start is not None or stop is not None
+        # gather the config frames and the normal frame generator
+        config_frames = itertools.islice(self._iter_frame_range(0, 0), 3)
+        if normal_frames is not None:
+            i, j = self._frame_range_bounds(normal_frames[key], start, stop)
+            fmts = {k: " ".join([("%d" if v.dtype == bool else float_fmt)] *
+                                int(np.prod(v.shape[1:])))
+                    for k, v in normal_frames.items() if v.ndim > 1}
+            frames = (self.arrays_to_frame(normal_frames, n, ns, fmts)
+                      for n in range(i, j))
+        elif ranged:
+            keys = self.get_frame_index()[key][3:]
+            frames = itertools.islice(self._iter_frame_range(
+                *self._frame_range_bounds(keys, start, stop)), 3, None)
+        elif self.streaming:
+            frames = itertools.islice(self.iter_frames(), 3, None)
+        else:
+            frames = itertools.islice(root.subject.frames.iterchildren(),
+                                      3, None)
         #
-        with open(filepath, "w") as f:
-            msg = "Exported from %s on %s. " % (
-                self.__class__.__name__, make_timestamp()) + extra_comment
-            self.mvnx.attrib["pythonComment"] = msg
-            s = etree.tostring(self.mvnx,
-                               pretty_print=pretty_print).decode("utf-8")
-            f.write(s)
-            print("[Mvnx] exported to", filepath)
+        with etree.xmlfile(filepath, encoding="utf-8") as xf:
+            xf.write_declaration()
+            with xf.element(root.tag, {**root.attrib, "pythonComment": msg},
+                            nsmap=root.nsmap):
+                for ch in root.iterchildren():
+                    xf.write(nl)
+                    if etree.QName(ch).localname != "subject":
+                        xf.write(ch, with_tail=False)
+                        continue
+                    with xf.element(ch.tag, ch.attrib):
+                        for sch in ch.iterchildren():
+                            xf.write(nl)
+                            if etree.QName(sch).localname != "frames":
+                                xf.write(sch, with_tail=False,
+                                         pretty_print=pretty_print)
+                                continue
+                            with xf.element(sch.tag, sch.attrib):
+                                for f in itertools.chain(config_frames,
+                                                         frames):
+                                    xf.write(nl)
+                                    xf.write(f, with_tail=False)
+                                xf.write(nl)
+                        xf.write(nl)
+                xf.write(nl)
+        print("[Mvnx] exported to", filepath)
+
+    @staticmethod
+    def arrays_to_frame(normal_frames, n, ns=None, fmts=None):
+        """
+        Inverse of ``extract_frame_arrays`` for a single frame.
+
+        :param normal_frames: Dict of arrays as returned by
+          ``extract_frame_info(columnar=True)``.
+        :param int n: Position of the frame in the arrays.
+        :param str ns: Namespace of the created nodes.
+        :param dict fmts: Optional dict with the %-format string for the
+          whole text of each field, e.g. ``"%f %f %f"`` for a 3D vector.
+          Defaults to ``EXPORT_FLOAT_FMT`` per value.
+        :returns: A ``<frame>`` node of type ``normal``, with the fields in
+          ``normal_frames`` as children, sorted as ``FRAME_CHILDREN_ORDER``.
+        """
+        attrib = {k: str(normal_frames[k][n]) for k in FRAME_ATTR_FIELDS
+                  if k in normal_frames and normal_frames[k][n] >= 0}
+        attrib["type"] = "normal"
+        frame = etree.Element(etree.QName(ns, "frame"), attrib)
+        for k in FRAME_CHILDREN_ORDER:
+            if k not in normal_frames:
+                continue
+            vals = normal_frames[k][n].ravel()
+            if fmts is not None and k in fmts:
+                fmt = fmts[k]
+            else:
+                fmt = " ".join([("%d" if vals.dtype == bool else
+                                 EXPORT_FLOAT_FMT)] * len(vals))
+            etree.SubElement(frame, etree.QName(ns, k)).text = (
+                fmt % tuple(vals.tolist()))
+        return frame
 
     # EXTRACTORS: LIKE "GETTERS" BUT RETURN A MODIFIED COPY OF THE CONTENTS
-    def extract_frame_info(self):
+    def extract_frame_info(self, columnar=False, dtype=np.float32,
+                           start=None, stop=None, key="index", fields=None):
         """
+        :param bool columnar: If true, the normal frames are returned as a
+          dict of arrays instead of a list of dicts. See
+          ``extract_frame_arrays``.
+        :param dtype: Float type of the columnar arrays.
+        :param start: If given, only normal frames whose ``key`` attribute is
+          at least this are extracted.
+        :param stop: If given, only normal frames whose ``key`` attribute is
+          below this are extracted.
+        :param str key: One of ``index``, ``time``, ``ms``. If start or stop
+          are given, the byte-offset index (see ``get_frame_index``) is used
+          to locate the frames, and in streaming mode only the byte range of
+          the requested frames is parsed. The key is assumed to be sorted.
+        :param fields: If given, only frame children with these names (e.g.
+          ``["position"]``) are extracted, the rest aren't converted nor
+          kept. Frame attributes are always extracted.
         :returns: The tuple ``(frames_metadata, config_frames, normal_frames)``
         """
-        f_meta, config_f, normal_f = self.extract_frames(self.mvnx,
-                                                         self.str_fields,
-                                                         self.int_fields,
-                                                         self.fvec_fields)
+        assert key in FRAME_ATTR_FIELDS, \
+            "key must be one of %s" % str(FRAME_ATTR_FIELDS)
+        ranged = start is not None or stop is not None
+        if columnar and self._cached_arrays is not None:
+            f_meta, config_f, normal_f = self._extract_cached_frame_info(
+                dtype, fields)
+            if ranged:
+                i, j = self._frame_range_bounds(normal_f[key], start, stop)
+                normal_f = {k: v[i:j] for k, v in normal_f.items()}
+            return f_meta, config_f, normal_f
+        #
+        if ranged:
+            keys = self.get_frame_index()[key][3:]
+            frames = self._iter_frame_range(
+                *self._frame_range_bounds(keys, start, stop), fields=fields)
+        else:
+            frames = self.iter_frames(fields) if self.streaming else None
+        if columnar:
+            f_meta, config_f, normal_f = self.extract_frame_arrays(
+                self.mvnx, self.str_fields, self.int_fields, self.fvec_fields,
+                frames, dtype, fields)
+        else:
+            f_meta, config_f, normal_f = self.extract_frames(
+                self.mvnx, self.str_fields, self.int_fields, self.fvec_fields,
+                frames, fields)
         frames_metadata = f_meta
         config_frames = config_f
         normal_frames = normal_f
         #
         assert (frames_metadata["segmentCount"] ==
                 len(self.extract_segments())), "Inconsistent segmentCount?"
+        if columnar and "position" in normal_frames:
+            assert (normal_frames["position"].shape[1] ==
+                    frames_metadata["segmentCount"]), \
+                "Inconsistent segmentCount in frames?"
         return frames_metadata, config_frames, normal_frames
 
+    def iter_frame_arrays(self, chunk_size=FRAME_BLOCK_SIZE,
+                          dtype=np.float32, fields=None):
+        """
+        Chunked counterpart of ``extract_frame_info(columnar=True)``: the
+        normal frames are gathered into arrays ``chunk_size`` frames at a
+        time, so that (in streaming or cached mode) memory usage doesn't
+        depend on the length of the capture.
+
+        :returns: A generator of ``(frames_metadata, config_frames,
+          normal_frames)`` tuples like the ones returned by
+          ``extract_frame_info``, where ``normal_frames`` holds the arrays of
+          up to ``chunk_size`` consecutive normal frames.
+        """
+        assert chunk_size > 0, "chunk_size must be positive!"
+        if self._cached_arrays is not None:
+            f_meta, config_f, normal_f = self._extract_cached_frame_info(
+                None, fields)
+            for i in range(0, len(normal_f["index"]), chunk_size):
+                yield f_meta, config_f, {
+                    k: (v[i:i + chunk_size].astype(dtype)
+                        if v.dtype.kind == "f" else v[i:i + chunk_size])
+                    for k, v in normal_f.items()}
+            return
+        #
+        frames = (self.iter_frames(fields) if self.streaming
+                  else self.mvnx.subject.frames.iterchildren())
+        # config frames are copied, since streamed frames are cleared after
+        # being processed
+        config = [copy.deepcopy(f) for f in itertools.islice(frames, 3)]
+        while True:
+            chunk = itertools.chain(config,
+                                    itertools.islice(frames, chunk_size))
+            f_meta, config_f, normal_f = self.extract_frame_arrays(
+                self.mvnx, self.str_fields, self.int_fields, self.fvec_fields,
+                chunk, dtype, fields)
+            if len(normal_f["index"]) == 0:
+                break
+            yield f_meta, config_f, normal_f
+
     @staticmethod
-    def extract_frames(mvnx, str_fields, int_fields, fvec_fields):
+    def extract_frames(mvnx, str_fields, int_fields, fvec_fields,
+                       frames=None, fields=None):
         """
         The bulk of the MVNX file is the ``mvnx->subject->frames`` section.
         This function parses it and returns its information in a
@@ -157,6 +678,12 @@ class Mvnx:
         :param mvnx: An XML tree, expected to be in MVNX format
         :param collection fields: Collection of strings with field names that
           are converted to the specified type (fvec is a vector of floats).
+        :param frames: Optional iterable of ``<frame>`` nodes, e.g. the
+          generator returned by ``iterparse_frames``. If given, it is consumed
+          instead of the frames in ``mvnx``, which then only needs to provide
+          the ``<frames>`` attributes (like the header-only streaming tree).
+        :param fields: Optional collection of frame children names. If given,
+          other children are ignored (not converted nor included).
 
         :returns: a tuple ``(frames_metadata, config_frames, normal_frames)``
           where the metadata is a dict in the form ``{'segmentCount': 23,
@@ -168,15 +695,143 @@ class Mvnx:
         """
         frames_metadata = process_dict(mvnx.subject.frames.attrib,
                                        str_fields, int_fields, fvec_fields)
+        if frames is None:
+            frames = mvnx.subject.frames.iterchildren()
         # first 3 frames are config. types: "identity", "tpose", "tpose-isb"
-        all_frames = mvnx.subject.frames.getchildren()
         # rest of frames contain proper data. type: "normal"
-        config_frames = [process_dict({**f.__dict__, **f.attrib},
-                                      str_fields, int_fields, fvec_fields)
-                         for f in all_frames[:3]]
-        normal_frames = [process_dict({**f.__dict__, **f.attrib},
-                                      str_fields, int_fields, fvec_fields)
-                         for f in all_frames[3:]]
+        config_frames, normal_frames = [], []
+        for f in frames:
+            frm = process_dict(frame_to_dict(f, fields),
+                               str_fields, int_fields, fvec_fields)
+            if len(config_frames) < 3:
+                config_frames.append(frm)
+            else:
+                normal_frames.append(frm)
+        return frames_metadata, config_frames, normal_frames
+
+    def _extract_cached_frame_info(self, dtype=np.float32, fields=None):
+        """
+        Like ``extract_frame_info(columnar=True)``, but from the cache.
+        Arrays are memory-mapped and read-only, unless a ``dtype`` different
+        from the cached one is requested (in which case they are copied).
+        If ``dtype`` is None, arrays are returned as cached.
+        """
+        frames_metadata = process_dict(self.mvnx.subject.frames.attrib,
+                                       self.str_fields, self.int_fields,
+                                       self.fvec_fields)
+        config_frames = [process_dict(frame_to_dict(f, fields),
+                                      self.str_fields, self.int_fields,
+                                      self.fvec_fields)
+                         for f in self._cached_config_frames.iterchildren()]
+        normal_frames = {}
+        for k, v in self._cached_arrays.items():
+            if (fields is not None and k not in fields and
+                    k not in FRAME_ATTR_FIELDS):
+                continue
+            if (dtype is not None and v.dtype.kind == "f" and
+                    v.dtype != dtype):
+                v = v.astype(dtype)
+            normal_frames[k] = v
+        return frames_metadata, config_frames, normal_frames
+
+    @staticmethod
+    def _field_shape(field, text, frames_metadata):
+        """
+        :param text: Text of the field node in the first normal frame, used
+          if the number of entries isn't given by ``FIELD_ENTRY_COUNTS``.
+        :returns: The per-frame array shape of the given field, see
+          ``extract_frame_arrays``.
+        """
+        n_values = len(text.split()) if text is not None else 0
+        if field in KNOWN_BOOL_VEC_FIELDS:
+            return (n_values,)
+        width = FLOAT_VEC_FIELD_WIDTHS.get(field, 3)
+        count_key = FIELD_ENTRY_COUNTS.get(field)
+        if count_key in frames_metadata:
+            return (frames_metadata[count_key], width)
+        return (n_values // width, width)
+
+    @staticmethod
+    def extract_frame_arrays(mvnx, str_fields, int_fields, fvec_fields,
+                             frames=None, dtype=np.float32, fields=None):
+        """
+        Columnar counterpart of ``extract_frames``: instead of one dict per
+        normal frame, it gathers each field across all normal frames into a
+        single dense array, e.g. for a capture with ``N`` normal frames and
+        ``S`` segments:
+
+        * ``index``, ``time``, ``ms``: int64 arrays of shape ``(N,)``
+        * ``position``: array of shape ``(N, S, 3)``
+        * ``orientation``: array of shape ``(N, S, 4)``
+        * ``footContacts``: bool array of shape ``(N, 4)``
+
+        Float vector fields have shape ``(N, entries, width)``, where the
+        width is given by ``FLOAT_VEC_FIELD_WIDTHS`` and the number of entries
+        (segments, sensors, joints...) by ``FIELD_ENTRY_COUNTS``. Only the
+        ``fvec_fields`` present in the first normal frame are gathered and, if
+        ``fields`` is given, only the ones in it.
+
+        The texts of each field are decoded in blocks of ``FRAME_BLOCK_SIZE``
+        frames via ``bulk_str_to_array``, which raises a ``ValueError``
+        listing the frame indexes with a wrong number of values.
+
+        :returns: a tuple ``(frames_metadata, config_frames, normal_frames)``
+          like ``extract_frames``, but where ``normal_frames`` is a dict in the
+          form ``{field_name: array}``.
+        """
+        frames_metadata = process_dict(mvnx.subject.frames.attrib,
+                                       str_fields, int_fields, fvec_fields)
+        if frames is None:
+            frames = mvnx.subject.frames.iterchildren()
+        #
+        config_frames = []
+        attrs = {k: [] for k in FRAME_ATTR_FIELDS}
+        shapes = None  # per-frame shape of each gathered field
+        texts = None  # texts of the current block of frames, by field
+        blocks = None  # decoded blocks, by field
+        block_start = 0
+
+        def decode_block():
+            """Decodes the pending texts of every field in a single call"""
+            ids = attrs["index"][block_start:]
+            for k, v in texts.items():
+                vec_dtype = np.int8 if k in KNOWN_BOOL_VEC_FIELDS else dtype
+                blocks[k].append(bulk_str_to_array(v, shapes[k], vec_dtype,
+                                                   ids, k))
+                v.clear()
+        #
+        for f in frames:
+            # first 3 frames are config, see extract_frames
+            if len(config_frames) < 3:
+                config_frames.append(process_dict(frame_to_dict(f, fields),
+                                                  str_fields, int_fields,
+                                                  fvec_fields))
+                continue
+            children = frame_to_dict(f, fields)
+            if shapes is None:
+                shapes = {k: Mvnx._field_shape(k, ch.text, frames_metadata)
+                          for k, ch in children.items()
+                          if k in fvec_fields or k in KNOWN_BOOL_VEC_FIELDS}
+                texts = {k: [] for k in shapes}
+                blocks = {k: [] for k in shapes}
+            for k, v in attrs.items():
+                v.append(int(f.attrib.get(k, -1)))
+            for k, v in texts.items():
+                ch = children.get(k)
+                v.append("" if ch is None or ch.text is None else ch.text)
+            if len(attrs["index"]) - block_start >= FRAME_BLOCK_SIZE:
+                decode_block()
+                block_start = len(attrs["index"])
+        if texts is not None and len(attrs["index"]) > block_start:
+            decode_block()
+        #
+        normal_frames = {k: np.array(v, dtype=np.int64)
+                         for k, v in attrs.items()}
+        for k, v in (blocks or {}).items():
+            arr = v[0] if len(v) == 1 else np.concatenate(v)
+            if k in KNOWN_BOOL_VEC_FIELDS:
+                arr = arr.astype(bool)
+            normal_frames[k] = arr
         return frames_metadata, config_frames, normal_frames
 
     def extract_segments(self):
@@ -191,6 +846,53 @@ class Mvnx:
             "Segments aren't ordered by id?"
         return segments
 
+    def extract_sensors(self):
+        """
+        :returns: A list of the sensor labels in ``self.mvnx.subject.sensors``,
+          in file order (which is also the order of the sensor fields in the
+          frames). Empty if the MVNX has no sensors.
+        """
+        sensors = getattr(self.mvnx.subject, "sensors", None)
+        if sensors is None:
+            return []
+        return [ch.attrib["label"] for ch in sensors.iterchildren()]
+
+    def extract_skeleton(self):
+        """
+        :returns: A tuple ``(joints, seg_detail, seg_names_sorted)``, where
+          ``seg_detail`` is a dict in the form ``{(seg, point): xyz}`` with
+          the XYZ float32 array of every segment point, ``joints`` is a list
+          in the form ``[(label, connector1, xyz1, connector2, xyz2), ...]``
+          with connectors being strings like ``"Pelvis/jL5S1"``, and
+          ``seg_names_sorted`` is the list of segment names sorted by ID.
+        """
+        if self._cached_skeleton is not None:
+            sk = self._cached_skeleton
+            seg_detail = {(seg, pt): np.array(pos, dtype=np.float32)
+                          for seg, pt, pos in sk["seg_detail"]}
+            joints = [(lbl, c1, seg_detail[tuple(c1.split("/"))],
+                       c2, seg_detail[tuple(c2.split("/"))])
+                      for lbl, c1, c2 in sk["joints"]]
+            return joints, seg_detail, list(sk["seg_names_sorted"])
+        # Retrieve every segment keypoint with XYZ positions
+        segproc = lambda seg: np.fromstring(seg.pos_b.text, dtype=np.float32,
+                                            sep=" ")
+        seg_detail = {(s.attrib["label"], ch.attrib["label"]): segproc(ch)
+                      for s in self.mvnx.subject.segments.iterchildren()
+                      for ch in s.points.iterchildren()}
+        # Retrieve every joint as a relation of segment details
+        joints = [(j.attrib["label"],
+                   j.connector1.text,
+                   seg_detail[tuple(j.connector1.text.split("/"))],
+                   j.connector2.text,
+                   seg_detail[tuple(j.connector2.text.split("/"))])
+                  for j in self.mvnx.subject.joints.iterchildren()]
+        # Retrieve segment names sorted by ID
+        seg_names_sorted = [s.attrib["label"] for s in
+                            sorted(self.mvnx.subject.segments.iterchildren(),
+                                   key=lambda elt: int(elt.attrib["id"]))]
+        return joints, seg_detail, seg_names_sorted
+
     def extract_joints(self):
         """
         :returns: A tuple (X, Y). The element X is a list of the joint names
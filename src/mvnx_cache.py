@@ -0,0 +1,252 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+This module implements a persistent on-disk cache for the parsed contents of
+MVNX files, so that repeated loads of the same capture don't have to go
+through the XML again. Each cached MVNX file gets its own entry directory::
+
+  <cache_dir>/<sha1 of the absolute MVNX path>/
+    meta.json          # source size, mtime and content hash, plus JSON extras
+    header.xml         # small XML blobs, e.g. the MVNX header
+    frames.position.npy  # one .npy per array, loaded memory-mapped
+    ...
+
+An entry is valid as long as the source file has the same size and mtime
+it had when cached. If only the mtime changed, the content hash decides.
+Entries are rebuilt by the caller when invalid, and the least recently used
+ones are evicted when the cache grows above its size limit. Usage example::
+
+  cache = MvnxCache("/tmp/mvnx_cache", max_bytes=5 * 1024 ** 3)
+  m = Mvnx(MVNX_PATH, cache=cache)  # slow the first time only
+  frames_metadata, config_frames, arrays = m.extract_frame_info(columnar=True)
+"""
+
+
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+#
+import numpy as np
+
+
+__author__ = "Andres FR"
+
+
+# #############################################################################
+# ## GLOBALS
+# #############################################################################
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache",
+                                 "dance-mocap", "mvnx")
+DEFAULT_MAX_CACHE_BYTES = 20 * 1024 ** 3
+
+
+# #############################################################################
+# ## HELPERS
+# #############################################################################
+
+def file_hash(path, chunk_size=2 ** 24):
+    """
+    :returns: The SHA256 hex digest of the file contents, read in chunks.
+    """
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def dir_size(path):
+    """
+    :returns: The total size in bytes of the files directly inside ``path``.
+    """
+    return sum(e.stat().st_size for e in os.scandir(path) if e.is_file())
+
+
+# #############################################################################
+# ## CACHE CLASS
+# #############################################################################
+
+class MvnxCache:
+    """
+    Persistent cache of named NumPy arrays, XML blobs and JSON-serializable
+    extras for MVNX files. See this module's docstring for details.
+    """
+    META_NAME = "meta.json"
+    ARRAY_EXT = ".npy"
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR,
+                 max_bytes=DEFAULT_MAX_CACHE_BYTES):
+        """
+        :param str cache_dir: Directory holding the cache entries. Created if
+          it doesn't exist.
+        :param int max_bytes: After saving an entry, least recently used
+          entries are evicted until the cache takes at most this many bytes.
+          If None, nothing is evicted.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def entry_dir(self, mvnx_path):
+        """
+        :returns: The directory of the cache entry for the given MVNX path
+          (which may not exist).
+        """
+        key = hashlib.sha1(
+            os.path.abspath(mvnx_path).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, key)
+
+    @staticmethod
+    def _source_stats(mvnx_path):
+        """
+        """
+        st = os.stat(mvnx_path)
+        return st.st_size, st.st_mtime_ns
+
+    def _read_meta(self, entry):
+        """
+        """
+        try:
+            with open(os.path.join(entry, self.META_NAME), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, entry, meta):
+        """
+        """
+        with open(os.path.join(entry, self.META_NAME), "w") as f:
+            json.dump(meta, f)
+
+    def is_valid(self, mvnx_path):
+        """
+        Checks the cache entry for the given MVNX against the current file.
+        If the file has the same size but different mtime and its contents
+        didn't change (same hash), the entry is updated with the new mtime
+        and considered valid.
+
+        :returns: True if a valid entry exists, False otherwise.
+        """
+        entry = self.entry_dir(mvnx_path)
+        meta = self._read_meta(entry)
+        if meta is None:
+            return False
+        size, mtime = self._source_stats(mvnx_path)
+        if size != meta["size"]:
+            return False
+        if mtime != meta["mtime_ns"]:
+            if file_hash(mvnx_path) != meta["sha256"]:
+                return False
+            meta["mtime_ns"] = mtime
+            self._write_meta(entry, meta)
+        return True
+
+    def load(self, mvnx_path, mmap_mode="r"):
+        """
+        :returns: ``None`` if there is no valid entry for the given MVNX.
+          Otherwise, a tuple ``(arrays, blobs, extras)`` where ``arrays`` is a
+          dict of memory-mapped arrays by name, ``blobs`` a dict of bytes by
+          file name and ``extras`` the JSON-serializable dict given at
+          ``save``.
+        """
+        if not self.is_valid(mvnx_path):
+            return None
+        entry = self.entry_dir(mvnx_path)
+        arrays, blobs = {}, {}
+        for e in os.scandir(entry):
+            if e.name == self.META_NAME or e.name.startswith(".tmp_"):
+                continue
+            elif e.name.endswith(self.ARRAY_EXT):
+                name = e.name[:-len(self.ARRAY_EXT)]
+                arrays[name] = np.load(e.path, mmap_mode=mmap_mode)
+            else:
+                with open(e.path, "rb") as f:
+                    blobs[e.name] = f.read()
+        # mark entry as recently used
+        os.utime(os.path.join(entry, self.META_NAME))
+        return arrays, blobs, self._read_meta(entry)["extras"]
+
+    def save(self, mvnx_path, arrays, blobs=None, extras=None):
+        """
+        Writes (or replaces) the cache entry for the given MVNX file. The
+        entry is written into a temporary directory and then moved into
+        place, so readers never see a half-written entry.
+
+        :param dict arrays: Arrays by name, each one saved as ``.npy``.
+        :param dict blobs: Optional bytes by file name.
+        :param dict extras: Optional JSON-serializable dict.
+        """
+        size, mtime = self._source_stats(mvnx_path)
+        meta = {"source": os.path.abspath(mvnx_path), "size": size,
+                "mtime_ns": mtime, "sha256": file_hash(mvnx_path),
+                "extras": extras or {}}
+        entry = self.entry_dir(mvnx_path)
+        tmp = tempfile.mkdtemp(dir=self.cache_dir, prefix=".tmp_")
+        try:
+            for name, arr in arrays.items():
+                np.save(os.path.join(tmp, name + self.ARRAY_EXT), arr)
+            for name, b in (blobs or {}).items():
+                with open(os.path.join(tmp, name), "wb") as f:
+                    f.write(b)
+            self._write_meta(tmp, meta)
+            shutil.rmtree(entry, ignore_errors=True)
+            os.replace(tmp, entry)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        self.evict(keep=entry)
+
+    def update(self, mvnx_path, arrays):
+        """
+        Adds the given arrays to an existing, valid cache entry. Entries that
+        don't exist or are invalid are left untouched.
+
+        :returns: True if the arrays were added, False otherwise.
+        """
+        if not self.is_valid(mvnx_path):
+            return False
+        entry = self.entry_dir(mvnx_path)
+        for name, arr in arrays.items():
+            # write to a temp file first, so the entry is never corrupt
+            path = os.path.join(entry, name + self.ARRAY_EXT)
+            tmp_path = os.path.join(entry, ".tmp_" + name + self.ARRAY_EXT)
+            np.save(tmp_path, arr)
+            os.replace(tmp_path, path)
+        self.evict(keep=entry)
+        return True
+
+    def evict(self, keep=None):
+        """
+        Removes least recently used entries (by last ``load`` or ``save``)
+        until the cache takes at most ``self.max_bytes``.
+
+        :param str keep: Optional entry directory that is never evicted.
+        """
+        if self.max_bytes is None:
+            return
+        entries = []
+        for e in os.scandir(self.cache_dir):
+            meta_path = os.path.join(e.path, self.META_NAME)
+            if (e.is_dir() and not e.name.startswith(".tmp_") and
+                    os.path.isfile(meta_path)):
+                entries.append((os.stat(meta_path).st_mtime, e.path,
+                                dir_size(e.path)))
+        total = sum(sz for _, _, sz in entries)
+        for _, path, sz in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path != keep:
+                shutil.rmtree(path, ignore_errors=True)
+                total -= sz
+
+    def clear(self):
+        """
+        Removes all entries from the cache.
+        """
+        for e in os.scandir(self.cache_dir):
+            if e.is_dir():
+                shutil.rmtree(e.path, ignore_errors=True)
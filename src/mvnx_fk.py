@@ -0,0 +1,195 @@
+# -*- coding:utf-8 -*-
+
+
+"""
+This module computes world coordinates of MVNX skeleton points for all
+frames at once, without Blender. Each MVNX segment has a global ``position``
+(its origin) and ``orientation`` per frame, and its points (joints and
+anatomical landmarks) are given as fixed offsets ``pos_b`` in the segment
+frame. Therefore, the world position of a point at offset ``o`` of segment
+``s`` is::
+
+  world = position[:, s] + R(orientation[:, s]) @ o
+
+Usage example::
+
+  m = Mvnx(MVNX_PATH, streaming=True)
+  _, _, frames = m.extract_frame_info(columnar=True, dtype=np.float64)
+  fk = ForwardKinematics.from_mvnx(m)
+  wrists = fk.segment_points(frames["position"], frames["orientation"],
+                             [("RightForeArm", "jRightWrist"),
+                              ("LeftForeArm", "jLeftWrist")])  # (N, 2, 3)
+  dots = fk.dots(frames["position"], frames["orientation"])  # (N, D, 3)
+
+Besides the segment points, arbitrary points can be given in terms of the
+"bones" used by ``render_dots.py``: each segment has a bone going from its
+origin (head) to the point where its first child segment is attached, or to
+its last landmark for leaf segments like the hands (tail). A dot is then
+specified declaratively (see ``DOT_SPEC``) by its segment, a position along
+the bone, and an extra offset in the segment axes proportional to the bone
+length. ``DOT_SPEC`` is the only specification of the point-light dots:
+``render_dots.py`` places its icospheres from it as well.
+"""
+
+
+import numpy as np
+#
+import quaternions
+
+
+__author__ = "Andres FR"
+
+
+# #############################################################################
+# ## GLOBALS
+# #############################################################################
+
+# Declarative specification of the point-light dots, in the form
+# (name, segment, bone_fraction, offset), where bone_fraction goes from 0
+# (bone head) to 1 (bone tail), and offset is an XYZ vector in the segment
+# axes, in units of bone length. In the MVNX segment axes, x points forward,
+# y to the left and z up (at T-pose).
+DOT_SPEC = [
+    # dots at the tail of the selected bones
+    ("T12", "T12", 1.0, (0, 0, 0)),
+    ("RightShoulder", "RightShoulder", 1.0, (0, 0, 0)),
+    ("RightUpperArm", "RightUpperArm", 1.0, (0, 0, 0)),
+    ("LeftShoulder", "LeftShoulder", 1.0, (0, 0, 0)),
+    ("LeftUpperArm", "LeftUpperArm", 1.0, (0, 0, 0)),
+    ("RightUpperLeg", "RightUpperLeg", 1.0, (0, 0, 0)),
+    ("RightFoot", "RightFoot", 1.0, (0, 0, 0)),
+    ("LeftUpperLeg", "LeftUpperLeg", 1.0, (0, 0, 0)),
+    ("LeftFoot", "LeftFoot", 1.0, (0, 0, 0)),
+    # hips: head of the upper legs, widened sideways
+    ("RightHip", "RightUpperLeg", 0.0, (0, -0.15, 0)),
+    ("LeftHip", "LeftUpperLeg", 0.0, (0, 0.15, 0)),
+    # shins: slightly beyond the knees
+    ("RightShin", "RightLowerLeg", 1.15, (0, 0, 0)),
+    ("LeftShin", "LeftLowerLeg", 1.15, (0, 0, 0)),
+    # column: head of the L5 bone
+    ("Column", "L5", 0.0, (0, 0, 0)),
+    # head and hands, at the golden ratio of the bone from the tail
+    ("Head", "Head", 1 - 0.618, (0, 0, 0)),
+    ("RightHand", "RightHand", 1 - 0.618, (0, 0, 0)),
+    ("LeftHand", "LeftHand", 1 - 0.618, (0, 0, 0))]
+
+
+# #############################################################################
+# ## FORWARD KINEMATICS
+# #############################################################################
+
+class ForwardKinematics:
+    """
+    Vectorized forward kinematics of an MVNX skeleton. See this module's
+    docstring for details and usage examples.
+    """
+    def __init__(self, joints, seg_detail, seg_names_sorted):
+        """
+        The parameters are the ones returned by ``Mvnx.extract_skeleton``.
+        """
+        self.joints = joints
+        self.seg_detail = seg_detail
+        self.seg_names = list(seg_names_sorted)
+        self.seg_idx = {s: i for i, s in enumerate(self.seg_names)}
+        self.bones = self._make_bones()
+
+    @classmethod
+    def from_mvnx(cls, mvnx):
+        """
+        :param mvnx: An ``Mvnx`` object.
+        """
+        return cls(*mvnx.extract_skeleton())
+
+    def _make_bones(self):
+        """
+        :returns: A dict in the form ``{seg: (head, tail)}``, with the bone
+          ends as XYZ offsets in the segment frame. The head is the segment
+          origin, and the tail the point where the first child segment is
+          attached (following the order of ``self.joints``). For segments
+          without children, the tail is their last point that isn't a joint,
+          or the head if there is none.
+        """
+        points = {s: [] for s in self.seg_names}
+        for (seg, pt), xyz in self.seg_detail.items():
+            points[seg].append((pt, np.asarray(xyz, dtype=np.float64)))
+        tails = {}
+        for _, conn1, xyz1, _, _ in self.joints:
+            seg = conn1.split("/")[0]
+            if seg not in tails:
+                tails[seg] = np.asarray(xyz1, dtype=np.float64)
+        joint_names = {j[0] for j in self.joints}
+        bones = {}
+        for seg in self.seg_names:
+            head = np.zeros(3)
+            if seg in tails:
+                tail = tails[seg]
+            else:
+                landmarks = [xyz for pt, xyz in points[seg]
+                             if pt not in joint_names]
+                tail = landmarks[-1] if landmarks else head
+            bones[seg] = (head, tail)
+        return bones
+
+    def bone_length(self, seg):
+        """
+        :returns: The length of the bone of the given segment, in meters.
+        """
+        head, tail = self.bones[seg]
+        return float(np.linalg.norm(tail - head))
+
+    def world_points(self, position, orientation, seg_indexes, offsets):
+        """
+        Core of the forward kinematics: computes, for every frame, the world
+        coordinates of the given offsets, each one in the frame of the given
+        segment.
+
+        :param position: Segment positions of shape ``(N, S, 3)``.
+        :param orientation: Segment orientations (quaternions) of shape
+          ``(N, S, 4)``.
+        :param seg_indexes: Integer array of shape ``(P,)`` with the segment
+          index of each point.
+        :param offsets: Array of shape ``(P, 3)`` with the offset of each
+          point in its segment frame.
+        :returns: Array of shape ``(N, P, 3)``.
+        """
+        seg_indexes = np.asarray(seg_indexes, dtype=np.int64)
+        offsets = np.asarray(offsets, dtype=np.float64)
+        q = quaternions.normalize(orientation[:, seg_indexes].astype(
+            np.float64))
+        return position[:, seg_indexes] + quaternions.rotate(q, offsets)
+
+    def segment_points(self, position, orientation, points):
+        """
+        :param points: List of ``(segment, point)`` label pairs, keys of
+          ``self.seg_detail``, e.g. ``("Head", "pTopOfHead")``.
+        :returns: Array of shape ``(N, len(points), 3)`` with the world
+          coordinates of the given points. See ``world_points``.
+        """
+        seg_indexes = [self.seg_idx[seg] for seg, _ in points]
+        offsets = [self.seg_detail[p] for p in points]
+        return self.world_points(position, orientation, seg_indexes, offsets)
+
+    def dot_offsets(self, dot_spec=DOT_SPEC):
+        """
+        :param dot_spec: List of ``(name, segment, bone_fraction, offset)``,
+          see ``DOT_SPEC``.
+        :returns: A tuple ``(names, seg_indexes, offsets)`` to be used with
+          ``world_points``.
+        """
+        names, seg_indexes, offsets = [], [], []
+        for name, seg, frac, extra in dot_spec:
+            head, tail = self.bones[seg]
+            length = np.linalg.norm(tail - head)
+            names.append(name)
+            seg_indexes.append(self.seg_idx[seg])
+            offsets.append(head + frac * (tail - head) +
+                           length * np.asarray(extra, dtype=np.float64))
+        return names, np.array(seg_indexes), np.array(offsets)
+
+    def dots(self, position, orientation, dot_spec=DOT_SPEC):
+        """
+        :returns: Array of shape ``(N, len(dot_spec), 3)`` with the world
+          coordinates of the given dots for every frame.
+        """
+        _, seg_indexes, offsets = self.dot_offsets(dot_spec)
+        return self.world_points(position, orientation, seg_indexes, offsets)
@@ -0,0 +1,444 @@
+# -*- coding:utf-8 -*-
+
+
+"""
+This script processes a whole library of MVNX files in parallel. Each file
+is parsed via ``Mvnx`` and fed to one or more extractors (see
+``EXTRACTORS``), whose outputs are saved to ``<out_dir>/<mvnx_name>_<hash>/``,
+where ``<hash>`` identifies the full source path (see ``output_name``), so
+that files with the same name in different directories don't collide.
+Usage example::
+
+  python mvnx_library.py -i ~/datasets/mocap_library/MVNX -o /tmp/library -e tabular summary -F position orientation -j 8 -M 16
+
+Files are distributed over a pool of worker processes. The number of files
+being processed at the same time is bounded by the number of workers, and
+also by a memory budget, based on an estimate of the memory required per
+file (see ``estimate_memory``). Errors are isolated per file: a file that
+fails (or crashes its worker) is reported in the manifest, and the rest of
+the batch goes on. After processing, a JSON manifest with one entry per file
+(status, outputs, timings, error messages) is written to
+``<out_dir>/manifest.json``.
+
+Processing is incremental: each manifest entry also records the SHA256 of
+the source file, the extractors and fields used and the ``CONVERTER_VERSION``.
+When the library is processed again into the same output directory, files
+whose entry matches (and whose outputs still exist) are skipped, so only new
+or changed files are processed. To avoid rehashing unchanged files, the hash
+is reused if the file size and mtime didn't change. The ``--force`` flag
+reprocesses everything.
+
+Check the -h flag for help.
+"""
+
+import os
+import sys
+import json
+import glob
+import hashlib
+import time
+import traceback
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+#
+import numpy as np
+import pandas as pd
+#
+from mvnx import Mvnx
+from mvnx_fk import ForwardKinematics
+from mvnx_cache import MvnxCache, file_hash
+from mvnx_to_csv import MvnxToTabular, save_tables, OUTPUT_FORMATS
+from mvnx_resample import resample_frames
+
+
+__author__ = "Andres FR"
+
+
+###############################################################################
+### GLOBALS
+###############################################################################
+# peak memory of processing a file, as a multiple of its size on disk. The
+# streaming columnar path needs much less than the full tree (~10x)
+MEMORY_FACTOR = 3
+MANIFEST_NAME = "manifest.json"
+# bump this whenever the outputs of the extractors change, so that already
+# processed files are processed again
+CONVERTER_VERSION = "2"
+
+
+###############################################################################
+### EXTRACTORS
+###############################################################################
+def subject_fps(mvnx):
+    """
+    :returns: The ``frameRate`` of the MVNX subject as float, or None if the
+      file doesn't specify it (then it is estimated from the timestamps).
+    """
+    fps = mvnx.mvnx.subject.attrib.get("frameRate")
+    return None if fps is None else float(fps)
+
+
+def extract_tabular(mvnx, out_dir, fields=None, fps=None, fmt="csv"):
+    """
+    Converts the MVNX into tabular form via ``MvnxToTabular`` and saves each
+    table in the given format.
+
+    :param fps: If given, frames are resampled to this frame rate.
+    :param fmt: Table format, one of ``OUTPUT_FORMATS``.
+    :returns: The list of saved paths.
+    """
+    processor = MvnxToTabular(mvnx, fields, fps=fps)
+    return save_tables(processor(fields), out_dir, fmt)
+
+
+def extract_summary(mvnx, out_dir, fields=None, fps=None, fmt="csv"):
+    """
+    Computes summary statistics (mean, std, min, max across frames) of every
+    float field, plus the number of frames and duration, and saves them as
+    JSON. Since the summary is not a table, ``fmt`` doesn't apply to it.
+
+    :param fps: If given, frames are resampled to this frame rate.
+    :returns: The list of saved paths.
+    """
+    frames_metadata, _, arrays = mvnx.extract_frame_info(columnar=True,
+                                                         fields=fields)
+    if fps is not None:
+        arrays = resample_frames(arrays, fps, subject_fps(mvnx))
+    summary = {"frames_metadata": frames_metadata,
+               "n_frames": len(arrays["index"]),
+               "duration_ms": (int(arrays["time"][-1] - arrays["time"][0])
+                               if len(arrays["time"]) else 0),
+               "fields": {}}
+    for k, v in arrays.items():
+        if v.ndim < 2 or v.dtype.kind != "f" or len(v) == 0:
+            continue
+        summary["fields"][k] = {"shape": list(v.shape[1:]),
+                                "mean": v.mean(axis=0).tolist(),
+                                "std": v.std(axis=0).tolist(),
+                                "min": v.min(axis=0).tolist(),
+                                "max": v.max(axis=0).tolist()}
+    outpath = os.path.join(out_dir, "summary.json")
+    with open(outpath, "w") as f:
+        json.dump(summary, f)
+    return [outpath]
+
+
+def extract_dots(mvnx, out_dir, fields=None, fps=None, fmt="csv"):
+    """
+    Computes the world coordinates of the point-light dots (see
+    ``mvnx_fk.DOT_SPEC``) for every frame via forward kinematics, and saves
+    them as a table in the given format, with ``<dot>_x``, ``<dot>_y``, ``<dot>_z`` columns.
+    The ``fields`` parameter is ignored, since only ``position`` and
+    ``orientation`` are needed.
+
+    :param fps: If given, frames are resampled to this frame rate.
+    :param fmt: Table format, one of ``OUTPUT_FORMATS``.
+    :returns: The list of saved paths.
+    """
+    _, _, arrays = mvnx.extract_frame_info(
+        columnar=True, fields=["position", "orientation"], dtype=np.float64)
+    if fps is not None:
+        arrays = resample_frames(arrays, fps, subject_fps(mvnx))
+    fk = ForwardKinematics.from_mvnx(mvnx)
+    names, seg_indexes, offsets = fk.dot_offsets()
+    dots = fk.world_points(arrays["position"], arrays["orientation"],
+                           seg_indexes, offsets)
+    df = pd.DataFrame(dots.reshape(len(dots), -1),
+                      columns=["_".join([n, dim]) for n in names
+                               for dim in ["x", "y", "z"]])
+    df.insert(0, "ms", arrays["ms"])
+    df.insert(0, "frame_idx", arrays["index"])
+    return save_tables({"dots": df}, out_dir, fmt)
+
+
+EXTRACTORS = {"tabular": extract_tabular,
+              "summary": extract_summary,
+              "dots": extract_dots}
+
+
+###############################################################################
+### HELPERS
+###############################################################################
+def find_mvnx_files(paths, pattern="*.mvnx"):
+    """
+    :param paths: Collection of MVNX file paths and/or directories. The
+      directories are expanded into their files matching ``pattern``.
+    :returns: A sorted list of MVNX paths, without duplicates.
+    """
+    result = set()
+    for p in paths:
+        p = os.path.expanduser(p)
+        if os.path.isdir(p):
+            result.update(glob.glob(os.path.join(p, pattern)))
+        else:
+            result.add(p)
+    return sorted(result)
+
+
+def output_name(mvnx_path):
+    """
+    :returns: The name of the output directory of the given MVNX, in the form
+      ``<mvnx_name>_<hash>``, where ``<hash>`` is a short hash of its
+      absolute path. Unlike the file name alone, it is unique across
+      directories.
+    """
+    abspath = os.path.abspath(mvnx_path)
+    digest = hashlib.sha1(abspath.encode("utf-8")).hexdigest()[:10]
+    return "%s_%s" % (os.path.basename(abspath), digest)
+
+
+def estimate_memory(mvnx_path, factor=MEMORY_FACTOR):
+    """
+    :returns: The estimated peak memory in bytes of processing the given file.
+    """
+    return os.path.getsize(mvnx_path) * factor
+
+
+def load_manifest(out_dir):
+    """
+    :returns: A dict in the form ``{source_path: entry}`` with the file
+      entries of the manifest in ``out_dir``, empty if there is none.
+    """
+    try:
+        with open(os.path.join(out_dir, MANIFEST_NAME), "r") as f:
+            return {e["source"]: e for e in json.load(f)["files"]}
+    except (OSError, ValueError, KeyError):
+        return {}
+
+
+def is_up_to_date(entry, sha256, extractors, fields=None, fps=None,
+                  fmt="csv"):
+    """
+    :param entry: A manifest entry from a previous run.
+    :returns: True if the entry was successfully processed from a file with
+      the given hash, with the same converter version, fields, frame rate,
+      format and at least the given extractors, and all its outputs still
+      exist.
+    """
+    return (entry.get("status") in ("ok", "skipped") and
+            entry.get("sha256") == sha256 and
+            entry.get("converter_version") == CONVERTER_VERSION and
+            entry.get("fields") == fields and
+            entry.get("fps") == fps and
+            entry.get("format", "csv") == fmt and
+            all(e in entry["outputs"] for e in extractors) and
+            all(os.path.isfile(p) for outs in entry["outputs"].values()
+                for p in outs))
+
+
+def process_file(mvnx_path, out_dir, extractors, fields=None,
+                 schema_path=None, cache_dir=None, previous=None, fps=None,
+                 fmt="csv"):
+    """
+    Worker function: loads the given MVNX in streaming mode and runs the given
+    extractors on it. Exceptions are caught and reported in the result.
+
+    :param previous: Optional manifest entry of this file from a previous
+      run. If it is up to date (see ``is_up_to_date``), the file isn't
+      processed and the entry is returned with status ``skipped``.
+    :param fps: If given, extractors resample the frames to this frame rate.
+    :param fmt: Format of the tables saved by the extractors.
+    :returns: A JSON-serializable dict with the processing results.
+    """
+    t0 = time.time()
+    name = os.path.basename(mvnx_path)
+    result = {"source": os.path.abspath(mvnx_path), "pid": os.getpid(),
+              "outputs": {}, "status": "ok", "error": None,
+              "extractors": list(extractors), "fields": fields, "fps": fps,
+              "format": fmt,
+              "converter_version": CONVERTER_VERSION}
+    try:
+        st = os.stat(mvnx_path)
+        result["size"], result["mtime_ns"] = st.st_size, st.st_mtime_ns
+        if (previous is not None and previous.get("size") == st.st_size and
+                previous.get("mtime_ns") == st.st_mtime_ns):
+            result["sha256"] = previous.get("sha256")
+        else:
+            result["sha256"] = file_hash(mvnx_path)
+        if previous is not None and is_up_to_date(
+                previous, result["sha256"], extractors, fields, fps, fmt):
+            result = dict(previous, status="skipped", pid=os.getpid(),
+                          size=st.st_size, mtime_ns=st.st_mtime_ns)
+            print("[worker %d] skipped %s (up to date)" % (os.getpid(),
+                                                          name))
+            sys.stdout.flush()
+            return result
+        file_out_dir = os.path.join(out_dir, output_name(mvnx_path))
+        os.makedirs(file_out_dir, exist_ok=True)
+        cache = None if cache_dir is None else MvnxCache(cache_dir)
+        m = Mvnx(mvnx_path, schema_path, streaming=True, cache=cache)
+        for ex_name in extractors:
+            result["outputs"][ex_name] = EXTRACTORS[ex_name](
+                m, file_out_dir, fields, fps, fmt)
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = "%s: %s" % (type(e).__name__, e)
+        result["traceback"] = traceback.format_exc()
+    result["seconds"] = time.time() - t0
+    print("[worker %d] %s %s (%.1fs)" % (os.getpid(), result["status"], name,
+                                         result["seconds"]))
+    sys.stdout.flush()
+    return result
+
+
+def process_library(mvnx_paths, out_dir, extractors=("tabular",),
+                    fields=None, num_workers=None, max_memory_bytes=None,
+                    schema_path=None, cache_dir=None, force=False,
+                    fps=None, fmt="csv"):
+    """
+    Processes the given MVNX files in parallel via ``process_file``. See this
+    module's docstring for details.
+
+    :param int num_workers: Size of the process pool. Defaults to the number
+      of CPUs.
+    :param int max_memory_bytes: If given, files are only started while the
+      sum of ``estimate_memory`` of all files in process is below this. A
+      file is always started if nothing else is being processed.
+    :param bool force: If false, files that are up to date according to the
+      existing manifest in ``out_dir`` are skipped. If true, all files are
+      processed.
+    :param fps: If given, extractors resample the frames to this frame rate.
+    :param fmt: Format of the tables saved by the extractors, one of
+      ``OUTPUT_FORMATS``.
+    :returns: The manifest, as a dict. It is also saved to ``out_dir``.
+      If a worker dies, the files that were in flight are processed again
+      one by one, so only the file that crashed is reported as error.
+      Entries of files from previous runs that weren't given now are kept.
+    """
+    assert all(e in EXTRACTORS for e in extractors), \
+        f"Error! allowed extractors: {set(EXTRACTORS)}"
+    assert fmt in OUTPUT_FORMATS, \
+        f"Error! allowed formats: {set(OUTPUT_FORMATS)}"
+    os.makedirs(out_dir, exist_ok=True)
+    num_workers = num_workers or os.cpu_count()
+    previous = load_manifest(out_dir)
+    pending = list(mvnx_paths)
+    results = []
+    t0 = time.time()
+
+    def submit(executor, path):
+        prev = None if force else previous.get(os.path.abspath(path))
+        return executor.submit(process_file, path, out_dir, extractors,
+                               fields, schema_path, cache_dir, prev, fps,
+                               fmt)
+    #
+    crashed = []  # files in flight when a worker died
+    while pending:
+        in_flight = {}  # {future: (path, estimated_memory)}
+        try:
+            with ProcessPoolExecutor(num_workers) as executor:
+                while pending or in_flight:
+                    # start as many files as the budget allows
+                    while pending and len(in_flight) < num_workers:
+                        mem = estimate_memory(pending[0])
+                        used = sum(m for _, m in in_flight.values())
+                        if (in_flight and max_memory_bytes is not None and
+                                used + mem > max_memory_bytes):
+                            break
+                        fut = submit(executor, pending[0])
+                        in_flight[fut] = (pending.pop(0), mem)
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for fut in done:
+                        path, _ = in_flight.pop(fut)
+                        try:
+                            results.append(fut.result())
+                        except BrokenProcessPool:
+                            crashed.append(path)
+                            continue
+                        print("[process_library] %d/%d done" % (
+                            len(results), len(mvnx_paths)))
+        except BrokenProcessPool:
+            # a worker died (e.g. killed by OOM) and the pool can't take
+            # more work: the files still in flight are retried below, and
+            # the pool is restarted for the rest
+            crashed += [path for path, _ in in_flight.values()]
+    # when a worker dies, all files in flight fail, not only the culprit.
+    # To tell them apart, each of them is processed again in its own pool
+    for path in crashed:
+        print("[process_library] worker died while processing", path,
+              "retrying in isolation")
+        try:
+            with ProcessPoolExecutor(1) as executor:
+                results.append(submit(executor, path).result())
+        except BrokenProcessPool as e:
+            results.append({"source": os.path.abspath(path),
+                            "outputs": {}, "status": "error",
+                            "error": "%s: %s" % (type(e).__name__, e)})
+        print("[process_library] %d/%d done" % (len(results),
+                                                len(mvnx_paths)))
+    # counts refer to this run, but the entries of files processed in
+    # previous runs are kept
+    manifest = {"out_dir": os.path.abspath(out_dir),
+                "extractors": list(extractors),
+                "fields": fields,
+                "fps": fps,
+                "format": fmt,
+                "seconds": time.time() - t0,
+                "converter_version": CONVERTER_VERSION,
+                "n_ok": sum(r["status"] == "ok" for r in results),
+                "n_skipped": sum(r["status"] == "skipped" for r in results),
+                "n_error": sum(r["status"] == "error" for r in results)}
+    sources = {r["source"] for r in results}
+    results += [e for src, e in previous.items() if src not in sources]
+    manifest["files"] = sorted(results, key=lambda r: r["source"])
+    manifest_path = os.path.join(out_dir, MANIFEST_NAME)
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    print("[process_library] %d ok, %d skipped, %d errors. Manifest saved "
+          "to %s" % (manifest["n_ok"], manifest["n_skipped"],
+                     manifest["n_error"], manifest_path))
+    return manifest
+
+
+# ###########################################################################
+# # MAIN ROUTINE
+# ###########################################################################
+def main():
+    """
+    """
+    parser = ArgumentParser()
+    parser.add_argument("-i", "--inputs", type=str, nargs="+", required=True,
+                        help="MVNX files and/or directories containing them")
+    parser.add_argument("-o", "--out_dir", type=str, required=True,
+                        help="Output directory. Results of each MVNX go " +
+                        "to <out_dir>/<mvnx_name>_<path_hash>/")
+    parser.add_argument("-e", "--extractors", type=str, nargs="+",
+                        default=["tabular"],
+                        help="Extractors to run, from " +
+                        str(sorted(EXTRACTORS)))
+    parser.add_argument("-F", "--fields", type=str, nargs="+", default=None,
+                        help="Field names to retrieve. Default takes all.")
+    parser.add_argument("-S", "--mvnx_schema", type=str, default=None,
+                        help="XML validation schema for the MVNX files " +
+                        "(optional)")
+    parser.add_argument("-C", "--cache_dir", type=str, default=None,
+                        help="If given, parsed MVNX files are cached here")
+    parser.add_argument("-j", "--num_workers", type=int, default=None,
+                        help="Number of worker processes. Default: all CPUs")
+    parser.add_argument("-M", "--max_memory_gb", type=float, default=None,
+                        help="Memory budget for the files in process")
+    parser.add_argument("--force", action="store_true",
+                        help="Process all files, also the ones that are " +
+                        "up to date according to the existing manifest")
+    parser.add_argument("--fps", type=float, default=None,
+                        help="If given, frames are resampled to this frame " +
+                        "rate")
+    parser.add_argument("--format", type=str, default="csv",
+                        choices=sorted(OUTPUT_FORMATS),
+                        help="Format of the tables saved by the extractors")
+    args = parser.parse_args()
+
+    mvnx_paths = find_mvnx_files(args.inputs)
+    max_mem = (None if args.max_memory_gb is None
+               else int(args.max_memory_gb * 1024 ** 3))
+    print("[process_library] processing", len(mvnx_paths), "files")
+    manifest = process_library(mvnx_paths, args.out_dir, args.extractors,
+                               args.fields, args.num_workers, max_mem,
+                               args.mvnx_schema, args.cache_dir, args.force,
+                               args.fps, args.format)
+    sys.exit(0 if manifest["n_error"] == 0 else 1)
+
+
+if __name__ == "__main__":
+    main()
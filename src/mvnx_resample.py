@@ -0,0 +1,259 @@
+# -*- coding:utf-8 -*-
+
+
+"""
+This module resamples the columnar normal frames of an MVNX (see
+``Mvnx.extract_frame_info(columnar=True)``) to a different frame rate.
+Usage example (60 fps capture to 15 fps)::
+
+  _, _, normal_frames = Mvnx(MVNX_PATH).extract_frame_info(columnar=True)
+  frames_15fps = resample_frames(normal_frames, 15)
+
+The new frames are sampled at regular times, starting at the first frame,
+based on the ``ms`` timestamps. This way, frames dropped during the capture
+(i.e. gaps in ``ms``) are handled correctly. Each field is interpolated at
+the new times according to its type:
+
+* Quaternion fields (``QUATERNION_FIELDS``) are interpolated via SLERP.
+* Joint angle fields (``ANGLE_FIELDS``), in degrees, are unwrapped before
+  being interpolated (so e.g. 179 and -179 are 2 degrees apart), and then
+  wrapped back into ``[-180, 180]``.
+* Boolean fields like ``footContacts`` take the value of the previous frame.
+* The rest of the float fields are linearly interpolated.
+
+Since the timestamps are rounded to milliseconds, new frames within half a
+millisecond of an original frame take its values, so e.g. resampling to the
+same frame rate returns the original frames.
+
+When decreasing the frame rate, the float fields are first low-passed with
+a windowed-sinc FIR filter below the new Nyquist frequency, to prevent
+aliasing. Since the filter requires regular sampling, this is done on a
+regular grid at the original frame rate (filling dropped frames by
+interpolation). Quaternions are filtered component-wise after flipping
+their signs for continuity, and then renormalized.
+"""
+
+
+import numpy as np
+#
+import quaternions
+
+
+__author__ = "Andres FR"
+
+
+# #############################################################################
+# ## GLOBALS
+# #############################################################################
+
+QUATERNION_FIELDS = {"orientation", "sensorOrientation"}
+ANGLE_FIELDS = {"jointAngle", "jointAngleXZY", "jointAngleErgo",
+                "jointAngleErgoXZY"}
+# resolution of the ms timestamps
+TIMESTAMP_RESOLUTION_MS = 1
+# frame rates closer than this (relative) are considered equal, since the
+# estimated ones are slightly off due to the rounding of the timestamps
+FPS_TOLERANCE = 1e-3
+# number of FIR filter taps per unit of decimation ratio
+FILTER_TAPS_PER_RATIO = 8
+
+
+# #############################################################################
+# ## HELPERS
+# #############################################################################
+
+def estimate_fps(ms):
+    """
+    :param ms: Array of frame timestamps in milliseconds.
+    :returns: The frame rate. The median difference between consecutive
+      timestamps gives a first estimate, robust to dropped frames, which is
+      used to count the frame intervals within each difference. The frame
+      rate is then the total count over the total duration, which is robust
+      to the rounding of the timestamps to milliseconds.
+    """
+    assert len(ms) > 1, "At least 2 frames are needed to estimate the fps!"
+    diffs = np.diff(ms).astype(np.float64)
+    n_intervals = np.maximum(np.round(diffs / np.median(diffs)), 1).sum()
+    return 1000.0 * n_intervals / diffs.sum()
+
+
+def snap_times(t, tq, max_dist):
+    """
+    :param t: Sorted array of source times, shape ``(N,)``, with ``N > 1``.
+    :param tq: Array of query times, shape ``(M,)``.
+    :returns: A copy of ``tq`` where the times that are within ``max_dist``
+      of a source time are replaced by it.
+    """
+    i = np.clip(np.searchsorted(t, tq), 1, len(t) - 1)
+    nearest = np.where(tq - t[i - 1] <= t[i] - tq, t[i - 1], t[i])
+    return np.where(np.abs(nearest - tq) <= max_dist, nearest, tq)
+
+
+def wrap_degrees(x):
+    """
+    :returns: The given angles in degrees, wrapped into ``[-180, 180]``.
+      Angles already in that range are returned unchanged.
+    """
+    return x - 360 * np.round(x / 360)
+
+
+def _interp_weights(t, tq):
+    """
+    :param t: Sorted array of source times, shape ``(N,)``.
+    :param tq: Array of query times, shape ``(M,)``.
+    :returns: A tuple ``(i, w)`` such that the linear interpolation at ``tq``
+      is ``x[i] * (1 - w) + x[i + 1] * w``. Query times outside of ``t`` are
+      clamped to its ends.
+    """
+    i = np.clip(np.searchsorted(t, tq, side="right") - 1, 0, len(t) - 2)
+    dt = (t[i + 1] - t[i]).astype(np.float64)
+    w = np.clip((tq - t[i]) / np.where(dt == 0, 1, dt), 0, 1)
+    return i, w
+
+
+def linear_interp(t, x, tq):
+    """
+    Vectorized linear interpolation of ``x``, of shape ``(N, ...)``, sampled
+    at times ``t``, at the query times ``tq``.
+
+    :returns: Array of shape ``(M, ...)``.
+    """
+    if len(t) == 1:
+        return np.repeat(x, len(tq), axis=0)
+    i, w = _interp_weights(t, tq)
+    w = w.reshape((-1,) + (1,) * (x.ndim - 1))
+    return (x[i] * (1 - w) + x[i + 1] * w).astype(x.dtype)
+
+
+def previous_interp(t, x, tq):
+    """
+    Like ``linear_interp``, but takes the value of the previous sample (e.g.
+    for boolean fields).
+    """
+    i = np.clip(np.searchsorted(t, tq, side="right") - 1, 0, len(t) - 1)
+    return x[i]
+
+
+def slerp_interp(t, q, tq):
+    """
+    Like ``linear_interp``, but for quaternions of shape ``(N, ..., 4)``,
+    interpolated via SLERP. Query times that match a sample take its
+    (unmodified) value.
+    """
+    if len(t) == 1:
+        return np.repeat(q, len(tq), axis=0)
+    i, w = _interp_weights(t, tq)
+    w = w.reshape((-1,) + (1,) * (q.ndim - 1))
+    result = quaternions.slerp(q[i], q[i + 1], w)
+    result = np.where(w == 0, q[i], np.where(w == 1, q[i + 1], result))
+    return result.astype(q.dtype)
+
+
+def lowpass_kernel(cutoff_ratio, num_taps):
+    """
+    :param float cutoff_ratio: Cutoff frequency, as a fraction of the
+      sampling rate (between 0 and 0.5).
+    :param int num_taps: Kernel length. Must be odd.
+    :returns: A windowed-sinc (Hamming) FIR low-pass kernel with unit gain.
+    """
+    assert num_taps % 2 == 1, "num_taps must be odd!"
+    n = np.arange(num_taps) - (num_taps - 1) / 2
+    kernel = np.sinc(2 * cutoff_ratio * n) * np.hamming(num_taps)
+    return kernel / kernel.sum()
+
+
+def lowpass_filter(x, kernel):
+    """
+    Applies the given FIR kernel to ``x`` along its first axis (time). The
+    signal is extended at both ends via odd reflection, so the output has
+    the same length as the input and the ends are not biased.
+    """
+    half = len(kernel) // 2
+    if len(x) < 2 or half == 0:
+        return x.copy()
+    pad = [(min(half, len(x) - 1),) * 2] + [(0, 0)] * (x.ndim - 1)
+    xp = np.pad(x, pad, mode="reflect", reflect_type="odd")
+    if pad[0][0] < half:
+        # too short for reflection: extend with the edge values
+        extra = half - pad[0][0]
+        xp = np.pad(xp, [(extra, extra)] + pad[1:], mode="edge")
+    # vectorized over all columns, looping over the (few) kernel taps
+    out = np.zeros(x.shape, dtype=np.float64)
+    for k, h in enumerate(kernel):
+        out += h * xp[k:k + len(x)]
+    return out.astype(x.dtype)
+
+
+# #############################################################################
+# ## RESAMPLING
+# #############################################################################
+
+def resample_frames(normal_frames, fps, source_fps=None, anti_alias=True):
+    """
+    Resamples the given columnar normal frames to the given frame rate. See
+    this module's docstring for details.
+
+    :param normal_frames: Dict of arrays in the ``extract_frame_arrays``
+      layout, with at least the ``ms`` timestamps.
+    :param float fps: Target frame rate.
+    :param float source_fps: Frame rate of the given frames. If not given,
+      it is estimated from ``ms`` via ``estimate_fps``.
+    :param bool anti_alias: If true and the frame rate decreases, float
+      fields are low-passed before being resampled.
+    :returns: A dict with the same fields as ``normal_frames``, sampled at
+      ``fps``. ``ms`` holds the new (rounded) timestamps and ``time`` the
+      corresponding offsets from the start of the capture. ``index`` is the
+      index of the new frames, starting at the index of the first one.
+    """
+    assert fps > 0, "fps must be positive!"
+    ms = normal_frames["ms"]
+    t = ms.astype(np.float64)
+    if len(t) < 2:
+        return dict(normal_frames)
+    source_fps = source_fps or estimate_fps(ms)
+    # timestamps are rounded to ms, so the last frame may be up to half a ms
+    # earlier than its actual time
+    n_new = int(np.floor((t[-1] - t[0] + 0.5) * fps / 1000.0)) + 1
+    tq = t[0] + np.arange(n_new) * (1000.0 / fps)
+    # times at which the fields are interpolated
+    ts = snap_times(t, tq, TIMESTAMP_RESOLUTION_MS / 2)
+    # the regular grid at the source rate, used for filtering
+    decimate = anti_alias and fps < source_fps * (1 - FPS_TOLERANCE)
+    if decimate:
+        n_grid = int(np.floor((t[-1] - t[0] + 0.5) * source_fps /
+                              1000.0)) + 1
+        t_grid = t[0] + np.arange(n_grid) * (1000.0 / source_fps)
+        ts_grid = snap_times(t, t_grid, TIMESTAMP_RESOLUTION_MS / 2)
+        ratio = source_fps / fps
+        num_taps = 2 * int(np.ceil(FILTER_TAPS_PER_RATIO * ratio / 2)) + 1
+        kernel = lowpass_kernel(0.5 / ratio, num_taps)
+    #
+    result = {"ms": np.round(tq).astype(ms.dtype)}
+    if "time" in normal_frames:
+        result["time"] = (normal_frames["time"][0] + np.round(
+            tq - t[0])).astype(normal_frames["time"].dtype)
+    if "index" in normal_frames:
+        result["index"] = normal_frames["index"][0] + np.arange(
+            n_new, dtype=normal_frames["index"].dtype)
+    for k, v in normal_frames.items():
+        if k in result:
+            continue
+        elif v.dtype.kind != "f":
+            result[k] = previous_interp(t, v, ts)
+        elif k in QUATERNION_FIELDS:
+            if decimate:
+                v = quaternions.make_continuous(slerp_interp(t, v, ts_grid))
+                v = quaternions.normalize(lowpass_filter(v, kernel))
+                result[k] = slerp_interp(t_grid, v, tq)
+            else:
+                result[k] = slerp_interp(t, v, ts)
+        else:
+            if k in ANGLE_FIELDS:
+                v = np.unwrap(v, period=360, axis=0)
+            if decimate:
+                v = lowpass_filter(linear_interp(t, v, ts_grid), kernel)
+                v = linear_interp(t_grid, v, tq)
+            else:
+                v = linear_interp(t, v, ts)
+            result[k] = wrap_degrees(v) if k in ANGLE_FIELDS else v
+    return result
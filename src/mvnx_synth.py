@@ -0,0 +1,402 @@
+# -*- coding:utf-8 -*-
+
+
+"""
+This script generates synthetic MVNX files of configurable length, that
+validate against ``mvnx_schemata/mvnx_schema_dance_dec19.xsd``. They are
+meant for testing and benchmarking, not as realistic motion: segment
+orientations follow smooth random rotations, and segment positions are
+obtained by chaining them along the skeleton (so joint points of connected
+segments coincide), with the pelvis wandering around the origin. Usage
+example (a 30-minute capture at 60 fps)::
+
+  python mvnx_synth.py -o /tmp/synth_30min.mvnx -d 1800 --fps 60
+
+The file is written incrementally via ``etree.xmlfile``, generating
+``FRAME_BLOCK_SIZE`` frames at a time, so memory doesn't depend on length.
+
+Check the -h flag for help.
+"""
+
+import os
+from argparse import ArgumentParser
+#
+import numpy as np
+from lxml import etree
+#
+import quaternions
+
+
+__author__ = "Andres FR"
+
+
+###############################################################################
+### GLOBALS
+###############################################################################
+MVNX_NAMESPACE = "http://www.xsens.com/mvn/mvnx"
+FRAME_BLOCK_SIZE = 1024
+FLOAT_FMT = "%f"
+
+# the 23 XSENS segments, sorted by ID
+SEGMENT_NAMES = ["Pelvis", "L5", "L3", "T12", "T8", "Neck", "Head",
+                 "RightShoulder", "RightUpperArm", "RightForeArm",
+                 "RightHand",
+                 "LeftShoulder", "LeftUpperArm", "LeftForeArm", "LeftHand",
+                 "RightUpperLeg", "RightLowerLeg", "RightFoot", "RightToe",
+                 "LeftUpperLeg", "LeftLowerLeg", "LeftFoot", "LeftToe"]
+# (joint, parent segment, child segment, offset of the joint in the parent
+# segment frame, in meters). The joint is at the origin of the child segment
+JOINTS = [("jL5S1", "Pelvis", "L5", (0, 0, 0.1)),
+          ("jL4L3", "L5", "L3", (0, 0, 0.1)),
+          ("jL1T12", "L3", "T12", (0, 0, 0.1)),
+          ("jT9T8", "T12", "T8", (0, 0, 0.1)),
+          ("jT1C7", "T8", "Neck", (0, 0, 0.2)),
+          ("jC1Head", "Neck", "Head", (0, 0, 0.1)),
+          ("jRightT4Shoulder", "T8", "RightShoulder", (0, -0.03, 0.15)),
+          ("jRightShoulder", "RightShoulder", "RightUpperArm",
+           (0, -0.15, 0)),
+          ("jRightElbow", "RightUpperArm", "RightForeArm", (0, -0.3, 0)),
+          ("jRightWrist", "RightForeArm", "RightHand", (0, -0.25, 0)),
+          ("jLeftT4Shoulder", "T8", "LeftShoulder", (0, 0.03, 0.15)),
+          ("jLeftShoulder", "LeftShoulder", "LeftUpperArm", (0, 0.15, 0)),
+          ("jLeftElbow", "LeftUpperArm", "LeftForeArm", (0, 0.3, 0)),
+          ("jLeftWrist", "LeftForeArm", "LeftHand", (0, 0.25, 0)),
+          ("jRightHip", "Pelvis", "RightUpperLeg", (0, -0.1, 0)),
+          ("jRightKnee", "RightUpperLeg", "RightLowerLeg", (0, 0, -0.45)),
+          ("jRightAnkle", "RightLowerLeg", "RightFoot", (0, 0, -0.42)),
+          ("jRightBallFoot", "RightFoot", "RightToe", (0.15, 0, -0.08)),
+          ("jLeftHip", "Pelvis", "LeftUpperLeg", (0, 0.1, 0)),
+          ("jLeftKnee", "LeftUpperLeg", "LeftLowerLeg", (0, 0, -0.45)),
+          ("jLeftAnkle", "LeftLowerLeg", "LeftFoot", (0, 0, -0.42)),
+          ("jLeftBallFoot", "LeftFoot", "LeftToe", (0.15, 0, -0.08))]
+# extra end points of the leaf segments
+END_POINTS = {"Head": ("pTopOfHead", (0, 0, 0.2)),
+              "RightHand": ("pRightTopOfHand", (0, -0.18, 0)),
+              "LeftHand": ("pLeftTopOfHand", (0, 0.18, 0)),
+              "RightToe": ("pRightToe", (0.07, 0, 0)),
+              "LeftToe": ("pLeftToe", (0.07, 0, 0))}
+PELVIS_HEIGHT = 0.95
+
+
+###############################################################################
+### HELPERS
+###############################################################################
+def segment_names(n_segments):
+    """
+    :returns: The names of the first ``n_segments`` XSENS segments, plus
+      ``ExtraN`` names if more than 23 are requested.
+    """
+    extra = ["Extra%d" % i for i in range(n_segments - len(SEGMENT_NAMES))]
+    return (SEGMENT_NAMES + extra)[:n_segments]
+
+
+def skeleton(n_segments):
+    """
+    :returns: A tuple ``(segments, joints, points)``, where ``joints`` is the
+      sublist of ``JOINTS`` (plus one joint per extra segment, hanging from
+      the pelvis) connecting the given segments, and ``points`` a dict in the
+      form ``{seg: [(label, xyz), ...]}`` with the points of each segment.
+    """
+    segments = segment_names(n_segments)
+    segset = set(segments)
+    joints = [j for j in JOINTS if j[1] in segset and j[2] in segset]
+    joints += [("j" + s, "Pelvis", s, (0, 0, 0.05))
+               for s in segments if s.startswith("Extra")]
+    points = {s: [] for s in segments}
+    points["Pelvis"].append(("pHipOrigin", (0, 0, 0)))
+    for jname, parent, child, offset in joints:
+        points[parent].append((jname, offset))
+        points[child].insert(0, (jname, (0, 0, 0)))
+    for s, pt in END_POINTS.items():
+        if s in segset:
+            points[s].append(pt)
+    return segments, joints, points
+
+
+class MotionGenerator:
+    """
+    Generates smooth random motion for a given skeleton, as sums of
+    sinusoids with random frequencies and phases. Frames can be generated
+    in any order and block size, since each one only depends on its time.
+    """
+    def __init__(self, segments, joints, n_sensors, fps=60, seed=0):
+        """
+        """
+        rng = np.random.RandomState(seed)
+        self.segments = segments
+        self.joints = joints
+        self.seg_idx = {s: i for i, s in enumerate(segments)}
+        self.n_seg = len(segments)
+        self.n_sensors = n_sensors
+        self.fps = fps
+        # per-segment rotation axes, frequencies (Hz), phases and amplitudes
+        axes = rng.randn(self.n_seg, 3)
+        self.axes = axes / np.linalg.norm(axes, axis=1, keepdims=True)
+        self.freqs = rng.uniform(0.1, 1.0, self.n_seg)
+        self.phases = rng.uniform(0, 2 * np.pi, self.n_seg)
+        self.amps = rng.uniform(0.1, 0.6, self.n_seg)
+        self.sensor_segs = np.arange(n_sensors) % self.n_seg
+        self.sensor_noise = rng.uniform(0.01, 0.1, (n_sensors, 3))
+        self.seed = seed
+
+    def orientations(self, t):
+        """
+        :param t: Array of times in seconds, shape ``(N,)``.
+        :returns: Unit quaternions of shape ``(N, n_seg, 4)``.
+        """
+        angles = self.amps * np.sin(2 * np.pi * self.freqs * t[:, None] +
+                                    self.phases)
+        q = np.empty((len(t), self.n_seg, 4))
+        q[..., 0] = np.cos(angles / 2)
+        q[..., 1:] = np.sin(angles / 2)[..., None] * self.axes
+        return q
+
+    def positions(self, t, q):
+        """
+        :returns: Segment origins of shape ``(N, n_seg, 3)``, chaining the
+          joint offsets along the skeleton.
+        """
+        pos = np.zeros((len(t), self.n_seg, 3))
+        pos[:, 0, 0] = 0.3 * np.sin(2 * np.pi * 0.05 * t)
+        pos[:, 0, 1] = 0.3 * np.cos(2 * np.pi * 0.07 * t)
+        pos[:, 0, 2] = PELVIS_HEIGHT + 0.05 * np.sin(2 * np.pi * 0.5 * t)
+        # JOINTS are sorted so that parents come before their children
+        for _, parent, child, offset in self.joints:
+            p, c = self.seg_idx[parent], self.seg_idx[child]
+            pos[:, c] = pos[:, p] + quaternions.rotate(
+                q[:, p], np.array(offset, dtype=np.float64))
+        return pos
+
+    def __call__(self, frame_indexes):
+        """
+        :returns: A dict with the arrays of all generated fields for the given
+          frame indexes, in the ``Mvnx.extract_frame_arrays`` layout.
+        """
+        dt = 1.0 / self.fps
+        t = frame_indexes * dt
+        q = self.orientations(t)
+        pos = self.positions(t, q)
+        # derivatives via finite differences w.r.t. the previous frame
+        pos_prev = self.positions(t - dt, self.orientations(t - dt))
+        pos_next = self.positions(t + dt, self.orientations(t + dt))
+        vel = (pos_next - pos_prev) / (2 * dt)
+        acc = (pos_next - 2 * pos + pos_prev) / (dt ** 2)
+        ang_vel = (self.amps * 2 * np.pi * self.freqs *
+                   np.cos(2 * np.pi * self.freqs * t[:, None] +
+                          self.phases))[..., None] * self.axes
+        ang_acc = -(self.amps * (2 * np.pi * self.freqs) ** 2 *
+                    np.sin(2 * np.pi * self.freqs * t[:, None] +
+                           self.phases))[..., None] * self.axes
+        # joint angles: ZXY Euler angles of the child segment relative to
+        # the parent, in degrees
+        parents = [self.seg_idx[j[1]] for j in self.joints]
+        children = [self.seg_idx[j[2]] for j in self.joints]
+        rel = quaternions.relative_rotation(q[:, parents], q[:, children])
+        joint_angle = np.degrees(quaternions.to_euler(rel, "ZXY"))
+        joint_angle_xzy = np.degrees(quaternions.to_euler(rel, "XZY"))
+        # sensors: attached to segments, with some deterministic "noise"
+        s = self.sensor_segs
+        sens_acc = acc[:, s] + self.sensor_noise * np.sin(t)[:, None, None]
+        sens_mag = quaternions.rotate(quaternions.conjugate(q[:, s]),
+                                      np.array([0.4, 0, -0.9]))
+        #
+        heights = pos[:, [self.seg_idx.get(x, 0) for x in
+                          ("RightFoot", "RightToe", "LeftFoot", "LeftToe")],
+                      2]
+        foot_contacts = heights < np.median(heights)
+        return {"index": frame_indexes,
+                "time": np.round(t * 1000).astype(np.int64),
+                "orientation": q, "position": pos, "velocity": vel,
+                "acceleration": acc, "angularVelocity": ang_vel,
+                "angularAcceleration": ang_acc,
+                "footContacts": foot_contacts,
+                "sensorFreeAcceleration": sens_acc,
+                "sensorMagneticField": sens_mag,
+                "sensorOrientation": q[:, s],
+                "jointAngle": joint_angle,
+                "jointAngleXZY": joint_angle_xzy,
+                "centerOfMass": pos[:, :1]}
+
+
+###############################################################################
+### WRITER
+###############################################################################
+FRAME_FIELDS = ["orientation", "position", "velocity", "acceleration",
+                "angularVelocity", "angularAcceleration", "footContacts",
+                "sensorFreeAcceleration", "sensorMagneticField",
+                "sensorOrientation", "jointAngle", "jointAngleXZY",
+                "centerOfMass"]
+
+
+def write_synthetic_mvnx(out_path, duration_s=60, fps=60, n_segments=23,
+                         n_sensors=17, fields=None, seed=0,
+                         start_ms=1575700000000):
+    """
+    Writes a synthetic MVNX file. See this module's docstring.
+
+    :param float duration_s: Length of the capture in seconds.
+    :param int n_segments: Number of segments, see ``segment_names``.
+    :param fields: Frame fields to include, from ``FRAME_FIELDS`` (in that
+      order). Orientation and position are always included.
+    :returns: The number of normal frames written.
+    """
+    fields = FRAME_FIELDS if fields is None else [
+        f for f in FRAME_FIELDS
+        if f in fields or f in {"orientation", "position"}]
+    if n_sensors == 0:
+        fields = [f for f in fields if not f.startswith("sensor")]
+    segments, joints, points = skeleton(n_segments)
+    gen = MotionGenerator(segments, joints, n_sensors, fps, seed)
+    n_frames = int(round(duration_s * fps))
+    q = lambda tag: "{%s}%s" % (MVNX_NAMESPACE, tag)
+    #
+    with etree.xmlfile(out_path, encoding="UTF-8") as xf:
+        xf.write_declaration(standalone=False)
+        with xf.element(q("mvnx"), {"version": "4"},
+                        nsmap={None: MVNX_NAMESPACE}):
+            xf.write("\n")
+            with xf.element(q("mvn"), {"version": "2019.2.1",
+                                       "build": "synthetic"}):
+                pass
+            xf.write("\n")
+            with xf.element(q("comment")):
+                xf.write("Synthetic MVNX generated by mvnx_synth.py")
+            xf.write("\n")
+            with xf.element(q("subject"), {
+                    "label": "synthetic", "torsoColor": "#ea6852",
+                    "frameRate": str(fps), "segmentCount": str(n_segments),
+                    "recDate": "Sat Dec 7 12:00:00.000 2019",
+                    "originalFilename": os.path.basename(out_path),
+                    "configuration": "FullBody", "userScenario": "noLevel",
+                    "processingQuality": "HD"}):
+                xf.write("\n")
+                with xf.element(q("comment")):
+                    pass
+                xf.write("\n")
+                # header
+                with xf.element(q("segments")):
+                    for i, seg in enumerate(segments, 1):
+                        xf.write("\n")
+                        with xf.element(q("segment"),
+                                        {"label": seg, "id": str(i)}):
+                            with xf.element(q("points")):
+                                for lbl, xyz in points[seg]:
+                                    with xf.element(q("point"),
+                                                    {"label": lbl}):
+                                        with xf.element(q("pos_b")):
+                                            xf.write(" ".join(
+                                                FLOAT_FMT % x for x in xyz))
+                    xf.write("\n")
+                xf.write("\n")
+                if n_sensors > 0:
+                    with xf.element(q("sensors")):
+                        for s in gen.sensor_segs:
+                            xf.write("\n")
+                            with xf.element(q("sensor"),
+                                            {"label": segments[s]}):
+                                pass
+                        xf.write("\n")
+                    xf.write("\n")
+                if joints:
+                    with xf.element(q("joints")):
+                        for jname, parent, child, _ in joints:
+                            xf.write("\n")
+                            with xf.element(q("joint"), {"label": jname}):
+                                with xf.element(q("connector1")):
+                                    xf.write("%s/%s" % (parent, jname))
+                                with xf.element(q("connector2")):
+                                    xf.write("%s/%s" % (child, jname))
+                        xf.write("\n")
+                    xf.write("\n")
+                # frames
+                frames_attrib = {"segmentCount": str(n_segments),
+                                 "sensorCount": str(n_sensors),
+                                 "jointCount": str(len(joints))}
+                with xf.element(q("frames"), frames_attrib):
+                    xf.write("\n")
+                    # config frames: identity, tpose and tpose-isb
+                    ident = gen(np.zeros(1, dtype=np.int64))
+                    ident["orientation"][:] = [1, 0, 0, 0]
+                    ident["position"] = gen.positions(np.zeros(1),
+                                                      ident["orientation"])
+                    for ftype in ("identity", "tpose", "tpose-isb"):
+                        _write_frame(xf, q, {"time": "0", "type": ftype},
+                                     ident, 0, ["orientation", "position"])
+                    # normal frames, generated in blocks
+                    for b in range(0, n_frames, FRAME_BLOCK_SIZE):
+                        idxs = np.arange(b, min(b + FRAME_BLOCK_SIZE,
+                                                n_frames))
+                        block = gen(idxs)
+                        for n in range(len(idxs)):
+                            t = int(block["time"][n])
+                            attrib = {"time": str(t),
+                                      "index": str(int(idxs[n])),
+                                      "tc": _timecode(t, fps),
+                                      "ms": str(start_ms + t),
+                                      "type": "normal"}
+                            _write_frame(xf, q, attrib, block, n, fields)
+                xf.write("\n")
+            xf.write("\n")
+            with xf.element(q("securityCode"), {"code": "SYNTHETIC"}):
+                pass
+            xf.write("\n")
+    return n_frames
+
+
+def _timecode(time_ms, fps):
+    """
+    :returns: A ``HH:MM:SS:FF`` timecode string.
+    """
+    secs, ms = divmod(time_ms, 1000)
+    mins, secs = divmod(secs, 60)
+    hours, mins = divmod(mins, 60)
+    return "%02d:%02d:%02d:%02d" % (hours, mins, secs, ms * fps // 1000)
+
+
+def _write_frame(xf, q, attrib, block, n, fields):
+    """
+    Writes frame ``n`` of the given block of arrays into the ``xmlfile``.
+    """
+    with xf.element(q("frame"), attrib):
+        xf.write("\n")
+        for fld in fields:
+            vals = block[fld][n].ravel()
+            fmt = "%d" if vals.dtype == bool else FLOAT_FMT
+            with xf.element(q(fld)):
+                xf.write(" ".join([fmt] * len(vals)) % tuple(vals.tolist()))
+            xf.write("\n")
+    xf.write("\n")
+
+
+# ###########################################################################
+# # MAIN ROUTINE
+# ###########################################################################
+def main():
+    """
+    """
+    parser = ArgumentParser()
+    parser.add_argument("-o", "--out_path", type=str, required=True,
+                        help="Path of the MVNX file to be generated")
+    parser.add_argument("-d", "--duration", type=float, default=60,
+                        help="Duration of the capture in seconds")
+    parser.add_argument("--fps", type=int, default=60,
+                        help="Frames per second")
+    parser.add_argument("-s", "--segments", type=int, default=23,
+                        help="Number of segments")
+    parser.add_argument("-n", "--sensors", type=int, default=17,
+                        help="Number of sensors")
+    parser.add_argument("-F", "--fields", type=str, nargs="+", default=None,
+                        help="Frame fields to include. Default: " +
+                        str(FRAME_FIELDS))
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Random seed for the generated motion")
+    args = parser.parse_args()
+
+    n_frames = write_synthetic_mvnx(args.out_path, args.duration, args.fps,
+                                    args.segments, args.sensors,
+                                    args.fields, args.seed)
+    print("wrote", n_frames, "frames to", args.out_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,18 @@ saves them as CSV to a desired path. Usage example::
 
   python mvnx_to_csv.py -x '/home/mvn1e/git_work/dance-mocap/mvnx_files/ILF12_20191207_SEQ1_REC-001.mvnx' -o /tmp  -F centerOfMass position velocity acceleration
 
+The tables can also be saved as Parquet, Feather or HDF5 (see
+``OUTPUT_FORMATS``), optionally compressed, downcast to float32, and all
+into a single file. Columnar formats can be read back partially, e.g.
+``load_table("/tmp/position.parquet", columns=["ms", "RightHand_x"])``::
+
+  python mvnx_to_csv.py -x ILF12_20191207_SEQ1_REC-001.mvnx -o /tmp --format parquet --compression zstd --float32
+
+For long captures, the ``--chunk_size`` flag combined with ``--streaming``
+converts and appends the frames in chunks, so memory stays bounded. The
+``--fps`` flag resamples the frames to a different frame rate (see
+``mvnx_resample.py``).
+
 Check the -h flag for help.
 
 The code is very tightly related to the MVNX format. Please check section 14.4:
@@ -20,7 +32,9 @@ import lxml
 import numpy as np
 import pandas as pd
 #
-from mvnx import Mvnx
+from mvnx import Mvnx, FRAME_BLOCK_SIZE
+from mvnx_cache import MvnxCache
+from mvnx_resample import resample_frames
 
 
 ###############################################################################
@@ -37,13 +51,21 @@ class MvnxToTabular:
     """
     ALLOWED_FIELDS = {"orientation", "position", "velocity", "acceleration",
                   "angularVelocity", "angularAcceleration", "footContacts",
-                  "jointAngle", "centerOfMass", "ms"}
+                  "jointAngle", "jointAngleXZY", "sensorFreeAcceleration",
+                  "sensorMagneticField", "sensorOrientation",
+                  "centerOfMass", "ms"}
     # vectors of NUM_SEGMENTS*n where n is 4 or 3 respectively
     SEGMENT_4D_FIELDS = {"orientation"}
     SEGMENT_3D_FIELDS = {"position", "velocity",
                          "acceleration", "angularVelocity",
-                         "angularAceleration"}
-    # check manual, 22.7.3, "JointAngle"s are in ZXY if not specified
+                         "angularAcceleration"}
+    # vectors of jointCount*3 and sensorCount*n, where n is 3 or 4
+    JOINT_3D_FIELDS = {"jointAngle", "jointAngleXZY"}
+    SENSOR_3D_FIELDS = {"sensorFreeAcceleration", "sensorMagneticField"}
+    SENSOR_4D_FIELDS = {"sensorOrientation"}
+    # check manual, 22.7.3, "JointAngle"s are in ZXY if not specified.
+    # Joint labels are taken from the MVNX joints, this list is only used if
+    # the file doesn't list them
     JOINT_ANGLE_3D_LIST = ["L5S1", "L4L3", "L1T12", "C1Head",
                            "C7LeftShoulder", "LeftShoulder", "LeftShoulderXZY",
                            "LeftElbow", "LeftWrist", "Lefthip", "LeftKnee",
@@ -55,50 +77,130 @@ class MvnxToTabular:
     FOOT_CONTACTS = ["left_heel_on_ground", "left_toe_on_ground",
                      "right_heel_on_ground", "right_toe_on_ground"]
 
-    def __init__(self, mvnx):
+    def __init__(self, mvnx, frame_fields=None, chunk_size=None, fps=None):
         """
+        :param frame_fields: If given, only these frame fields are extracted
+          from the MVNX, and only them can be later processed.
+        :param int chunk_size: If given, frames are not extracted here, but
+          ``chunk_size`` frames at a time by ``iter_chunks``, so memory
+          usage doesn't grow with the capture length (if the MVNX is in
+          streaming or cached mode). In that case, ``__call__`` can't be used.
+        :param fps: If given, the normal frames are resampled to this frame
+          rate via ``mvnx_resample.resample_frames``. Not supported in
+          chunked mode.
         """
+        assert fps is None or chunk_size is None, \
+            "Resampling is not supported in chunked mode"
         assert mvnx.mvnx.subject.attrib["configuration"] == "FullBody", \
             "This processor works only in FullBody MVNX configurations"
-        # extract skeleton and frame info
+        # extract skeleton and frame info. Normal frames are extracted in
+        # columnar form: a dict of contiguous arrays, one per field
         joints, seg_detail, seg_names_sorted = self._parse_skeleton(mvnx)
-        frames_metadata, config_f, normal_f = mvnx.extract_frame_info()
+        if chunk_size is None:
+            frames_metadata, config_f, normal_f = mvnx.extract_frame_info(
+                columnar=True, dtype=np.float64, fields=frame_fields)
+            if fps is not None:
+                source_fps = mvnx.mvnx.subject.attrib.get("frameRate")
+                normal_f = resample_frames(
+                    normal_f, fps,
+                    None if source_fps is None else float(source_fps))
+        else:
+            frames_metadata, config_f, normal_f = None, None, None
         #
         self.mvnx = mvnx
+        self.frame_fields = frame_fields
+        self.chunk_size = chunk_size
+        self.fps = fps
         self.seg_names_sorted = seg_names_sorted
         self.seg_detail = seg_detail
         self.joints = joints
         self.n_seg = len(self.seg_names_sorted)
         self.n_j = len(self.joints)
+        self.sensor_names = mvnx.extract_sensors()
+        self.n_sens = len(self.sensor_names)
+        self.joint_names = [j[0] for j in joints]
+        # sanity check against the frames metadata
+        counts = mvnx.mvnx.subject.frames.attrib
+        if not self.joint_names and int(counts.get("jointCount", 0)) == len(
+                self.JOINT_ANGLE_3D_LIST):
+            self.joint_names = list(self.JOINT_ANGLE_3D_LIST)
+        for key, names in [("segmentCount", self.seg_names_sorted),
+                           ("sensorCount", self.sensor_names),
+                           ("jointCount", self.joint_names)]:
+            assert key not in counts or int(counts[key]) == len(names), \
+                f"Inconsistent {key}? {counts[key]} != {len(names)}"
         #
         self.frames_metadata = frames_metadata
         self.config_frames = config_f
         self.normal_frames = normal_f
+        self.n_frames = None if normal_f is None else len(normal_f["index"])
+        # column indexes are created once and shared among tables
+        self.columns = self._make_columns()
 
     def _parse_skeleton(self, mvnx):
         """
         """
-        # Retrieve every segment keypoint with XYZ positions
-        segproc = lambda seg: np.fromstring(seg.pos_b.text, dtype=np.float32,
-                                            sep=" ")
-        seg_detail = {(s.attrib["label"], ch.attrib["label"]): segproc(ch)
-                      for s in mvnx.mvnx.subject.segments.iterchildren()
-                      for ch in s.points.iterchildren()}
-        # Retrieve every joint as a relation of segment details
-        joints = [(j.attrib["label"],
-                   j.connector1,
-                   seg_detail[tuple(j.connector1.text.split("/"))],
-                   j.connector2,
-                   seg_detail[tuple(j.connector2.text.split("/"))])
-                  for j in mvnx.mvnx.subject.joints.iterchildren()]
-        # Retrieve segment names sorted by ID
-        seg_names_sorted = [s.attrib["label"] for s in
-                            sorted(mvnx.mvnx.subject.segments.iterchildren(),
-                                   key=lambda elt: int(elt.attrib["id"]))]
-        return joints, seg_detail, seg_names_sorted
+        return mvnx.extract_skeleton()
 
-    def __call__(self, frame_fields):
+    def _make_columns(self):
+        """
+        :returns: A dict in the form ``{field_name: pd.Index}`` with the data
+          columns of each table (i.e. without ``frame_idx`` and ``ms``).
+        """
+        columns_3d = pd.Index(["_".join([c, dim])
+                               for c in self.seg_names_sorted
+                               for dim in ["x", "y", "z"]])
+        columns_4d = pd.Index(["_".join([c, dim])
+                               for c in self.seg_names_sorted
+                               for dim in ["q0", "q1", "q2", "q3"]])
+        columns = {fld: columns_3d for fld in sorted(self.SEGMENT_3D_FIELDS)}
+        columns.update({fld: columns_4d
+                        for fld in sorted(self.SEGMENT_4D_FIELDS)})
+        columns_joints = pd.Index(["_".join([c, dim])
+                                   for c in self.joint_names
+                                   for dim in ["x", "y", "z"]])
+        columns_sens_3d = pd.Index(["_".join([c, dim])
+                                    for c in self.sensor_names
+                                    for dim in ["x", "y", "z"]])
+        columns_sens_4d = pd.Index(["_".join([c, dim])
+                                    for c in self.sensor_names
+                                    for dim in ["q0", "q1", "q2", "q3"]])
+        columns.update({fld: columns_joints
+                        for fld in sorted(self.JOINT_3D_FIELDS)})
+        columns.update({fld: columns_sens_3d
+                        for fld in sorted(self.SENSOR_3D_FIELDS)})
+        columns.update({fld: columns_sens_4d
+                        for fld in sorted(self.SENSOR_4D_FIELDS)})
+        columns["footContacts"] = pd.Index(self.FOOT_CONTACTS)
+        columns["centerOfMass"] = pd.Index(
+            ["centerOfMass_x", "centerOfMass_y", "centerOfMass_z"])
+        return columns
+
+    def _make_dataframe(self, fld, normal_frames, row_offset=0):
+        """
+        Builds the table of the given field straight from the contiguous
+        array block: the values are reshaped into ``(frames, columns)``
+        without copying, and the ``frame_idx`` and ``ms`` columns are
+        prepended.
+
+        :param row_offset: Row index of the first frame, for chunks.
+        """
+        block = normal_frames[fld]
+        block = np.ascontiguousarray(block.reshape(len(block), -1))
+        assert block.shape[1] == len(self.columns[fld]), \
+            f"{fld}: {block.shape[1]} values per frame, expected " + \
+            f"{len(self.columns[fld])}"
+        df = pd.DataFrame(block, columns=self.columns[fld], copy=False,
+                          index=pd.RangeIndex(row_offset,
+                                              row_offset + len(block)))
+        df.insert(0, "ms", normal_frames["ms"])
+        df.insert(0, "frame_idx", normal_frames["index"])
+        return df
+
+    def _make_dataframes(self, frame_fields, normal_frames, row_offset=0):
         """
+        :returns: A dict in the form ``{field_name: pd.DataFrame}`` with one
+          table per requested field, with one row per given normal frame.
         """
         # sanity check
         if frame_fields is None:
@@ -106,77 +208,339 @@ class MvnxToTabular:
         assert all([f in self.ALLOWED_FIELDS for f in frame_fields]), \
             f"Error! allowed fields: {self.ALLOWED_FIELDS}"
         #
+        verbose = row_offset == 0
         dataframes = {}
-        # process 3d segment data
-        for fld in self.SEGMENT_3D_FIELDS:
-            columns_3d = ["frame_idx", "ms"] + ["_".join([c, dim])
-                                                for c in self.seg_names_sorted
-                                                for dim in ["x", "y", "z"]]
-            if fld in frame_fields:
-                print("processing", fld)
-                df = pd.DataFrame(([frm["index"], frm["ms"]] + frm[fld]
-                                   for frm in self.normal_frames),
-                                  columns=columns_3d)
-                dataframes[fld] = df
-        # process 4d segment data
-        for fld in self.SEGMENT_4D_FIELDS:
-            columns_4d = ["frame_idx", "ms"] + [
-                "_".join([c, dim]) for c in self.seg_names_sorted
-                for dim in ["q0", "q1", "q2", "q3"]]
-            if fld in frame_fields:
-                print("processing", fld)
-                df = pd.DataFrame(([frm["index"], frm["ms"]] + frm[fld]
-                                   for frm in self.normal_frames),
-                                  columns=columns_4d)
-                dataframes[fld] = df
-        # process foot contacts
-        fld = "footContacts"
-        if fld in frame_fields:
-            print("processing", fld)
-            columns_foot = ["frame_idx", "ms"] + self.FOOT_CONTACTS
-            df = pd.DataFrame(([frm["index"], frm["ms"]] +
-                               [bool(x) for x in frm[fld].text.split(" ")]
-                               for frm in self.normal_frames),
-                              columns=columns_foot)
-            dataframes[fld] = df
-        # process center of mass
-        fld = "centerOfMass"
-        if fld in frame_fields:
-            print("processing", fld)
-            columns_com = ["frame_idx", "ms",
-                           "centerOfMass_x", "centerOfMass_y", "centerOfMass_z"]
-            df = pd.DataFrame(([frm["index"], frm["ms"]] +
-                               frm[fld]
-                               for frm in self.normal_frames),
-                              columns=columns_com)
-            dataframes[fld] = df
+        for fld in self.columns:
+            if fld not in frame_fields:
+                continue
+            elif fld not in normal_frames:
+                if verbose:
+                    print("skipping", fld, "(not in the MVNX frames)")
+            else:
+                if verbose:
+                    print("processing", fld)
+                dataframes[fld] = self._make_dataframe(fld, normal_frames,
+                                                       row_offset)
         #
         return dataframes
 
+    def __call__(self, frame_fields):
+        """
+        :returns: A dict in the form ``{field_name: pd.DataFrame}`` with one
+          table per requested field, with one row per normal frame.
+        """
+        assert self.normal_frames is not None, \
+            "Frames not extracted in chunked mode, use iter_chunks"
+        return self._make_dataframes(frame_fields, self.normal_frames)
+
+    def iter_chunks(self, frame_fields):
+        """
+        Chunked counterpart of ``__call__``, see ``Mvnx.iter_frame_arrays``.
+        The row indexes of the tables continue from one chunk to the next,
+        so concatenating the chunks gives the output of ``__call__``.
+
+        :returns: A generator of ``{field_name: pd.DataFrame}`` dicts with up
+          to ``self.chunk_size`` rows each.
+        """
+        chunk_size = self.chunk_size or FRAME_BLOCK_SIZE
+        row_offset = 0
+        for f_meta, config_f, normal_f in self.mvnx.iter_frame_arrays(
+                chunk_size, np.float64, self.frame_fields):
+            self.frames_metadata = f_meta
+            self.config_frames = config_f
+            yield self._make_dataframes(frame_fields, normal_f, row_offset)
+            row_offset += len(normal_f["index"])
+        self.n_frames = row_offset
+
+
+###############################################################################
+### OUTPUT FORMATS
+###############################################################################
+# file extension of each output format. Parquet and Feather require pyarrow,
+# and HDF5 requires PyTables: pandas raises an ImportError if missing
+OUTPUT_FORMATS = {"csv": ".csv", "parquet": ".parquet",
+                  "feather": ".feather", "hdf5": ".h5"}
+# extra file extensions of compressed CSV files, so pandas infers them back
+CSV_COMPRESSION_EXTENSIONS = {"gzip": ".gz", "bz2": ".bz2", "zip": ".zip",
+                              "xz": ".xz", "zstd": ".zst"}
+# separator between field name and column name in single-file wide tables,
+# e.g. "position.RightHand_x"
+WIDE_COLUMN_SEP = "."
+META_COLUMNS = ["frame_idx", "ms"]
+
+
+def downcast_floats(df):
+    """
+    :returns: The given dataframe with its float64 columns as float32.
+    """
+    return df.astype({c: np.float32 for c, dt in df.dtypes.items()
+                      if dt == np.float64})
+
+
+def wide_table(dataframes):
+    """
+    Merges the given per-field tables into a single table, sharing the
+    ``META_COLUMNS`` and prefixing the rest with ``<field>.``.
+    """
+    dfs = list(dataframes.items())
+    meta = dfs[0][1][META_COLUMNS]
+    return pd.concat([meta] + [
+        df.drop(columns=META_COLUMNS).add_prefix(fld + WIDE_COLUMN_SEP)
+        for fld, df in dfs], axis=1)
+
+
+def output_path(out_dir, name, fmt="csv", compression=None):
+    """
+    :returns: The path where ``TableWriter`` writes the given table name.
+    """
+    ext = OUTPUT_FORMATS[fmt]
+    if fmt == "csv" and compression is not None:
+        ext += CSV_COMPRESSION_EXTENSIONS[compression]
+    return os.path.join(out_dir, name + ext)
+
+
+class TableWriter:
+    """
+    Writes the tables returned by ``MvnxToTabular`` in a given format, one
+    chunk of rows at a time: the first chunk creates the output files and
+    the next ones are appended to them. Usage example::
+
+      with TableWriter("/tmp", "parquet") as writer:
+          for dataframes in processor.iter_chunks(fields):
+              writer.write(dataframes)
+      print(writer.outputs)
+
+    CSV chunks are appended as text (with the header only in the first one),
+    so the result is byte-identical to writing all rows at once. HDF5 tables
+    are appended in "table" format, and Parquet/Feather chunks are written
+    as row groups/record batches via pyarrow writers kept open until
+    ``close``.
+    """
+    def __init__(self, out_dir, fmt="csv", compression=None, float32=False,
+                 single_file_name=None):
+        """
+        :param compression: Codec name, format-dependent: for CSV one of
+          ``CSV_COMPRESSION_EXTENSIONS``, for Parquet e.g. ``snappy`` or
+          ``zstd``, for Feather ``lz4``, ``zstd`` or ``uncompressed``, for
+          HDF5 a PyTables ``complib`` like ``zlib`` or ``blosc:lz4``. None
+          uses the format default.
+        :param bool float32: If true, float columns are downcast to float32.
+        :param single_file_name: If None, each table is saved into its own
+          ``<out_dir>/<field_name>.<ext>`` file. Otherwise, all of them are
+          saved into ``<out_dir>/<single_file_name>.<ext>``: for HDF5, each
+          table is stored under its field name as key, for the other formats
+          they are merged via ``wide_table``.
+        """
+        assert fmt in OUTPUT_FORMATS, \
+            f"Error! allowed formats: {list(OUTPUT_FORMATS)}"
+        self.out_dir = out_dir
+        self.fmt = fmt
+        self.compression = compression
+        self.float32 = float32
+        self.single_file_name = single_file_name
+        self.outputs = []
+        self._arrow_writers = {}  # {path: pyarrow writer}
+
+    def __enter__(self):
+        """
+        """
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """
+        """
+        self.close()
+
+    def write(self, dataframes):
+        """
+        Appends the given chunk of tables to the outputs.
+
+        :param dataframes: Dict in the form ``{field_name: pd.DataFrame}``.
+          All chunks must have the same fields.
+        """
+        if self.float32:
+            dataframes = {k: downcast_floats(v)
+                          for k, v in dataframes.items()}
+        if self.single_file_name is None:
+            tables = [(k, k, v) for k, v in dataframes.items()]
+        elif self.fmt == "hdf5":
+            tables = [(self.single_file_name, k, v)
+                      for k, v in dataframes.items()]
+        else:
+            tables = [(self.single_file_name, self.single_file_name,
+                       wide_table(dataframes))]
+        #
+        for name, key, df in tables:
+            path = output_path(self.out_dir, name, self.fmt,
+                               self.compression)
+            first = path not in self.outputs
+            if first:
+                self.outputs.append(path)
+                if self.fmt == "hdf5" and os.path.isfile(path):
+                    # HDF5 tables are added to existing files
+                    os.remove(path)
+            self._append(df, path, key, first)
+
+    def _append(self, df, path, key, first):
+        """
+        Writes a single table chunk to the given path.
+
+        :param key: Key of the table in the HDF5 file.
+        :param bool first: Whether this is the first chunk of the table.
+        """
+        if self.fmt == "csv":
+            assert first or self.compression != "zip", \
+                "Can't append chunks to zip-compressed CSV"
+            df.to_csv(path, mode="w" if first else "a", header=first,
+                      compression=self.compression)
+        elif self.fmt == "hdf5":
+            # the "table" format allows appending. Only the META_COLUMNS
+            # are data columns (i.e. queryable via where=): every data
+            # column slows down each append considerably, and the rest can
+            # still be selected by name
+            df.to_hdf(path, key=key, mode="a", format="table", append=True,
+                      index=False, data_columns=META_COLUMNS,
+                      complib=self.compression,
+                      complevel=None if self.compression is None else 9)
+        else:
+            import pyarrow as pa
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            writer = self._arrow_writers.get(path)
+            if writer is None:
+                writer = self._open_arrow_writer(path, table.schema)
+                self._arrow_writers[path] = writer
+            writer.write_table(table)
+
+    def _open_arrow_writer(self, path, schema):
+        """
+        :returns: A pyarrow writer for Parquet, or for Feather (i.e. the Arrow
+          IPC file format).
+        """
+        import pyarrow as pa
+        if self.fmt == "parquet":
+            import pyarrow.parquet as pq
+            return pq.ParquetWriter(path, schema,
+                                    compression=self.compression or "snappy")
+        compression = self.compression or "lz4"
+        options = pa.ipc.IpcWriteOptions(
+            compression=None if compression == "uncompressed"
+            else compression)
+        return pa.ipc.new_file(path, schema, options=options)
+
+    def close(self):
+        """
+        Closes the open pyarrow writers. Needed for Parquet and Feather.
+        """
+        for writer in self._arrow_writers.values():
+            writer.close()
+        self._arrow_writers = {}
+
+
+def save_tables(dataframes, out_dir, fmt="csv", compression=None,
+                float32=False, single_file_name=None):
+    """
+    Saves the tables returned by ``MvnxToTabular`` in the given format, in a
+    single chunk. See ``TableWriter`` for the parameters.
+
+    :returns: The list of saved paths.
+    """
+    with TableWriter(out_dir, fmt, compression, float32,
+                     single_file_name) as writer:
+        writer.write(dataframes)
+    return writer.outputs
+
+
+def load_table(path, columns=None, key=None):
+    """
+    Loads a table saved by ``save_tables``, with the format given by the file
+    extension. For Parquet and Feather, only the requested columns are read
+    from disk. HDF5 tables store their rows contiguously, so the requested
+    columns are selected from whole rows: this saves memory, but not disk
+    reads.
+
+    :param columns: Optional list of column names to load, e.g.
+      ``["frame_idx", "RightHand_x"]``, or ``["position.RightHand_x"]`` for
+      single-file wide tables. Default loads all.
+    :param key: For HDF5 files, the table key (i.e. field name). Can be
+      omitted if the file contains a single table.
+    """
+    if path.endswith(OUTPUT_FORMATS["parquet"]):
+        return pd.read_parquet(path, columns=columns)
+    elif path.endswith(OUTPUT_FORMATS["feather"]):
+        return pd.read_feather(path, columns=columns)
+    elif path.endswith(OUTPUT_FORMATS["hdf5"]):
+        return pd.read_hdf(path, key=key, columns=columns)
+    # CSV: the first (unnamed) column is the row index
+    usecols = None if columns is None else (
+        lambda c: c in columns or c.startswith("Unnamed: 0"))
+    return pd.read_csv(path, index_col=0, usecols=usecols)
+
 
 # ###########################################################################
 # # MAIN ROUTINE
 # ###########################################################################
-parser = ArgumentParser()
-parser.add_argument("-x", "--mvnx", type=str, required=True,
-                    help="MVNX motion capture file to be loaded")
-parser.add_argument("-o", "--out_dir", type=str, required=True,
-                    help="Output path for the CSV files")
-parser.add_argument("-S", "--mvnx_schema", type=str, default=None,
-                    help="XML validation schema for the given MVNX (optional)")
-parser.add_argument("-F", "--fields", type=str, nargs="+", default=None,
-                    help="Field names to retrieve. Default takes all.")
-args = parser.parse_args()
-
-MVNX_PATH = args.mvnx
-OUT_DIR = args.out_dir
-SCHEMA_PATH = args.mvnx_schema
-FIELDS = args.fields
-
-m = Mvnx(MVNX_PATH, SCHEMA_PATH)
-processor = MvnxToTabular(m)
-dataframes = processor(FIELDS)
-for df_name, df in dataframes.items():
-    outpath = os.path.join(OUT_DIR, df_name + ".csv")
-    df.to_csv(outpath)
-    print("saved dataframe to", outpath)
+def main():
+    """
+    """
+    parser = ArgumentParser()
+    parser.add_argument("-x", "--mvnx", type=str, required=True,
+                        help="MVNX motion capture file to be loaded")
+    parser.add_argument("-o", "--out_dir", type=str, required=True,
+                        help="Output directory for the tables")
+    parser.add_argument("-S", "--mvnx_schema", type=str, default=None,
+                        help="XML validation schema for the given MVNX " +
+                        "(optional)")
+    parser.add_argument("-F", "--fields", type=str, nargs="+", default=None,
+                        help="Field names to retrieve. Default takes all.")
+    parser.add_argument("--streaming", action="store_true",
+                        help="Stream the MVNX frames instead of loading the " +
+                        "whole XML tree into memory")
+    parser.add_argument("-C", "--cache_dir", type=str, default=None,
+                        help="If given, the parsed MVNX is cached here and " +
+                        "later conversions load it from the cache")
+    parser.add_argument("--format", type=str, default="csv",
+                        choices=list(OUTPUT_FORMATS),
+                        help="Output format of the tables")
+    parser.add_argument("--compression", type=str, default=None,
+                        help="Compression codec, format-dependent (e.g. " +
+                        "gzip for CSV, zstd for Parquet/Feather, blosc:lz4 " +
+                        "for HDF5). Default: format default")
+    parser.add_argument("--float32", action="store_true",
+                        help="Downcast float columns to float32")
+    parser.add_argument("--single_file", action="store_true",
+                        help="Save all tables into a single file named " +
+                        "after the MVNX, instead of one file per field")
+    parser.add_argument("--chunk_size", type=int, default=None,
+                        help="If given, frames are converted and appended " +
+                        "to the outputs this many at a time, with bounded " +
+                        "memory (use with --streaming or -C)")
+    parser.add_argument("--fps", type=float, default=None,
+                        help="If given, frames are resampled to this frame " +
+                        "rate (e.g. 15 or 30). Not supported with " +
+                        "--chunk_size")
+    args = parser.parse_args()
+
+    MVNX_PATH = args.mvnx
+    OUT_DIR = args.out_dir
+    SCHEMA_PATH = args.mvnx_schema
+    FIELDS = args.fields
+    STREAMING = args.streaming
+    CACHE = None if args.cache_dir is None else MvnxCache(args.cache_dir)
+
+    m = Mvnx(MVNX_PATH, SCHEMA_PATH, streaming=STREAMING, cache=CACHE)
+    processor = MvnxToTabular(m, FIELDS, args.chunk_size, args.fps)
+    single_file_name = (os.path.splitext(os.path.basename(MVNX_PATH))[0]
+                        if args.single_file else None)
+    with TableWriter(OUT_DIR, args.format, args.compression, args.float32,
+                     single_file_name) as writer:
+        if args.chunk_size is None:
+            writer.write(processor(FIELDS))
+        else:
+            for dataframes in processor.iter_chunks(FIELDS):
+                writer.write(dataframes)
+    for outpath in writer.outputs:
+        print("saved dataframe to", outpath)
+
+
+if __name__ == "__main__":
+    main()
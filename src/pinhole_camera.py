@@ -0,0 +1,193 @@
+# -*- coding:utf-8 -*-
+
+
+"""
+This module implements a Blender-compatible pinhole camera in NumPy, to
+project 3D points (e.g. the dots computed by ``mvnx_fk``) into the rendered
+images for many frames at once, without Blender. Usage example::
+
+  cam = PinholeCamera(FRONTAL_CAM["location"],
+                      np.radians(FRONTAL_CAM["rotation_deg"]),
+                      FRONTAL_CAM["focal_length"], RESOLUTION_WH)
+  # MVNX global coordinates to Blender world, as placed by render_dots.py
+  world = transform_points(dots, MVNX_POSITION, MVNX_ROTATION)  # (N, D, 3)
+  view = cam.world_to_camera_view(world)  # (N, D, 3)
+  pixels = cam.world_to_pixels(world)  # (N, D, 2)
+
+The conventions follow Blender:
+
+* Location in meters and rotation as Euler angles in radians, with the
+  ``XYZ`` order of ``Object.rotation_euler`` (i.e. ``R = Rz @ Ry @ Rx``).
+* The camera looks along its local ``-Z`` axis, with ``+Y`` pointing up in
+  the image. With zero rotation, it looks straight down.
+* The sensor fit is ``AUTO``: the sensor width (36mm by default) spans the
+  larger image dimension. Pixels are assumed square.
+* ``world_to_camera_view`` matches ``bpy_extras.object_utils``: ``x`` and
+  ``y`` are normalized to ``[0, 1]`` inside the image, from the bottom-left
+  corner, and ``z`` is the depth along the viewing direction (negative
+  behind the camera).
+
+Pixel coordinates, in contrast, have the origin at the top-left corner and
+``y`` pointing down, as in the rendered images (the center of the top-left
+pixel is ``(0.5, 0.5)``).
+"""
+
+
+from math import radians, cos, sin
+#
+import numpy as np
+#
+import quaternions
+
+
+__author__ = "Andres FR"
+
+
+# #############################################################################
+# ## GLOBALS
+# #############################################################################
+
+SENSOR_WIDTH = 36  # milimeters, Blender default
+# The scene of render_dots.py: where the MVNX armature is placed, and the
+# cameras
+RESOLUTION_WH = (1920, 1080)
+MVNX_POSITION = (-0.1, -0.07, 0)
+MVNX_ROTATION = (0, 0, radians(-6.6))  # euler angle
+FRONTAL_CAM = {"location": (11.96, 0.04, 1),
+               "rotation_deg": (90.0, 0.0, 90.0),
+               "focal_length": 100}
+SIDE_CAM_DIST = 8.16
+SIDE_CAM_ANGLE = -60
+SIDE_CAM = {"location": (SIDE_CAM_DIST * cos(radians(SIDE_CAM_ANGLE)),
+                         SIDE_CAM_DIST * sin(radians(SIDE_CAM_ANGLE)),
+                         1.6),
+            "rotation_deg": (86.0, 0.0, 90 + SIDE_CAM_ANGLE),
+            "focal_length": 100}
+CAMERAS = {"FrontalCam": FRONTAL_CAM, "SideCam": SIDE_CAM}
+
+
+# #############################################################################
+# ## HELPERS
+# #############################################################################
+
+def euler_to_matrix(rotation_euler):
+    """
+    :param rotation_euler: XYZ Euler angles in radians, as in Blender's
+      ``Object.rotation_euler`` with the default ``XYZ`` order.
+    :returns: The corresponding ``(3, 3)`` rotation matrix.
+    """
+    q = quaternions.from_euler(np.asarray(rotation_euler, dtype=np.float64),
+                               "xyz")
+    return quaternions.to_rotation_matrix(q)
+
+
+def transform_points(points, location, rotation_euler):
+    """
+    Applies the transform of a Blender object (e.g. the armature) to the
+    given points of shape ``(..., 3)``, expressed in the object's local frame.
+
+    :returns: The world coordinates, of same shape as ``points``.
+    """
+    rot = euler_to_matrix(rotation_euler)
+    return points @ rot.T + np.asarray(location, dtype=np.float64)
+
+
+# #############################################################################
+# ## CAMERA
+# #############################################################################
+
+class PinholeCamera:
+    """
+    Perspective camera with Blender semantics. See this module's docstring
+    for details and usage examples.
+    """
+    def __init__(self, location, rotation_euler, focal_length=50,
+                 resolution_wh=RESOLUTION_WH, sensor_width=SENSOR_WIDTH):
+        """
+        :param location: XYZ location of the camera in meters.
+        :param rotation_euler: XYZ Euler angles of the camera in radians.
+        :param float focal_length: In milimeters, like ``Camera.lens``.
+        :param resolution_wh: Rendered image size in pixels, i.e. the render
+          resolution times the resolution percentage.
+        :param float sensor_width: In milimeters, spanning the larger image
+          dimension (sensor fit ``AUTO``).
+        """
+        self.location = np.asarray(location, dtype=np.float64)
+        self.rotation = euler_to_matrix(rotation_euler)
+        self.focal_length = focal_length
+        self.resolution_wh = tuple(resolution_wh)
+        self.sensor_width = sensor_width
+        w, h = self.resolution_wh
+        # focal length in pixels, equal for both axes
+        self.focal_px = focal_length / sensor_width * max(w, h)
+
+    @classmethod
+    def from_blender(cls, cam_obj, scene):
+        """
+        Builds the camera from a Blender camera object and scene (e.g. to
+        check that both projections match), assuming sensor fit ``AUTO``.
+        """
+        r = scene.render
+        wh = (r.resolution_x * r.resolution_percentage // 100,
+              r.resolution_y * r.resolution_percentage // 100)
+        return cls(tuple(cam_obj.location), tuple(cam_obj.rotation_euler),
+                   cam_obj.data.lens, wh, cam_obj.data.sensor_width)
+
+    @classmethod
+    def from_preset(cls, preset, resolution_wh=RESOLUTION_WH):
+        """
+        :param preset: A dict like ``FRONTAL_CAM``, with the rotation in
+          degrees.
+        """
+        return cls(preset["location"], np.radians(preset["rotation_deg"]),
+                   preset["focal_length"], resolution_wh)
+
+    def world_to_camera(self, points):
+        """
+        :param points: World coordinates of shape ``(..., 3)``.
+        :returns: The coordinates in the camera frame, of same shape.
+        """
+        return (points - self.location) @ self.rotation
+
+    def world_to_camera_view(self, points):
+        """
+        Vectorized version of ``bpy_extras.object_utils.world_to_camera_view``.
+
+        :param points: World coordinates of shape ``(..., 3)``.
+        :returns: Array of shape ``(..., 3)`` with the normalized image
+          coordinates ``(x, y)`` (origin at the bottom-left) and the depth.
+          Points at depth 0 are mapped to ``(0.5, 0.5, 0)``, like in Blender.
+        """
+        local = self.world_to_camera(points)
+        depth = -local[..., 2]
+        safe_depth = np.where(depth == 0, np.inf, depth)
+        w, h = self.resolution_wh
+        x = 0.5 + self.focal_px / w * local[..., 0] / safe_depth
+        y = 0.5 + self.focal_px / h * local[..., 1] / safe_depth
+        return np.stack([x, y, depth], axis=-1)
+
+    def view_to_pixels(self, view):
+        """
+        :param view: Output of ``world_to_camera_view``.
+        :returns: Array of shape ``(..., 2)`` with the pixel coordinates,
+          with the origin at the top-left corner and ``y`` pointing down.
+        """
+        w, h = self.resolution_wh
+        return np.stack([view[..., 0] * w, (1 - view[..., 1]) * h], axis=-1)
+
+    def world_to_pixels(self, points):
+        """
+        :returns: The pixel coordinates of the given world points, see
+          ``view_to_pixels``.
+        """
+        return self.view_to_pixels(self.world_to_camera_view(points))
+
+    def in_view(self, view):
+        """
+        :param view: Output of ``world_to_camera_view``.
+        :returns: Boolean array of shape ``(...)``, true for the points in
+          front of the camera and inside the image.
+        """
+        return ((view[..., 2] > 0) &
+                (view[..., 0] >= 0) & (view[..., 0] <= 1) &
+                (view[..., 1] >= 0) & (view[..., 1] <= 1))
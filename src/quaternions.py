@@ -0,0 +1,263 @@
+# -*- coding:utf-8 -*-
+
+
+"""
+This module implements vectorized quaternion operations for MVNX
+orientation data, e.g. arrays of shape ``(frames, segments, 4)`` as returned
+by ``Mvnx.extract_frame_info(columnar=True)``. All functions operate on the
+last axis and broadcast over the rest, without Python loops. Usage example::
+
+  _, _, normal_frames = Mvnx(MVNX_PATH).extract_frame_info(columnar=True)
+  q = normalize(normal_frames["orientation"])  # (frames, segments, 4)
+  rot = to_rotation_matrix(q)  # (frames, segments, 3, 3)
+  # orientation of the right forearm relative to the upper arm, as the ZXY
+  # Euler angles used by the MVN joint angles, in degrees
+  rel = relative_rotation(q[:, 8], q[:, 9])
+  angles = np.degrees(to_euler(rel, "ZXY"))  # (frames, 3)
+
+Quaternions follow the MVNX convention: scalar first, i.e. ``(q0, q1, q2,
+q3) = (w, x, y, z)``, and they represent rotations from the segment (local)
+frame to the global frame, i.e. ``v_global = rotate(q, v_local)``.
+
+Euler angle orders are given as strings of 3 distinct axes, like scipy's:
+uppercase letters (e.g. ``"ZXY"``) denote intrinsic rotations (about the
+axes of the rotating frame) and lowercase letters (e.g. ``"zxy"``) extrinsic
+rotations (about the fixed axes).
+"""
+
+
+import numpy as np
+
+
+__author__ = "Andres FR"
+
+
+# #############################################################################
+# ## GLOBALS
+# #############################################################################
+
+AXIS_IDX = {"x": 0, "y": 1, "z": 2}
+# below this sine of the rotation angle, SLERP falls back to linear
+# interpolation
+SLERP_EPSILON = 1e-6
+
+
+# #############################################################################
+# ## BASIC OPERATIONS
+# #############################################################################
+
+def normalize(q):
+    """
+    :returns: The given quaternions scaled to unit norm.
+    """
+    return q / np.linalg.norm(q, axis=-1, keepdims=True)
+
+
+def conjugate(q):
+    """
+    :returns: The conjugates ``(w, -x, -y, -z)``. For unit quaternions, this
+      is the inverse rotation.
+    """
+    return q * np.array([1, -1, -1, -1], dtype=q.dtype)
+
+
+def multiply(q1, q2):
+    """
+    :returns: The Hamilton products ``q1 * q2``, i.e. the rotation ``q2``
+      followed by ``q1``.
+    """
+    w1, x1, y1, z1 = np.moveaxis(q1, -1, 0)
+    w2, x2, y2, z2 = np.moveaxis(q2, -1, 0)
+    return np.stack([w1 * w2 - x1 * x2 - y1 * y2 - z1 * z2,
+                     w1 * x2 + x1 * w2 + y1 * z2 - z1 * y2,
+                     w1 * y2 - x1 * z2 + y1 * w2 + z1 * x2,
+                     w1 * z2 + x1 * y2 - y1 * x2 + z1 * w2], axis=-1)
+
+
+def rotate(q, v):
+    """
+    Rotates the 3D vectors ``v`` of shape ``(..., 3)`` by the unit
+    quaternions ``q`` of shape ``(..., 4)``. Instead of two Hamilton
+    products, it uses ``v + 2w (u x v) + 2 u x (u x v)``, with ``u`` the
+    vector part of ``q``.
+    """
+    w = q[..., :1]
+    u = q[..., 1:]
+    uv = np.cross(u, v)
+    return v + 2 * (w * uv + np.cross(u, uv))
+
+
+def relative_rotation(q_ref, q):
+    """
+    :returns: The rotations of ``q`` relative to ``q_ref``, i.e.
+      ``conj(q_ref) * q``. E.g. given the global orientations of a parent
+      and child segment, it's the orientation of the child in the parent
+      frame.
+    """
+    return multiply(conjugate(q_ref), q)
+
+
+def angular_distance(q1, q2):
+    """
+    :returns: The angle in radians (between 0 and pi) of the rotation
+      between the given orientations. ``q`` and ``-q`` are at distance 0.
+    """
+    rel = relative_rotation(q1, q2)
+    return 2 * np.arctan2(np.linalg.norm(rel[..., 1:], axis=-1),
+                          np.abs(rel[..., 0]))
+
+
+def make_continuous(q, axis=0):
+    """
+    :param q: Quaternions sorted in time along the given axis.
+    :returns: A copy of ``q`` where the sign of each quaternion is flipped if
+      needed, so that consecutive quaternions are in the same hemisphere
+      (i.e. the components don't jump between ``q`` and ``-q``).
+    """
+    q = np.moveaxis(q, axis, 0)
+    dots = (q[1:] * q[:-1]).sum(axis=-1, keepdims=True)
+    flips = np.cumsum(dots < 0, axis=0) % 2
+    signs = np.concatenate([np.ones_like(flips[:1]), 1 - 2 * flips])
+    return np.moveaxis(q * signs, 0, axis)
+
+
+def slerp(q0, q1, w):
+    """
+    Spherical linear interpolation between unit quaternions ``q0`` and
+    ``q1``, along the shortest path.
+
+    :param w: Interpolation weights between 0 (``q0``) and 1 (``q1``),
+      broadcastable to ``q0[..., :1]``.
+    """
+    dot = (q0 * q1).sum(axis=-1, keepdims=True)
+    # q and -q are the same rotation: take the shortest path
+    q1 = np.where(dot < 0, -q1, q1)
+    theta = np.arccos(np.clip(np.abs(dot), 0, 1))
+    sin_theta = np.sin(theta)
+    close = sin_theta < SLERP_EPSILON
+    safe_sin = np.where(close, 1, sin_theta)
+    w0 = np.where(close, 1 - w, np.sin((1 - w) * theta) / safe_sin)
+    w1 = np.where(close, w, np.sin(w * theta) / safe_sin)
+    return normalize(w0 * q0 + w1 * q1)
+
+
+# #############################################################################
+# ## CONVERSIONS
+# #############################################################################
+
+def from_axis_angle(axis, angle):
+    """
+    :param axis: Rotation axes of shape ``(..., 3)``, normalized here.
+    :param angle: Rotation angles in radians, of shape ``(...)``.
+    :returns: The corresponding unit quaternions, of shape ``(..., 4)``.
+    """
+    axis = axis / np.linalg.norm(axis, axis=-1, keepdims=True)
+    half = np.asarray(angle)[..., None] / 2
+    return np.concatenate([np.cos(half), np.sin(half) * axis], axis=-1)
+
+
+def to_rotation_matrix(q):
+    """
+    :param q: Unit quaternions of shape ``(..., 4)``.
+    :returns: The rotation matrices of shape ``(..., 3, 3)``, such that
+      ``R @ v == rotate(q, v)``.
+    """
+    w, x, y, z = np.moveaxis(q, -1, 0)
+    xx, yy, zz = x * x, y * y, z * z
+    xy, xz, yz = x * y, x * z, y * z
+    wx, wy, wz = w * x, w * y, w * z
+    rot = np.stack([1 - 2 * (yy + zz), 2 * (xy - wz), 2 * (xz + wy),
+                    2 * (xy + wz), 1 - 2 * (xx + zz), 2 * (yz - wx),
+                    2 * (xz - wy), 2 * (yz + wx), 1 - 2 * (xx + yy)],
+                   axis=-1)
+    return rot.reshape(q.shape[:-1] + (3, 3))
+
+
+def from_rotation_matrix(rot):
+    """
+    :param rot: Rotation matrices of shape ``(..., 3, 3)``.
+    :returns: The unit quaternions of shape ``(..., 4)``, with non-negative
+      scalar part. For each matrix, the numerically most stable of the 4
+      possible formulas is used (Shepperd's method).
+    """
+    m = rot
+    trace = m[..., 0, 0] + m[..., 1, 1] + m[..., 2, 2]
+    # candidates: 4 * (w, x, y, z) * (w, x, y, z)[k], for k the largest
+    cands = np.stack([
+        np.stack([1 + trace, m[..., 2, 1] - m[..., 1, 2],
+                  m[..., 0, 2] - m[..., 2, 0], m[..., 1, 0] - m[..., 0, 1]],
+                 axis=-1),
+        np.stack([m[..., 2, 1] - m[..., 1, 2],
+                  1 + m[..., 0, 0] - m[..., 1, 1] - m[..., 2, 2],
+                  m[..., 0, 1] + m[..., 1, 0], m[..., 0, 2] + m[..., 2, 0]],
+                 axis=-1),
+        np.stack([m[..., 0, 2] - m[..., 2, 0], m[..., 0, 1] + m[..., 1, 0],
+                  1 - m[..., 0, 0] + m[..., 1, 1] - m[..., 2, 2],
+                  m[..., 1, 2] + m[..., 2, 1]], axis=-1),
+        np.stack([m[..., 1, 0] - m[..., 0, 1], m[..., 0, 2] + m[..., 2, 0],
+                  m[..., 1, 2] + m[..., 2, 1],
+                  1 - m[..., 0, 0] - m[..., 1, 1] + m[..., 2, 2]], axis=-1)],
+        axis=-2)
+    diag = np.stack([trace, m[..., 0, 0], m[..., 1, 1], m[..., 2, 2]],
+                    axis=-1)
+    best = np.argmax(diag, axis=-1)[..., None, None]
+    q = normalize(np.take_along_axis(cands, best, axis=-2)[..., 0, :])
+    return np.where(q[..., :1] < 0, -q, q)
+
+
+def _parse_euler_order(order):
+    """
+    :returns: A tuple ``(axes, intrinsic)`` where ``axes`` are the 3 axis
+      indexes of the equivalent intrinsic rotation sequence.
+    """
+    assert len(order) == 3 and (order.isupper() or order.islower()), \
+        "Euler order must be 3 axes, all uppercase or all lowercase!"
+    axes = [AXIS_IDX[a] for a in order.lower()]
+    assert len(set(axes)) == 3, \
+        "Only Tait-Bryan orders (3 distinct axes) are supported!"
+    intrinsic = order.isupper()
+    # an extrinsic sequence equals the reversed intrinsic one
+    return (axes if intrinsic else axes[::-1]), intrinsic
+
+
+def to_euler(q, order="ZXY"):
+    """
+    :param q: Unit quaternions of shape ``(..., 4)``.
+    :param str order: Rotation sequence, see this module's docstring. The
+      default ``ZXY`` is the MVN convention for joint angles.
+    :returns: The Euler angles in radians, of shape ``(..., 3)``, in the
+      given order (i.e. ``angles[..., 0]`` is the angle about
+      ``order[0]``). The middle angle is in ``[-pi/2, pi/2]``. Close to
+      gimbal lock (middle angle of +-90 degrees) the other two are not
+      unique.
+    """
+    (i, j, k), intrinsic = _parse_euler_order(order)
+    # sign of the permutation (i, j, k) of (0, 1, 2)
+    s = 1 if (j - i) % 3 == 1 else -1
+    rot = to_rotation_matrix(q)
+    # for R = R_i(a) R_j(b) R_k(c)
+    b = np.arcsin(np.clip(s * rot[..., i, k], -1, 1))
+    a = np.arctan2(-s * rot[..., j, k], rot[..., k, k])
+    c = np.arctan2(-s * rot[..., i, j], rot[..., i, i])
+    angles = np.stack([a, b, c], axis=-1)
+    return angles if intrinsic else angles[..., ::-1]
+
+
+def from_euler(angles, order="ZXY"):
+    """
+    Inverse of ``to_euler``.
+
+    :param angles: Euler angles in radians, of shape ``(..., 3)``.
+    :returns: Unit quaternions of shape ``(..., 4)``.
+    """
+    axes, intrinsic = _parse_euler_order(order)
+    if not intrinsic:
+        angles = angles[..., ::-1]
+    q = None
+    for n, ax in enumerate(axes):
+        half = angles[..., n] / 2
+        qa = np.zeros(half.shape + (4,))
+        qa[..., 0] = np.cos(half)
+        qa[..., 1 + ax] = np.sin(half)
+        q = qa if q is None else multiply(q, qa)
+    return q
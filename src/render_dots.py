@@ -7,10 +7,21 @@ Scene builder script for Blender. It performs the following tasks:
 HEADLESS EXAMPLE, RENDER SEQUENCE INTO PNG IMAGES (use -v for noisy mp4):
 blender -b --python ~/github-work/dance-mocap/src/render_dots.py -- -o ~/Desktop/test -S ~/github-work/blender-mvnx-io/io_anim_mvnx/data/mvnx_schema_dance_dec19.xsd -x ~/github-work/dance-mocap/mvnx_files/ILF12_20191207_SEQ1_REC-001.mvnx -p 100 -r
 
+PNG rendering is resumable: if the output dir already contains valid PNGs
+(e.g. from an interrupted run), only the missing frames are rendered, and
+progress is logged to render_journal.json. Use --no_resume to render all.
+If the journal shows that the PNGs come from a different MVNX, resolution,
+camera or frame range, the script stops instead, unless --force is given
+(then all frames are rendered again).
+
 INTERACTIVE EXAMPLE:
 blender --python ~/github-work/dance-mocap/src/render_dots.py -- -o ~/Desktop/test -S ~/github-work/blender-mvnx-io/io_anim_mvnx/data/mvnx_schema_dance_dec19.xsd -x ~/github-work/dance-mocap/mvnx_files/ILF12_20191207_SEQ1_REC-001.mvnx -p 100
 
 
+HEADLESS EXAMPLE, RENDER STRAIGHT INTO A LOSSLESS VIDEO (no PNGs, see -P):
+blender -b --python ~/github-work/dance-mocap/src/render_dots.py -- -o ~/Desktop/test -x ~/github-work/dance-mocap/mvnx_files/ILF12_20191207_SEQ1_REC-001.mvnx -p 100 -r -P
+
+
 CONVERT IMAGES TO MP4:
 cat imgs_dir/*.png | ffmpeg -f image2pipe -framerate 60 -i - output.mp4
 
@@ -20,7 +31,16 @@ PIPELINE FOR SINGLE FILE:
 mvnx_name=ILF12_20191207_SEQ1_REC-001.mvnx; out_dir=~/Desktop/$mvnx_name; blender -b --python ~/github-work/dance-mocap/src/render_dots.py -- -o $out_dir/png -S ~/github-work/blender-mvnx-io/io_anim_mvnx/data/mvnx_schema_dance_dec19.xsd -x ~/github-work/dance-mocap/mvnx_files/$mvnx_name -p 100 -r && cat $out_dir/png/*.png | ffmpeg -f image2pipe -framerate 60 -i - $out_dir/$mvnx_name.mp4
 
 
-PIPELINE FOR ALL FILES:
+PARALLEL RENDERING OF A SINGLE FILE WITH SEVERAL BLENDER PROCESSES:
+See render_dots_sharded.py, which uses the --render_start and --render_end
+flags to split the sequence into shards.
+
+
+PIPELINE FOR ALL FILES (SINGLE BLENDER SESSION, EACH INTO <output_dir>/<mvnx_name>/):
+blender -b --python ~/github-work/dance-mocap/src/render_dots.py -- -o ~/Desktop/renders -S ~/github-work/blender-mvnx-io/io_anim_mvnx/data/mvnx_schema_dance_dec19.xsd -x ~/datasets/mocap_library/MVNX/* -p 100 -r
+
+
+PIPELINE FOR ALL FILES (ONE BLENDER PROCESS PER FILE):
 for i in ~/datasets/mocap_library/MVNX/*
 do
   mvnx_name=`basename $i`
@@ -36,14 +56,26 @@ import lxml
 import argparse
 import sys
 import os
+import json
+import time
+import subprocess
 from math import radians, degrees, cos, sin
 
 from mathutils import Vector, Euler  # mathutils is a blender package
 import bpy
+import bmesh
 from bpy_extras.object_utils import world_to_camera_view
+import numpy as np
 
 from io_anim_mvnx.mvnx_import import load_mvnx_into_blender
 
+# Blender doesn't add the script dir to the path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from mvnx_fk import DOT_SPEC
+from pinhole_camera import PinholeCamera
+from render_sequence import FRAME_START, FRAME_STEP, FPS, JOURNAL_NAME, \
+    missing_frame_ranges, remove_frames, journal_mismatches
+
 C = bpy.context
 D = bpy.data
 
@@ -226,33 +258,6 @@ def maximize_layout_3d_area():
 ### GLOBALS
 ###############################################################################
 
-parser = ArgumentParserForBlender()
-parser.add_argument("-x", "--mvnx", type=str, required=True,
-                    help="MVNX motion capture file to be loaded")
-parser.add_argument("-S", "--mvnx_schema", type=str, default=None,
-                    help="XML validation schema for the given MVNX (optional)")
-parser.add_argument("-r", "--render_headless", action="store_true",
-                    help="If given, this script will actually render out")
-parser.add_argument("-o", "--output_dir", default=os.path.expanduser("~"),
-                    type=str, help="Output dir for the renderings")
-parser.add_argument("-p", "--resolution_percentage", type=int, default=100,
-                    help="Smaller resolution -> faster (but worse) render")
-parser.add_argument("-v", "--as_video", action="store_true",
-                    help="if given, MP4 is exported (noisy background)")
-
-args = parser.parse_args()
-
-
-RENDER_HEADLESS = args.render_headless
-OUT_DIR = os.path.join(args.output_dir, "")  # ensure that it is a dir path
-try:
-    os.makedirs(OUT_DIR)
-except FileExistsError:
-    pass
-RESOLUTION_PERCENTAGE = args.resolution_percentage
-AS_VIDEO = args.as_video
-MVNX_PATH = args.mvnx
-SCHEMA_PATH = args.mvnx_schema
 MVNX_POSITION = (-0.1, -0.07, 0)
 MVNX_ROTATION = (0, 0, radians(-6.6))  # euler angle
 
@@ -269,30 +274,15 @@ ALL_KEYPOINTS = {"Pelvis", "L5", "L3", "T12", "T8", "Neck", "Head",
                        "RightToe",
                        "LeftUpperLeg", "LeftLowerLeg", "LeftFoot",
                        "LeftToe"}
-KEYPOINT_SELECTION = {# "Head",
-                      # "Pelvis",
-                      # "L5",
-                      "T12",
-                      # "Neck",
-                      "RightShoulder",
-                      "RightUpperArm",
-                      # "RightForeArm",
-                      # "RightHand",
-                      "LeftShoulder",
-                      "LeftUpperArm",
-                      # "LeftForeArm",
-                      # "LeftHand",
-                      "RightUpperLeg",
-                      # "RightLowerLeg",
-                      "RightFoot",
-                      # "RightToe",
-                      "LeftUpperLeg",
-                      # "LeftLowerLeg",
-                      # "LeftToe",
-                      "LeftFoot"
-}
-
-USED_BONES = KEYPOINT_SELECTION  # ALL_KEYPOINTS
+# The dots are given by mvnx_fk.DOT_SPEC, shared with the Blender-free
+# renderer: see attach_dots
+# icosphere subdivisions of the dot mesh, as in the original per-dot spheres.
+# The mesh is shared by all dots, so its size doesn't scale with their number
+DOT_SUBDIVISIONS = 3
+DOTS_COLLECTION_NAME = "Dots"
+# the 2D ground truth is checked against Blender's projection on a few frames
+GT_CHECK_FRAMES = 3
+GT_TOLERANCE_PX = 0.1
 
 
 INIT_SHADING_MODE = "RENDERED"
@@ -303,8 +293,14 @@ EEVEE_VIEWPORT_SAMPLES = 0  # 1
 EEVEE_VIEWPORT_DENOISING = True
 RESOLUTION_WH = (1920, 1080)
 # sequencer
-FRAME_START = 0  # 1000 # 2  # 1 is T-pose if imported with MakeWalk
+# FRAME_START, FRAME_STEP and FPS are in render_sequence.py, shared with
+# the other renderers
 FRAME_END = None  # 1500  # If not None sequence will be at most this
+# direct video output (see render_to_pipe): frames are piped as raw 16-bit
+# grayscale into ffmpeg, encoded losslessly with FFV1
+PIPE_VIDEO_EXT = ".mkv"
+FFMPEG_OUTPUT_ARGS = ["-c:v", "ffv1", "-level", "3", "-pix_fmt", "gray16le"]
+VIEWER_IMAGE_NAME = "Viewer Node"
 
 # In Blender, x points away from the cam, y to the left and z up
 # (right-hand rule). Locations are in meters, rotation in degrees.
@@ -347,343 +343,516 @@ SIDE_CAM_LIGHT_WATTS = 40.0  # intensity of the bulb in watts
 SIDE_CAM_LIGHT_SHADOW = False
 SIDE_CAM_FOCAL_LENGTH = 100  # milimeters
 
-# ###########################################################################
-# # MAIN ROUTINE
-# ###########################################################################
 
-# general settings
-C.scene.world.node_tree.nodes["Background"].inputs['Color'].default_value = BACKGROUND_COLOR
-
-# rendering
-C.scene.render.fps = 60
-# just map_old=400 shows normal speed on viewport but slow on render.
-# just frame_step=4 shows good render speed but slow viewport
-# both on shows normal viewport speed and 4x fast render.
-# So there seems to be no solution for both viewport and render OK...
-C.scene.render.frame_map_old = 100
-C.scene.render.frame_map_new = 100
-C.scene.frame_step = 4
-#
-C.scene.render.resolution_x = RESOLUTION_WH[0]
-C.scene.render.resolution_y = RESOLUTION_WH[1]
-C.scene.render.resolution_percentage = RESOLUTION_PERCENTAGE
-C.scene.render.engine = "BLENDER_EEVEE"
-C.scene.eevee.use_taa_reprojection = EEVEE_VIEWPORT_DENOISING
-C.scene.eevee.taa_render_samples = EEVEE_RENDER_SAMPLES
-C.scene.eevee.taa_samples = EEVEE_VIEWPORT_SAMPLES
-if AS_VIDEO:
-    C.scene.render.image_settings.file_format = "FFMPEG"
-else:
-    C.scene.render.image_settings.file_format = "PNG"
-#
-C.scene.render.ffmpeg.format = "MPEG4"
-C.scene.render.ffmpeg.codec = "H264"
-C.scene.render.ffmpeg.audio_codec = "NONE"
-C.scene.render.ffmpeg.constant_rate_factor = "LOSSLESS"  # also HIGH, MEDIUM...
-C.scene.render.image_settings.color_depth = "16"
-C.scene.render.image_settings.compression = 50
-C.scene.render.image_settings.color_mode = "BW"  # "RGBA"
-C.scene.render.filepath = OUT_DIR
-#
+###############################################################################
+### SCENE
+###############################################################################
 
+def setup_scene(resolution_percentage=100, as_video=False):
+    """
+    Sets the world and render settings, clears the scene and adds the
+    cameras and the dot material. These are shared by all rendered MVNX
+    files, so this only needs to be called once per Blender session.
 
-# set all 3D screens to RENDERED mode
-set_shading_mode(INIT_SHADING_MODE, D.screens)
-
-# set fullscreen
-if INIT_3D_MAXIMIZED:
-    maximize_layout_3d_area()
-
-
-# select and delete all objects
-bpy.ops.object.select_all(action="SELECT")
-bpy.ops.object.delete()
-purge_unused_data()
-
-# # add a sun
-# bpy.ops.object.light_add(type="SUN", location=SUN_LOC, rotation=SUN_ROT)
-# C.object.name = SUN_NAME
-# C.object.data.name = SUN_NAME
-# C.object.data.energy = SUN_STRENGTH
-
-# add frontal cam
-bpy.ops.object.camera_add(location=FRONTAL_CAM_LOC, rotation=FRONTAL_CAM_ROT)
-frontal_cam = C.object
-C.object.name = FRONTAL_CAM_NAME
-C.object.data.name = FRONTAL_CAM_NAME
-C.object.data.lens = FRONTAL_CAM_FOCAL_LENGTH
-# add side cam
-bpy.ops.object.camera_add(location=SIDE_CAM_LOC, rotation=SIDE_CAM_ROT)
-C.object.name = SIDE_CAM_NAME
-C.object.data.name = SIDE_CAM_NAME
-C.object.data.lens = SIDE_CAM_FOCAL_LENGTH
-
-# # add light as a child of cam
-# bpy.ops.object.light_add(type="POINT", location=CAM_LIGHT_LOC)
-# C.object.name = CAM_LIGHT_NAME
-# C.object.data.name = CAM_LIGHT_NAME
-# C.object.data.energy = CAM_LIGHT_WATTS
-# C.object.parent = get_obj(CAM_NAME)
-# C.object.data.use_shadow = False
-
-
-
-try:
-    armature, mvnx = load_mvnx_into_blender(C, MVNX_PATH, SCHEMA_PATH,
-                                            connectivity="CONNECTED", # "INDIVIDUAL",
-                                            scale=1.0,
-                                            frame_start=FRAME_START,
-                                            inherit_rotations=True,
-                                            add_identity_pose=False,
-                                            add_t_pose=False,
-                                            verbose=True)
-    seq_len = len(armature.animation_data.action.fcurves[0].keyframe_points)
-except Exception as e:
-    if isinstance(e, lxml.etree.DocumentInvalid):
-        print("MNVX didn't pass given validation schema.",
-              "Remove schema path to bypass validation.")
+    :returns: A tuple ``(frontal_cam, side_cam, sphere_material)``.
+    """
+    # general settings
+    C.scene.world.node_tree.nodes["Background"].inputs['Color'].default_value = BACKGROUND_COLOR
+
+    # rendering
+    C.scene.render.fps = FPS
+    # just map_old=400 shows normal speed on viewport but slow on render.
+    # just frame_step=4 shows good render speed but slow viewport
+    # both on shows normal viewport speed and 4x fast render.
+    # So there seems to be no solution for both viewport and render OK...
+    C.scene.render.frame_map_old = 100
+    C.scene.render.frame_map_new = 100
+    C.scene.frame_step = FRAME_STEP
+    #
+    C.scene.render.resolution_x = RESOLUTION_WH[0]
+    C.scene.render.resolution_y = RESOLUTION_WH[1]
+    C.scene.render.resolution_percentage = resolution_percentage
+    C.scene.render.engine = "BLENDER_EEVEE"
+    C.scene.eevee.use_taa_reprojection = EEVEE_VIEWPORT_DENOISING
+    C.scene.eevee.taa_render_samples = EEVEE_RENDER_SAMPLES
+    C.scene.eevee.taa_samples = EEVEE_VIEWPORT_SAMPLES
+    if as_video:
+        C.scene.render.image_settings.file_format = "FFMPEG"
     else:
-        print("Something went wrong:", e)
-
-if FRAME_END is not None:
-    assert FRAME_END > FRAME_START, "Frame end must be bigger than start!"
-    fe = C.scene.frame_end
-    new_fe = int(FRAME_END)
-    if new_fe < fe:
-        fe = new_fe
-else:
-    # subtract 1 because [start, end] instead of [start, end) and Blender
-    # would render a frame at the end with no animation
-    FRAME_END = FRAME_START + seq_len - 1
-C.scene.frame_end = FRAME_END
-
-# readjust armature position
-armature.location = MVNX_POSITION
-armature.rotation_euler = MVNX_ROTATION
-
-
-# define glowing material for all spheres
-sphere_material = bpy.data.materials.new(name="sphere_material")
-sphere_material.use_nodes = True
-bsdf_inputs = sphere_material.node_tree.nodes["Principled BSDF"].inputs
-bsdf_inputs["Specular"].default_value = 0
-bsdf_inputs["Emission"].default_value = DOT_COLOR
-
-
-# # frames_metadata, config_frames, normal_frames = mvnx.extract_frame_info()
-# fcurves = {pb.name: [] for pb in armature.pose.bones}
-# spheres = {}
-# for b in armature.data.bones:
-#     bpy.ops.mesh.primitive_ico_sphere_add(subdivisions=3,
-#                                           radius=DOT_DIAMETER / 2,
-#                                           location=(0, 0, 0))
-#     sph = C.object
-#     spheres[b.name] = sph
-#     sph.data.materials.append(sphere_material)
-
-# print(">>>>>>", fcurves, spheres)
-
-
-# This snippet creates icospheres at the tail of used_bones
-for b in armature.data.bones:
-    if b.name in USED_BONES:
-        bpy.ops.mesh.primitive_ico_sphere_add(subdivisions=3,
-                                              radius=DOT_DIAMETER / 2,
-                                              location=(0, 0, 0))
-        sph = C.object
-        sph.data.materials.append(sphere_material)
-        sph.parent = armature
-        sph.parent_type = "BONE"
-        sph.parent_bone = b.name
-        #
-        # if b.name in ["LeftFoot", "RightFoot"]:
-        #     # set heels to the floor if given
-        #     constraint = bone.constraints.new('COPY_ROTATION')
-        #     b.constraints["Child Of"].use_location_z = False
-
-
-# ADD CUSTOM SPHERES:
-
-# add right upper leg
-bpy.ops.mesh.primitive_ico_sphere_add(subdivisions=3,
-                                      radius=DOT_DIAMETER / 2,
-                                      location=(0, 0, 0))
-sph = C.object
-sph.data.materials.append(sphere_material)
-sph.parent = armature
-sph.parent_type = "BONE"
-sph.parent_bone = "RightUpperLeg"
-sph.location[1] -= armature.pose.bones["RightUpperLeg"].length
-# widen hips
-sph.location[2] -= armature.pose.bones["RightUpperLeg"].length * 0.15
-
-
-# add left upper leg
-bpy.ops.mesh.primitive_ico_sphere_add(subdivisions=3,
-                                      radius=DOT_DIAMETER / 2,
-                                      location=(0, 0, 0))
-sph = C.object
-sph.data.materials.append(sphere_material)
-sph.parent = armature
-sph.parent_type = "BONE"
-sph.parent_bone = "LeftUpperLeg"
-sph.location[1] -= armature.pose.bones["LeftUpperLeg"].length
-# widen hips
-sph.location[2] += armature.pose.bones["LeftUpperLeg"].length * 0.15
-
-
-# add right lower leg
-bpy.ops.mesh.primitive_ico_sphere_add(subdivisions=3,
-                                      radius=DOT_DIAMETER / 2,
-                                      location=(0, 0, 0))
-sph = C.object
-sph.data.materials.append(sphere_material)
-sph.parent = armature
-sph.parent_type = "BONE"
-sph.parent_bone = "RightLowerLeg"
-sph.location[1] += armature.pose.bones["RightLowerLeg"].length * 0.15
-
-# add left lower leg
-bpy.ops.mesh.primitive_ico_sphere_add(subdivisions=3,
-                                      radius=DOT_DIAMETER / 2,
-                                      location=(0, 0, 0))
-sph = C.object
-sph.data.materials.append(sphere_material)
-sph.parent = armature
-sph.parent_type = "BONE"
-sph.parent_bone = "LeftLowerLeg"
-sph.location[1] += armature.pose.bones["LeftLowerLeg"].length * 0.15
-
-# add column
-bpy.ops.mesh.primitive_ico_sphere_add(subdivisions=3,
-                                      radius=DOT_DIAMETER / 2,
-                                      location=(0, 0, 0))
-sph = C.object
-sph.data.materials.append(sphere_material)
-sph.parent = armature
-sph.parent_type = "BONE"
-sph.parent_bone = "L5"
-sph.location[1] -= armature.pose.bones["L5"].length
-
-
-# add head
-bpy.ops.mesh.primitive_ico_sphere_add(subdivisions=3,
-                                      radius=DOT_DIAMETER / 2,
-                                      location=(0, 0, 0))
-sph = C.object
-sph.data.materials.append(sphere_material)
-sph.parent = armature
-sph.parent_type = "BONE"
-sph.parent_bone = "Head"
-sph.location[1] -= armature.pose.bones["Head"].length * 0.618
-
-# add right hand
-bpy.ops.mesh.primitive_ico_sphere_add(subdivisions=3,
-                                      radius=DOT_DIAMETER / 2,
-                                      location=(0, 0, 0))
-sph = C.object
-sph.data.materials.append(sphere_material)
-sph.parent = armature
-sph.parent_type = "BONE"
-sph.parent_bone = "RightHand"
-sph.location[1] -= armature.pose.bones["RightHand"].length * 0.618
-
-# add left hand
-bpy.ops.mesh.primitive_ico_sphere_add(subdivisions=3,
-                                      radius=DOT_DIAMETER / 2,
-                                      location=(0, 0, 0))
-sph = C.object
-sph.data.materials.append(sphere_material)
-sph.parent = armature
-sph.parent_type = "BONE"
-sph.parent_bone = "LeftHand"
-sph.location[1] -= armature.pose.bones["LeftHand"].length * 0.618
-
-
-
-
-
-
-
-
-
-
-
-
-
-CAM_COORD_POSITIONS = []
-icospheres = [(v.parent_bone, v) for k, v in D.objects.items() if "Icosphere" in k]
-pose_bones = {pb.name: pb for pb in D.objects[armature.name].pose.bones}
-for frame_i in range(C.scene.frame_start, C.scene.frame_end + 1,
-                     C.scene.frame_step):
-    print("Collecting positions for frame >>>", frame_i)
-    C.scene.frame_set(frame_i)
-    # C.scene.frame_current = frame_i
-    # bpy.context.view_layer.update()  # does nothing?
-    data = {"frame": frame_i}
-    for ico_bone, ico in icospheres:
-        # get PoseBone global position
-        pb_tail = pose_bones[ico_bone].tail
-        pb_head = pose_bones[ico_bone].head
-        # get PoseBone cam-relative position (x, y) where x goes from left (0)
-        # to right(1), and y from bottom (0) to top(1)
-        pb_tail_cam_xyz = world_to_camera_view(C.scene, frontal_cam, pb_tail)
-        pb_head_cam_xyz = world_to_camera_view(C.scene, frontal_cam, pb_head)
-        # get Icosphere global pos: contained in the last col of "matrix_world"
-        ico_loc_xyz = Vector(ico.matrix_world.transposed()[3][0:3])
-        ico_cam_xyz = world_to_camera_view(C.scene, frontal_cam, ico_loc_xyz)
-        data[(ico_bone, ico.name)] = {"bone_tail": pb_tail_cam_xyz,
-                                      "bone_head": pb_head_cam_xyz,
-                                      "ico_pos": ico_cam_xyz}
-    CAM_COORD_POSITIONS.append(data)
-
-# CAM_COORD_POSITIONS[2163][("LeftHand", "Icosphere.016")]
-# CAM_COORD_POSITIONS[2163][("RightHand", "Icosphere.015")]
-# CAM_COORD_POSITIONS[2163]
-
-asdf = [(x["frame"],
-         x[("RightHand", "Icosphere.015")]["bone_head"][:2],
-         x[("RightHand", "Icosphere.015")]["ico_pos"][:2])
-        for x in CAM_COORD_POSITIONS]
-print("\n".join(str(x) for x in asdf))
-
-# pb = pose_bones["RightHand"]
-# lico = icospheres[-1][1]
-# breakpoint()
-
-
-# C.scene.frame_current = 2150
-# pose_bones["RightHand"].head
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+        C.scene.render.image_settings.file_format = "PNG"
+    #
+    C.scene.render.ffmpeg.format = "MPEG4"
+    C.scene.render.ffmpeg.codec = "H264"
+    C.scene.render.ffmpeg.audio_codec = "NONE"
+    C.scene.render.ffmpeg.constant_rate_factor = "LOSSLESS"  # also HIGH, MEDIUM...
+    C.scene.render.image_settings.color_depth = "16"
+    C.scene.render.image_settings.compression = 50
+    C.scene.render.image_settings.color_mode = "BW"  # "RGBA"
+
+    # set all 3D screens to RENDERED mode
+    set_shading_mode(INIT_SHADING_MODE, D.screens)
+
+    # set fullscreen
+    if INIT_3D_MAXIMIZED:
+        maximize_layout_3d_area()
+
+    # select and delete all objects
+    bpy.ops.object.select_all(action="SELECT")
+    bpy.ops.object.delete()
+    purge_unused_data()
+
+    # add frontal cam
+    bpy.ops.object.camera_add(location=FRONTAL_CAM_LOC,
+                              rotation=FRONTAL_CAM_ROT)
+    frontal_cam = C.object
+    C.object.name = FRONTAL_CAM_NAME
+    C.object.data.name = FRONTAL_CAM_NAME
+    C.object.data.lens = FRONTAL_CAM_FOCAL_LENGTH
+    # add side cam
+    bpy.ops.object.camera_add(location=SIDE_CAM_LOC, rotation=SIDE_CAM_ROT)
+    side_cam = C.object
+    C.object.name = SIDE_CAM_NAME
+    C.object.data.name = SIDE_CAM_NAME
+    C.object.data.lens = SIDE_CAM_FOCAL_LENGTH
+    C.scene.camera = frontal_cam
+
+    # define glowing material for all spheres
+    sphere_material = bpy.data.materials.new(name="sphere_material")
+    sphere_material.use_nodes = True
+    bsdf_inputs = sphere_material.node_tree.nodes["Principled BSDF"].inputs
+    bsdf_inputs["Specular"].default_value = 0
+    bsdf_inputs["Emission"].default_value = DOT_COLOR
+    return frontal_cam, side_cam, sphere_material
+
+
+def load_armature(mvnx_path, schema_path=None):
+    """
+    Loads the given MVNX as an armature via ``load_mvnx_into_blender``,
+    placed at ``MVNX_POSITION`` and ``MVNX_ROTATION``.
 
+    :returns: A tuple ``(armature, seq_len)`` with the armature object and
+      its number of keyframes.
+    """
+    try:
+        armature, mvnx = load_mvnx_into_blender(C, mvnx_path, schema_path,
+                                                connectivity="CONNECTED", # "INDIVIDUAL",
+                                                scale=1.0,
+                                                frame_start=FRAME_START,
+                                                inherit_rotations=True,
+                                                add_identity_pose=False,
+                                                add_t_pose=False,
+                                                verbose=True)
+    except lxml.etree.DocumentInvalid:
+        print("MNVX didn't pass given validation schema.",
+              "Remove schema path to bypass validation.")
+        raise
+    seq_len = len(armature.animation_data.action.fcurves[0].keyframe_points)
+    # readjust armature position
+    armature.location = MVNX_POSITION
+    armature.rotation_euler = MVNX_ROTATION
+    return armature, seq_len
 
 
+def remove_armature(armature):
+    """
+    Removes the given armature object, together with its armature data and
+    action, so that no data blocks pile up when loading many MVNX files in
+    the same session. Objects parented to it (the dots) are kept.
+    """
+    for child in armature.children:
+        child.parent = None
+    arm_data = armature.data
+    action = (armature.animation_data.action
+              if armature.animation_data is not None else None)
+    D.objects.remove(armature, do_unlink=True)
+    if arm_data is not None and arm_data.users == 0:
+        D.armatures.remove(arm_data)
+    if action is not None and action.users == 0:
+        D.actions.remove(action)
+
+
+def add_dots(sphere_material, dot_spec=DOT_SPEC):
+    """
+    Creates the dots of the given spec, without parent, in their own
+    collection. All dots are linked duplicates of a single low-poly
+    icosphere mesh, built directly via ``bmesh`` instead of the operator
+    stack, so adding dots doesn't add mesh data blocks or scene updates.
 
+    :returns: A dict ``{dot_name: object}``.
+    """
+    bm = bmesh.new()
+    # the radius parameter was (misleadingly) called diameter before 3.0
+    radius_kw = "radius" if bpy.app.version >= (3, 0, 0) else "diameter"
+    bmesh.ops.create_icosphere(bm, subdivisions=DOT_SUBDIVISIONS,
+                               **{radius_kw: DOT_DIAMETER / 2})
+    mesh = D.meshes.new("DotMesh")
+    bm.to_mesh(mesh)
+    bm.free()
+    mesh.materials.append(sphere_material)
+    #
+    collection = D.collections.new(DOTS_COLLECTION_NAME)
+    C.scene.collection.children.link(collection)
+    dots = {}
+    for name, _, _, _ in dot_spec:
+        dots[name] = D.objects.new("Dot_" + name, mesh)
+        collection.objects.link(dots[name])
+    return dots
+
+
+def attach_dots(dots, armature, dot_spec=DOT_SPEC):
+    """
+    Parents the dots created by ``add_dots`` to the bones of the given
+    armature, at the places given by the spec (see ``mvnx_fk.DOT_SPEC``,
+    scaled by the length of the bones of this armature).
+
+    Bone-parented objects are placed relative to the tail of their bone, in
+    the bone axes (with ``y`` along the bone). Therefore, a dot at fraction
+    ``frac`` of the bone is at ``y = (frac - 1) * length``, and the extra
+    offset, given in the segment axes, is rotated into the bone axes via
+    the rest pose of the bone. This assumes that the armature space has the
+    segment axes at rest, which holds for the T-pose armatures built by
+    ``load_mvnx_into_blender``.
+    """
+    for name, seg, frac, extra in dot_spec:
+        bone = armature.data.bones[seg]
+        to_bone = bone.matrix_local.to_3x3().transposed()
+        sph = dots[name]
+        sph.parent = armature
+        sph.parent_type = "BONE"
+        sph.parent_bone = seg
+        sph.location = (to_bone @ Vector(extra) +
+                        Vector((0, frac - 1, 0))) * bone.length
 
 
+def save_ground_truth(dots, out_dir, cams):
+    """
+    2D ground truth: dot positions for all rendered frames and cameras, in
+    pixels. The world positions are read from the dot objects themselves,
+    so they match the rendered icospheres exactly. They are then projected
+    in a single vectorized pass via ``PinholeCamera``, which is checked
+    against Blender's ``world_to_camera_view`` (see ``check_projection``).
 
+    :param dots: Dict ``{dot_name: object}``, see ``add_dots``.
+    """
+    gt_frames = np.arange(C.scene.frame_start, C.scene.frame_end + 1,
+                          C.scene.frame_step)
+    gt_dot_names = list(dots)
+    gt_world = np.empty((len(gt_frames), len(gt_dot_names), 3))
+    for i, frame_i in enumerate(gt_frames):
+        C.scene.frame_set(frame_i)
+        for j, name in enumerate(gt_dot_names):
+            gt_world[i, j] = dots[name].matrix_world.translation
+    gt_data = {"frames": gt_frames, "dot_names": np.array(gt_dot_names),
+               "world": gt_world}
+    for cam in cams:
+        pinhole = PinholeCamera.from_blender(cam, C.scene)
+        gt_view = pinhole.world_to_camera_view(gt_world)
+        gt_data[cam.name + "_view"] = gt_view
+        gt_data[cam.name + "_pixels"] = pinhole.view_to_pixels(gt_view)
+        check_projection(cam, gt_world, gt_data[cam.name + "_pixels"])
+    C.scene.frame_set(C.scene.frame_start)
+    gt_path = os.path.join(out_dir, "dots_2d.npz")
+    np.savez(gt_path, **gt_data)
+    print("Saved 2D dot positions to", gt_path)
+
+
+def check_projection(cam, world, pixels, num_frames=GT_CHECK_FRAMES,
+                     tolerance=GT_TOLERANCE_PX):
+    """
+    Projects the dots of a few frames (evenly spaced) one by one with
+    Blender's ``world_to_camera_view``, and asserts that the given pixels
+    are within ``tolerance`` pixels of them.
 
+    :param world: World positions of shape ``(frames, dots, 3)``.
+    :param pixels: Their pixel coordinates of shape ``(frames, dots, 2)``,
+      as given by ``PinholeCamera.view_to_pixels``.
+    """
+    r = C.scene.render
+    w = r.resolution_x * r.resolution_percentage // 100
+    h = r.resolution_y * r.resolution_percentage // 100
+    max_err = 0.0
+    for i in np.unique(np.linspace(0, len(world) - 1, num_frames).astype(
+            int)):
+        for j, xyz in enumerate(world[i]):
+            v = world_to_camera_view(C.scene, cam, Vector(xyz))
+            err = np.hypot(v.x * w - pixels[i, j, 0],
+                           (1 - v.y) * h - pixels[i, j, 1])
+            max_err = max(max_err, float(err))
+    assert max_err <= tolerance, \
+        f"{cam.name}: ground truth is {max_err} pixels off Blender's!"
+    print("[check_projection]", cam.name, "max pixel error:", max_err)
+
+
+def setup_viewer_node():
+    """
+    Enables the compositor with a Viewer node fed by the render layers, so
+    that the pixels of each rendered frame are available in
+    ``D.images[VIEWER_IMAGE_NAME]`` without writing them to disk. Since
+    these pixels are scene-linear, the ``Standard`` view transform is set so
+    that ``render_to_pipe`` can reproduce the saved images by applying the
+    sRGB transfer function.
+    """
+    C.scene.use_nodes = True
+    tree = C.scene.node_tree
+    layers = next((n for n in tree.nodes if n.type == "R_LAYERS"), None)
+    if layers is None:
+        layers = tree.nodes.new("CompositorNodeRLayers")
+    viewer = next((n for n in tree.nodes if n.type == "VIEWER"), None)
+    if viewer is None:
+        viewer = tree.nodes.new("CompositorNodeViewer")
+    viewer.use_alpha = False
+    tree.links.new(layers.outputs["Image"], viewer.inputs["Image"])
+    C.scene.view_settings.view_transform = "Standard"
+
+
+def linear_to_srgb(x):
+    """
+    :returns: The given linear intensities (clipped to ``[0, 1]``) with the
+      sRGB transfer function applied.
+    """
+    x = np.clip(x, 0, 1)
+    return np.where(x <= 0.0031308, 12.92 * x,
+                    1.055 * np.power(x, 1 / 2.4) - 0.055)
 
 
+def render_to_pipe(out_path, output_args=FFMPEG_OUTPUT_ARGS):
+    """
+    Renders the frames of the scene range, one by one, and pipes them as raw
+    16-bit grayscale into an ``ffmpeg`` subprocess that encodes them into
+    ``out_path``, at ``FPS / FRAME_STEP`` frames per second. This avoids
+    writing and decoding intermediate PNGs. Requires ``setup_viewer_node``.
+    """
+    r = C.scene.render
+    w = r.resolution_x * r.resolution_percentage // 100
+    h = r.resolution_y * r.resolution_percentage // 100
+    framerate = r.fps / C.scene.frame_step
+    cmd = ["ffmpeg", "-y", "-loglevel", "error",
+           "-f", "rawvideo", "-pix_fmt", "gray16le", "-s", f"{w}x{h}",
+           "-framerate", str(framerate), "-i", "-"] + output_args + [out_path]
+    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+    pixels = np.empty(w * h * 4, dtype=np.float32)
+    try:
+        for frame_i in range(C.scene.frame_start, C.scene.frame_end + 1,
+                             C.scene.frame_step):
+            C.scene.frame_set(frame_i)
+            bpy.ops.render.render()
+            D.images[VIEWER_IMAGE_NAME].pixels.foreach_get(pixels)
+            # RGBA rows from the bottom: take the gray level and flip
+            gray = linear_to_srgb(pixels.reshape(h, w, 4)[::-1, :, 0])
+            proc.stdin.write(np.round(gray * 65535).astype("<u2").tobytes())
+            print("Piped frame", frame_i, "to", out_path)
+    finally:
+        proc.stdin.close()
+        proc.wait()
+    assert proc.returncode == 0, f"ffmpeg exited with code {proc.returncode}"
+
+
+def render_missing_frames(out_dir, mvnx_path, resume=True, force=False):
+    """
+    Resumable version of ``bpy.ops.render.render(animation=True)`` for PNG
+    output: only the frames of the scene range without a valid PNG in
+    ``out_dir`` are rendered, range by range. Progress is recorded in the
+    JSON journal ``<out_dir>/JOURNAL_NAME`` after every written frame, via a
+    ``render_write`` handler. The PNGs themselves are the source of truth,
+    so an interrupted job resumes where it stopped when run again.
+
+    Existing PNGs are only kept if the journal shows that they come from a
+    render with the same settings (MVNX, resolution, camera and frame
+    range), see ``journal_mismatches``. PNGs without a journal are treated
+    as coming from a different render.
+
+    :param resume: If false, all frames are rendered.
+    :param force: If false and the existing PNGs come from a different
+      render, a ``RuntimeError`` is raised. If true, all frames are rendered
+      again instead.
+    """
+    frame_start, frame_end = C.scene.frame_start, C.scene.frame_end
+    frame_step = C.scene.frame_step
+    r = C.scene.render
+    settings = {"mvnx": os.path.abspath(mvnx_path),
+                "resolution": [r.resolution_x * r.resolution_percentage // 100,
+                               r.resolution_y * r.resolution_percentage // 100],
+                "camera": C.scene.camera.name,
+                "frame_start": frame_start, "frame_end": frame_end,
+                "frame_step": frame_step}
+    journal_path = os.path.join(out_dir, JOURNAL_NAME)
+    n_total = len(range(frame_start, frame_end + 1, frame_step))
+    ranges = missing_frame_ranges(out_dir, frame_start, frame_end,
+                                  frame_step)
+    n_missing = sum(len(range(s, e + 1, frame_step)) for s, e in ranges)
+    mismatches = journal_mismatches(journal_path, settings)
+    if mismatches is None:
+        mismatches = [] if n_missing == n_total else [JOURNAL_NAME]
+    if resume and mismatches and not force:
+        raise RuntimeError(
+            f"{out_dir} holds PNGs of a different render (mismatching " +
+            f"{mismatches}, see {journal_path}). Use --force to render " +
+            "all frames again")
+    if not resume or mismatches:
+        # the journal will vouch for the PNGs in the range: remove the old
+        # ones, in case this render is interrupted
+        remove_frames(out_dir, frame_start, frame_end, frame_step)
+        ranges, n_missing = [(frame_start, frame_end)], n_total
+    print("[render_missing_frames]", n_total - n_missing, "of", n_total,
+          "frames already rendered,", len(ranges), "ranges to render")
+    journal = dict(settings, n_total=n_total, n_done=n_total - n_missing,
+                   pending_ranges=ranges, last_frame=None,
+                   finished=not ranges)
+
+    def save_journal():
+        tmp_path = journal_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(journal, f, indent=2)
+        os.replace(tmp_path, journal_path)
+
+    def on_render_write(scene, *args):
+        journal["n_done"] += 1
+        journal["last_frame"] = scene.frame_current
+        save_journal()
+
+    save_journal()
+    bpy.app.handlers.render_write.append(on_render_write)
+    try:
+        for i, (s, e) in enumerate(ranges):
+            C.scene.frame_start, C.scene.frame_end = s, e
+            bpy.ops.render.render(animation=True)
+            journal["pending_ranges"] = ranges[i + 1:]
+            save_journal()
+    finally:
+        bpy.app.handlers.render_write.remove(on_render_write)
+        C.scene.frame_start, C.scene.frame_end = frame_start, frame_end
+    journal["finished"] = True
+    save_journal()
+
+
+def render_armature(armature, seq_len, mvnx_path, out_dir, dots, cams,
+                    render=False, render_start=None, render_end=None,
+                    pipe_video=False, resume=True, force=False):
+    """
+    Given an MVNX armature loaded via ``load_armature`` into the scene
+    prepared by ``setup_scene``, attaches the dots to it, saves the 2D
+    ground truth and (optionally) renders the sequence into ``out_dir``.
+
+    :param render_start: If given, first frame to render (for sharded
+      rendering). Must be ``FRAME_START`` plus a multiple of ``FRAME_STEP``,
+      so that the shards render exactly the frames of the full sequence.
+    :param render_end: If given, last frame to render.
+    :param pipe_video: If true, frames are rendered via ``render_to_pipe``
+      into ``<out_dir>/<mvnx_name>.mkv`` instead of images.
+    :param resume: If true and rendering PNGs, only the frames without a
+      valid PNG in ``out_dir`` are rendered (see ``render_missing_frames``).
+    :param force: If true and rendering PNGs, existing PNGs of a different
+      render are rendered again instead of raising an exception.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    # subtract 1 because [start, end] instead of [start, end) and Blender
+    # would render a frame at the end with no animation
+    frame_end = FRAME_START + seq_len - 1
+    if FRAME_END is not None:
+        assert FRAME_END > FRAME_START, "Frame end must be bigger than start!"
+        frame_end = min(frame_end, int(FRAME_END))
+    C.scene.frame_start = FRAME_START
+    C.scene.frame_end = frame_end
+    # restrict rendering to the given shard
+    if render_start is not None:
+        assert (render_start - FRAME_START) % FRAME_STEP == 0, \
+            "render_start must be FRAME_START plus a multiple of FRAME_STEP!"
+        C.scene.frame_start = max(render_start, FRAME_START)
+    if render_end is not None:
+        C.scene.frame_end = min(render_end, frame_end)
+    #
+    attach_dots(dots, armature)
+    save_ground_truth(dots, out_dir, cams)
+    C.scene.render.filepath = os.path.join(out_dir, "")
+    if render and pipe_video:
+        render_to_pipe(os.path.join(
+            out_dir, os.path.basename(mvnx_path) + PIPE_VIDEO_EXT))
+    elif render and C.scene.render.image_settings.file_format == "PNG":
+        render_missing_frames(out_dir, mvnx_path, resume, force)
+    elif render:
+        bpy.ops.render.render(animation=True)
 
 
-# bpy.ops.screen.animation_play()
+# ###########################################################################
+# # MAIN ROUTINE
+# ###########################################################################
 
-C.scene.camera = frontal_cam
-if RENDER_HEADLESS:
-    bpy.ops.render.render(animation=True)
+def main():
+    """
+    """
+    parser = ArgumentParserForBlender()
+    parser.add_argument("-x", "--mvnx", type=str, nargs="+", required=True,
+                        help="MVNX motion capture file(s) to be loaded. " +
+                        "If more than one, they are rendered one after " +
+                        "the other in the same Blender session, each into " +
+                        "<output_dir>/<mvnx_name>/")
+    parser.add_argument("-S", "--mvnx_schema", type=str, default=None,
+                        help="XML validation schema for the given MVNX (optional)")
+    parser.add_argument("-r", "--render_headless", action="store_true",
+                        help="If given, this script will actually render out")
+    parser.add_argument("-o", "--output_dir", default=os.path.expanduser("~"),
+                        type=str, help="Output dir for the renderings")
+    parser.add_argument("-p", "--resolution_percentage", type=int, default=100,
+                        help="Smaller resolution -> faster (but worse) render")
+    parser.add_argument("-v", "--as_video", action="store_true",
+                        help="if given, MP4 is exported (noisy background)")
+    parser.add_argument("-P", "--pipe_video", action="store_true",
+                        help="If given with -r, frames are piped into a " +
+                        "lossless ffmpeg video instead of saved as PNG")
+    parser.add_argument("--no_resume", action="store_true",
+                        help="If given, all PNGs are rendered again, " +
+                        "instead of only the missing or invalid ones")
+    parser.add_argument("--force", action="store_true",
+                        help="If given, PNGs in the output dir that come " +
+                        "from a different render (see the journal) are " +
+                        "rendered again, instead of stopping with an error")
+    parser.add_argument("--render_start", type=int, default=None,
+                        help="First frame to render (for sharded rendering). " +
+                        "Must be FRAME_START plus a multiple of FRAME_STEP")
+    parser.add_argument("--render_end", type=int, default=None,
+                        help="Last frame to render (for sharded rendering)")
+    args = parser.parse_args()
+
+    batch = len(args.mvnx) > 1
+    if batch:
+        assert args.render_headless, \
+            "Multiple MVNX files are only supported with -r!"
+        assert args.render_start is None and args.render_end is None, \
+            "Sharded rendering is only supported for a single MVNX!"
+    #
+    frontal_cam, side_cam, sphere_material = setup_scene(
+        args.resolution_percentage, args.as_video)
+    dots = add_dots(sphere_material)
+    if args.pipe_video:
+        setup_viewer_node()
+    for i, mvnx_path in enumerate(args.mvnx):
+        out_dir = args.output_dir
+        if batch:
+            out_dir = os.path.join(out_dir, os.path.basename(mvnx_path))
+        print("[%d/%d] Processing %s" % (i + 1, len(args.mvnx), mvnx_path))
+        t0 = time.time()
+        armature = None
+        try:
+            armature, seq_len = load_armature(mvnx_path, args.mvnx_schema)
+            render_armature(
+                armature, seq_len, mvnx_path, out_dir, dots,
+                (frontal_cam, side_cam), args.render_headless,
+                args.render_start, args.render_end, args.pipe_video,
+                not args.no_resume, args.force)
+        except Exception as e:
+            if not batch:
+                raise
+            print("Something went wrong with", mvnx_path, ":", e)
+        finally:
+            # in batch mode, free every armature (also if it failed), so
+            # that it doesn't show up in the next renders. A single MVNX is
+            # kept, to allow for interactive inspection
+            if batch and armature is not None:
+                remove_armature(armature)
+                purge_unused_data([D.actions, D.armatures])
+        print("[%d/%d] Done in %.1fs" % (i + 1, len(args.mvnx),
+                                         time.time() - t0))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+# -*- coding:utf-8 -*-
+
+
+"""
+Point-light stimulus renderer without Blender. It produces the same kind of
+video as ``render_dots.py`` (white dots on black background, from one of its
+cameras), but the dots are computed via forward kinematics (``mvnx_fk``),
+projected with ``pinhole_camera`` and rasterized with NumPy, in parallel.
+Usage example::
+
+  python render_dots_numpy.py -x ~/github-work/dance-mocap/mvnx_files/ILF12_20191207_SEQ1_REC-001.mvnx -o /tmp/ILF12.mp4 -c FrontalCam -j 8
+
+The frames are streamed as raw 8-bit grayscale to an ``ffmpeg`` subprocess
+(see ``FFMPEG_OUTPUT_ARGS``, lossless H264 by default). With ``-o -`` the raw
+frames are written to stdout instead, so they can be piped to any encoder::
+
+  python render_dots_numpy.py -x $MVNX -o - | ffmpeg -f rawvideo -pix_fmt gray -s 1920x1080 -framerate 15 -i - out.mkv
+
+Like in ``render_dots.py``, every ``frame_step``-th MVNX frame is rendered,
+so the output frame rate is ``fps / frame_step``. Each dot is drawn as an
+anti-aliased disc of ``DOT_DIAMETER`` meters, whose size in pixels depends
+on its distance to the camera. Frames are rendered in chunks by a pool of
+worker processes, with a bounded number of chunks in flight, so memory
+stays constant regardless of the length of the sequence.
+
+Check the -h flag for help.
+"""
+
+import os
+import sys
+import subprocess
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+#
+import numpy as np
+#
+from mvnx import Mvnx
+from mvnx_fk import ForwardKinematics, DOT_SPEC
+from pinhole_camera import PinholeCamera, transform_points, CAMERAS, \
+    RESOLUTION_WH, MVNX_POSITION, MVNX_ROTATION
+from render_sequence import FRAME_START, FRAME_STEP
+
+
+__author__ = "Andres FR"
+
+
+###############################################################################
+### GLOBALS
+###############################################################################
+DOT_DIAMETER = 0.04  # meters
+# the emission of the Blender dots (DOT_COLOR in render_dots.py) saturates,
+# so they are rendered white
+DOT_GRAY = 255
+BACKGROUND_GRAY = 0
+# frames per worker task. Each pending chunk takes chunk_size * w * h bytes
+CHUNK_SIZE = 8
+# max. number of disc pixels evaluated at once by render_frames. Each one
+# takes a few float64/int64 temporaries, i.e. some tens of bytes
+MAX_PATCH_PIXELS = 2 ** 20
+FFMPEG_OUTPUT_ARGS = ["-c:v", "libx264", "-preset", "veryfast", "-qp", "0",
+                      "-pix_fmt", "yuv420p"]
+
+
+###############################################################################
+### GEOMETRY
+###############################################################################
+def project_dots(mvnx, camera, frame_start=FRAME_START, frame_step=FRAME_STEP,
+                 dot_spec=DOT_SPEC, dot_diameter=DOT_DIAMETER):
+    """
+    :param mvnx: An ``Mvnx`` object.
+    :param camera: A ``PinholeCamera``.
+    :returns: A tuple ``(frame_idxs, pixels, radii)``, with the indexes of
+      the rendered normal frames, the pixel coordinates of every dot of
+      shape ``(frames, dots, 2)``, and their radius in pixels, of shape
+      ``(frames, dots)``. Dots behind the camera have radius 0.
+    """
+    _, _, frames = mvnx.extract_frame_info(
+        columnar=True, fields=["position", "orientation"], dtype=np.float64)
+    frame_idxs = np.arange(frame_start, len(frames["index"]), frame_step)
+    fk = ForwardKinematics.from_mvnx(mvnx)
+    _, seg_idxs, offsets = fk.dot_offsets(dot_spec)
+    world = transform_points(
+        fk.world_points(frames["position"][frame_idxs],
+                        frames["orientation"][frame_idxs], seg_idxs, offsets),
+        MVNX_POSITION, MVNX_ROTATION)
+    view = camera.world_to_camera_view(world)
+    depth = view[..., 2]
+    radii = np.where(depth > 0, (dot_diameter / 2) * camera.focal_px /
+                     np.where(depth > 0, depth, 1), 0)
+    return frame_idxs, camera.view_to_pixels(view), radii
+
+
+###############################################################################
+### RASTERIZATION
+###############################################################################
+def render_frames(pixels, radii, resolution_wh, dot_gray=DOT_GRAY,
+                  background_gray=BACKGROUND_GRAY,
+                  max_patch_pixels=MAX_PATCH_PIXELS):
+    """
+    Rasterizes the given dots as anti-aliased discs: the intensity of each
+    pixel is the approximate fraction of it covered by the disc, i.e.
+    ``radius + 0.5 - distance`` clipped to ``[0, 1]``. Overlapping dots are
+    combined via maximum coverage.
+
+    All dots of all frames are rasterized together, without a Python loop
+    over dots: each disc is evaluated on a square patch covering its
+    bounding box (cropped to the image), and dots are processed in batches
+    of similar patch size, with at most ``max_patch_pixels`` patch pixels
+    per batch. The patches of a batch are then scattered into the ``uint8``
+    output at once.
+
+    :param pixels: Dot centers of shape ``(frames, dots, 2)``, in pixels
+      (see ``PinholeCamera.view_to_pixels``).
+    :param radii: Dot radii of shape ``(frames, dots)``, in pixels.
+    :returns: A ``uint8`` array of shape ``(frames, height, width)``.
+    """
+    w, h = resolution_wh
+    frames = np.full((radii.shape[0], h, w), background_gray, dtype=np.uint8)
+    # gray is monotonic in coverage, so max coverage is max (or min) gray
+    combine = np.maximum if dot_gray >= background_gray else np.minimum
+    fs, ds = np.nonzero(radii > 0)
+    (cx, cy), r = pixels[fs, ds].T, radii[fs, ds]
+    # pixels whose center is closer than r + 0.5 get some coverage
+    xs = np.maximum(np.floor(cx - r - 0.5), 0).astype(np.int64)
+    xe = np.minimum(np.ceil(cx + r + 0.5), w).astype(np.int64)
+    ys = np.maximum(np.floor(cy - r - 0.5), 0).astype(np.int64)
+    ye = np.minimum(np.ceil(cy + r + 0.5), h).astype(np.int64)
+    sizes = np.maximum(xe - xs, ye - ys)
+    visible = (xe > xs) & (ye > ys)
+    order = np.nonzero(visible)[0]
+    order = order[np.argsort(sizes[order], kind="stable")]
+    sizes = sizes[order]
+    flat_frames = frames.reshape(-1)
+    #
+    beg = 0
+    while beg < len(order):
+        # dots are sorted by size, so the patches of a batch take the size
+        # of its last dot. Take as many dots as fit in max_patch_pixels
+        patch_pixels = np.arange(1, len(order) - beg + 1) * sizes[beg:] ** 2
+        end = beg + max(1, int(np.searchsorted(patch_pixels,
+                                               max_patch_pixels, "right")))
+        b, size = order[beg:end], sizes[end - 1]
+        # patch pixels beyond the image are clamped to its border. They get
+        # the coverage of the border pixel, so they are just written twice
+        grid = np.arange(size)
+        gx = np.minimum(xs[b, None] + grid, w - 1)  # (batch, size)
+        gy = np.minimum(ys[b, None] + grid, h - 1)
+        dx = gx + 0.5 - cx[b, None]
+        dy = gy + 0.5 - cy[b, None]
+        coverage = np.clip(r[b, None, None] + 0.5 - np.sqrt(
+            dy[:, :, None] ** 2 + dx[:, None, :] ** 2), 0, 1)
+        gray = np.round(background_gray + coverage *
+                        (dot_gray - background_gray)).astype(np.uint8)
+        # uncovered pixels get the background, which doesn't change the max
+        flat_idxs = (fs[b, None, None] * h + gy[:, :, None]) * w + \
+            gx[:, None, :]
+        combine.at(flat_frames, flat_idxs.ravel(), gray.ravel())
+        beg = end
+    return frames
+
+
+def _render_chunk(pixels, radii, resolution_wh, dot_gray, background_gray):
+    """
+    Worker function: renders the given chunk and returns its raw bytes.
+    """
+    return render_frames(pixels, radii, resolution_wh, dot_gray,
+                         background_gray).tobytes()
+
+
+###############################################################################
+### OUTPUT
+###############################################################################
+def open_encoder(out_path, resolution_wh, framerate,
+                 output_args=FFMPEG_OUTPUT_ARGS):
+    """
+    :returns: A ``subprocess.Popen`` running ``ffmpeg`` that reads raw
+      ``gray`` frames of the given size from its stdin and encodes them into
+      ``out_path``.
+    """
+    w, h = resolution_wh
+    cmd = ["ffmpeg", "-y", "-loglevel", "error",
+           "-f", "rawvideo", "-pix_fmt", "gray", "-s", f"{w}x{h}",
+           "-framerate", str(framerate), "-i", "-"] + output_args + [out_path]
+    return subprocess.Popen(cmd, stdin=subprocess.PIPE)
+
+
+def render_video(pixels, radii, out_stream, resolution_wh, num_workers=1,
+                 chunk_size=CHUNK_SIZE, dot_gray=DOT_GRAY,
+                 background_gray=BACKGROUND_GRAY):
+    """
+    Renders all frames in chunks, in parallel, and writes them in order to
+    the given binary stream. At most ``2 * num_workers`` chunks are pending
+    at any time, i.e. memory is bounded by ``2 * num_workers * chunk_size``
+    frames of one byte per pixel. With a single worker, chunks are rendered
+    in this process, since sending the frames between processes takes
+    longer than rendering them.
+
+    :returns: The number of written frames.
+    """
+    chunks = [(i, min(i + chunk_size, len(radii)))
+              for i in range(0, len(radii), chunk_size)]
+    if num_workers == 1:
+        for n, (beg, end) in enumerate(chunks, 1):
+            out_stream.write(_render_chunk(
+                pixels[beg:end], radii[beg:end], resolution_wh, dot_gray,
+                background_gray))
+            print("[render_video] chunk", n, "/", len(chunks),
+                  file=sys.stderr)
+        return len(radii)
+    max_pending = 2 * num_workers
+    with ProcessPoolExecutor(num_workers) as executor:
+        pending = {}
+        next_submit, next_write = 0, 0
+        while next_write < len(chunks):
+            while (next_submit < len(chunks) and
+                   len(pending) < max_pending):
+                beg, end = chunks[next_submit]
+                pending[next_submit] = executor.submit(
+                    _render_chunk, pixels[beg:end], radii[beg:end],
+                    resolution_wh, dot_gray, background_gray)
+                next_submit += 1
+            fut = pending[next_write]
+            wait([fut], return_when=FIRST_COMPLETED)
+            out_stream.write(fut.result())
+            del pending[next_write]
+            next_write += 1
+            print("[render_video] chunk", next_write, "/", len(chunks),
+                  file=sys.stderr)
+    return len(radii)
+
+
+# ###########################################################################
+# # MAIN ROUTINE
+# ###########################################################################
+def main():
+    """
+    """
+    parser = ArgumentParser()
+    parser.add_argument("-x", "--mvnx", type=str, required=True,
+                        help="MVNX motion capture file to be rendered")
+    parser.add_argument("-o", "--output", type=str, required=True,
+                        help="Output video path, or - for raw frames to " +
+                        "stdout")
+    parser.add_argument("-c", "--camera", type=str, default="FrontalCam",
+                        help="Camera, from " + str(list(CAMERAS)))
+    parser.add_argument("-p", "--resolution_percentage", type=int,
+                        default=100,
+                        help="Smaller resolution -> faster render")
+    parser.add_argument("--fps", type=float, default=None,
+                        help="Frame rate of the MVNX. Default: frameRate " +
+                        "of the MVNX subject")
+    parser.add_argument("--frame_step", type=int, default=FRAME_STEP,
+                        help="Render every n-th frame")
+    parser.add_argument("--gray", type=int, default=DOT_GRAY,
+                        help="Gray level of the dots (0-255)")
+    parser.add_argument("-j", "--num_workers", type=int,
+                        default=os.cpu_count(),
+                        help="Number of rendering processes")
+    parser.add_argument("--chunk_size", type=int, default=CHUNK_SIZE,
+                        help="Frames per rendering task")
+    args = parser.parse_args()
+
+    assert args.camera in CAMERAS, \
+        f"Error! allowed cameras: {list(CAMERAS)}"
+    resolution_wh = tuple(x * args.resolution_percentage // 100
+                          for x in RESOLUTION_WH)
+    camera = PinholeCamera.from_preset(CAMERAS[args.camera], resolution_wh)
+    m = Mvnx(args.mvnx, streaming=True)
+    fps = args.fps or float(m.mvnx.subject.attrib["frameRate"])
+    _, pixels, radii = project_dots(m, camera, frame_step=args.frame_step)
+    framerate = fps / args.frame_step
+    print("Rendering", len(radii), "frames of", resolution_wh, "at",
+          framerate, "fps", file=sys.stderr)
+    if args.output == "-":
+        render_video(pixels, radii, sys.stdout.buffer, resolution_wh,
+                     args.num_workers, args.chunk_size, args.gray)
+    else:
+        encoder = open_encoder(args.output, resolution_wh, framerate)
+        try:
+            render_video(pixels, radii, encoder.stdin, resolution_wh,
+                         args.num_workers, args.chunk_size, args.gray)
+        finally:
+            encoder.stdin.close()
+            encoder.wait()
+        assert encoder.returncode == 0, \
+            f"ffmpeg exited with code {encoder.returncode}"
+        print("Saved video to", args.output, file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
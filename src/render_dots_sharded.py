@@ -0,0 +1,265 @@
+# -*- coding:utf-8 -*-
+
+
+"""
+This script renders a single MVNX with ``render_dots.py`` using several
+headless Blender processes in parallel. The sequence of rendered frames
+(every ``FRAME_STEP``-th frame from ``FRAME_START``) is split into
+contiguous shards, and each Blender worker renders one shard via the
+``--render_start`` and ``--render_end`` flags of ``render_dots.py``. Usage
+example (16 workers, 2 threads each)::
+
+  python render_dots_sharded.py -x ~/github-work/dance-mocap/mvnx_files/ILF12_20191207_SEQ1_REC-001.mvnx -S ~/github-work/blender-mvnx-io/io_anim_mvnx/data/mvnx_schema_dance_dec19.xsd -o ~/Desktop/ILF12 -j 16 -t 2 --video ~/Desktop/ILF12/ILF12.mp4
+
+Each shard is rendered into ``<out_dir>/shards/<shard_idx>/``. A shard is
+successful if Blender exits without error and all its expected PNGs are
+valid.
+Failed shards are retried up to ``--retries`` times. Since ``render_dots.py``
+skips frames that already have a valid PNG, a retry only renders the frames
+that are missing. Finally, the outputs
+are stitched: all PNGs are moved, in order, into ``<out_dir>/png/`` (file
+names are the Blender frame numbers, so ordering is preserved), the per-shard
+``dots_2d.npz`` ground truths are merged into ``<out_dir>/dots_2d.npz``, and
+optionally the sequence is encoded into a video with ``ffmpeg``.
+
+Check the -h flag for help.
+"""
+
+import os
+import sys
+import time
+import glob
+import shutil
+import subprocess
+from argparse import ArgumentParser
+#
+import numpy as np
+#
+from mvnx import Mvnx
+from render_sequence import FRAME_START, FRAME_STEP, FPS, PNG_NAME, \
+    is_valid_png
+
+
+__author__ = "Andres FR"
+
+
+###############################################################################
+### GLOBALS
+###############################################################################
+RENDER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             "render_dots.py")
+GT_NAME = "dots_2d.npz"
+POLL_SECONDS = 1
+
+
+###############################################################################
+### HELPERS
+###############################################################################
+def count_frames(mvnx_path):
+    """
+    :returns: The number of normal frames in the given MVNX, using the
+      (cheap) frame index instead of parsing the frames.
+    """
+    m = Mvnx(mvnx_path, streaming=True)
+    return len(m.get_frame_index()["index"]) - 3
+
+
+def make_shards(frame_start, frame_end, frame_step, num_shards):
+    """
+    Splits the rendered frames ``range(frame_start, frame_end + 1,
+    frame_step)`` into ``num_shards`` contiguous shards of similar size.
+
+    :returns: A list of ``(render_start, render_end)`` inclusive pairs, where
+      every ``render_start`` is aligned to the frame step.
+    """
+    frames = np.arange(frame_start, frame_end + 1, frame_step)
+    return [(int(s[0]), int(s[-1]))
+            for s in np.array_split(frames, num_shards) if len(s)]
+
+
+def shard_frames(shard, frame_step):
+    """
+    :returns: The Blender frame numbers rendered by the given shard.
+    """
+    return range(shard[0], shard[1] + 1, frame_step)
+
+
+def missing_pngs(shard_dir, shard, frame_step):
+    """
+    :returns: The list of expected PNG paths of the shard that don't exist
+      or aren't valid (e.g. truncated by a crash), see ``is_valid_png``.
+    """
+    paths = (os.path.join(shard_dir, PNG_NAME.format(f))
+             for f in shard_frames(shard, frame_step))
+    return [p for p in paths if not is_valid_png(p)]
+
+
+def launch_shard(blender, shard, shard_dir, attempt, render_args, threads):
+    """
+    Starts a headless Blender process rendering the given shard into
+    ``shard_dir``, logging to ``shard_dir/log_<attempt>.txt``.
+
+    :returns: The ``subprocess.Popen`` object.
+    """
+    os.makedirs(shard_dir, exist_ok=True)
+    cmd = [blender, "-b", "--python-exit-code", "1"]
+    if threads is not None:
+        cmd += ["-t", str(threads)]
+    cmd += ["--python", RENDER_SCRIPT, "--"] + render_args + [
+        "-o", shard_dir, "-r",
+        "--render_start", str(shard[0]), "--render_end", str(shard[1])]
+    log = open(os.path.join(shard_dir, "log_%d.txt" % attempt), "w")
+    proc = subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT)
+    log.close()
+    return proc
+
+
+###############################################################################
+### SHARDED RENDERING
+###############################################################################
+def render_shards(blender, shards, shards_dir, render_args, num_workers,
+                  threads=None, retries=2, frame_step=FRAME_STEP):
+    """
+    Renders all shards, keeping at most ``num_workers`` Blender processes
+    running, and retrying each failed shard up to ``retries`` times.
+
+    :returns: A dict ``{shard_idx: error_message}`` of the shards that
+      failed after all retries (empty if everything was rendered).
+    """
+    todo = list(range(len(shards)))
+    attempts = {i: 0 for i in todo}
+    running = {}
+    failed = {}
+    while todo or running:
+        while todo and len(running) < num_workers:
+            i = todo.pop(0)
+            running[i] = launch_shard(
+                blender, shards[i], os.path.join(shards_dir, str(i)),
+                attempts[i], render_args, threads)
+            print("[render_shards] started shard", i, shards[i],
+                  "attempt", attempts[i])
+        time.sleep(POLL_SECONDS)
+        for i, proc in list(running.items()):
+            if proc.poll() is None:
+                continue
+            del running[i]
+            missing = missing_pngs(os.path.join(shards_dir, str(i)),
+                                   shards[i], frame_step)
+            if proc.returncode == 0 and not missing:
+                print("[render_shards] finished shard", i)
+                continue
+            error = "exit code %d, %d missing frames" % (proc.returncode,
+                                                         len(missing))
+            attempts[i] += 1
+            if attempts[i] <= retries:
+                print("[render_shards] shard", i, "failed:", error,
+                      "retrying")
+                todo.append(i)
+            else:
+                print("[render_shards] shard", i, "failed:", error)
+                failed[i] = error
+    return failed
+
+
+def stitch_shards(shards, shards_dir, out_dir, frame_step=FRAME_STEP):
+    """
+    Moves the PNGs of all shards, in order, into ``<out_dir>/png/`` and
+    merges their ground truth files into ``<out_dir>/dots_2d.npz``.
+
+    :returns: The list of stitched PNG paths, in frame order.
+    """
+    png_dir = os.path.join(out_dir, "png")
+    os.makedirs(png_dir, exist_ok=True)
+    pngs = []
+    gts = []
+    for i, shard in enumerate(shards):
+        shard_dir = os.path.join(shards_dir, str(i))
+        for f in shard_frames(shard, frame_step):
+            dst = os.path.join(png_dir, PNG_NAME.format(f))
+            shutil.move(os.path.join(shard_dir, PNG_NAME.format(f)), dst)
+            pngs.append(dst)
+        gt_path = os.path.join(shard_dir, GT_NAME)
+        if os.path.isfile(gt_path):
+            gts.append(dict(np.load(gt_path)))
+    if gts and len(gts) == len(shards):
+        merged = {k: (v if k == "dot_names" else
+                      np.concatenate([gt[k] for gt in gts]))
+                  for k, v in gts[0].items()}
+        np.savez(os.path.join(out_dir, GT_NAME), **merged)
+    return pngs
+
+
+def encode_video(pngs, out_path, framerate):
+    """
+    Encodes the given PNG paths, in order, into a video via ``ffmpeg``.
+    """
+    cmd = ["ffmpeg", "-y", "-loglevel", "error", "-f", "image2pipe",
+           "-framerate", str(framerate), "-i", "-", out_path]
+    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+    for p in pngs:
+        with open(p, "rb") as f:
+            shutil.copyfileobj(f, proc.stdin)
+    proc.stdin.close()
+    assert proc.wait() == 0, f"ffmpeg exited with code {proc.returncode}"
+
+
+# ###########################################################################
+# # MAIN ROUTINE
+# ###########################################################################
+def main():
+    """
+    """
+    parser = ArgumentParser()
+    parser.add_argument("-x", "--mvnx", type=str, required=True,
+                        help="MVNX motion capture file to be rendered")
+    parser.add_argument("-S", "--mvnx_schema", type=str, default=None,
+                        help="XML validation schema for the given MVNX")
+    parser.add_argument("-o", "--output_dir", type=str, required=True,
+                        help="Output dir for the shards and stitched frames")
+    parser.add_argument("-p", "--resolution_percentage", type=int,
+                        default=100,
+                        help="Smaller resolution -> faster (but worse) render")
+    parser.add_argument("-j", "--num_workers", type=int,
+                        default=os.cpu_count(),
+                        help="Number of parallel Blender processes")
+    parser.add_argument("-n", "--num_shards", type=int, default=None,
+                        help="Number of shards. Default: num_workers")
+    parser.add_argument("-t", "--threads", type=int, default=None,
+                        help="Render threads per Blender process")
+    parser.add_argument("--retries", type=int, default=2,
+                        help="Maximum retries per failed shard")
+    parser.add_argument("--blender", type=str, default="blender",
+                        help="Blender executable")
+    parser.add_argument("--video", type=str, default=None,
+                        help="If given, the stitched frames are encoded " +
+                        "into this video path")
+    parser.add_argument("--keep_shards", action="store_true",
+                        help="If given, shard dirs (logs) are not removed")
+    args = parser.parse_args()
+
+    n_frames = count_frames(args.mvnx)
+    frame_end = FRAME_START + n_frames - 1
+    shards = make_shards(FRAME_START, frame_end, FRAME_STEP,
+                         args.num_shards or args.num_workers)
+    print("Rendering", n_frames, "MVNX frames in", len(shards), "shards")
+    render_args = ["-x", args.mvnx, "-p", str(args.resolution_percentage)]
+    if args.mvnx_schema is not None:
+        render_args += ["-S", args.mvnx_schema]
+    shards_dir = os.path.join(args.output_dir, "shards")
+    t0 = time.time()
+    failed = render_shards(args.blender, shards, shards_dir, render_args,
+                           args.num_workers, args.threads, args.retries)
+    if failed:
+        print("Failed shards (see logs in %s):" % shards_dir, failed)
+        sys.exit(1)
+    pngs = stitch_shards(shards, shards_dir, args.output_dir)
+    print("Rendered", len(pngs), "frames in %.1fs" % (time.time() - t0))
+    if not args.keep_shards:
+        shutil.rmtree(shards_dir)
+    if args.video is not None:
+        encode_video(pngs, args.video, FPS / FRAME_STEP)
+        print("Saved video to", args.video)
+
+
+if __name__ == "__main__":
+    main()
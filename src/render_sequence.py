@@ -0,0 +1,110 @@
+# -*- coding:utf-8 -*-
+
+
+"""
+This module holds the settings and helpers of the frame sequence rendered by
+``render_dots.py`` that don't need Blender, so they can be shared with the
+scripts that drive or mimic it (``render_dots_sharded.py``,
+``render_dots_numpy.py``). Usage example::
+
+  frames = range(FRAME_START, frame_end + 1, FRAME_STEP)
+  missing = missing_frame_ranges(png_dir, FRAME_START, frame_end, FRAME_STEP)
+
+Every ``FRAME_STEP``-th frame of the MVNX is rendered, starting at
+``FRAME_START``, and saved as ``PNG_NAME.format(frame_number)``.
+"""
+
+
+import os
+import json
+
+
+__author__ = "Andres FR"
+
+
+# #############################################################################
+# ## GLOBALS
+# #############################################################################
+
+FRAME_START = 0  # 1000 # 2  # 1 is T-pose if imported with MakeWalk
+FRAME_STEP = 4
+FPS = 60
+# Blender names the frames with the frame number, padded to 4 digits. A PNG
+# is considered valid if it starts with the PNG signature and ends with the
+# IEND chunk
+PNG_NAME = "{:04d}.png"
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_IEND = b"\x00\x00\x00\x00IEND\xaeB`\x82"
+# progress journal of resumable renders, next to the PNGs
+JOURNAL_NAME = "render_journal.json"
+
+
+# #############################################################################
+# ## PNG SEQUENCES
+# #############################################################################
+
+def is_valid_png(path):
+    """
+    :returns: True if the given file exists and looks like a complete PNG
+      (signature at the beginning and IEND chunk at the end). This detects
+      truncated files from interrupted renders without decoding them.
+    """
+    try:
+        if os.path.getsize(path) < len(PNG_SIGNATURE) + len(PNG_IEND):
+            return False
+        with open(path, "rb") as f:
+            head = f.read(len(PNG_SIGNATURE))
+            f.seek(-len(PNG_IEND), os.SEEK_END)
+            return head == PNG_SIGNATURE and f.read() == PNG_IEND
+    except OSError:
+        return False
+
+
+def missing_frame_ranges(out_dir, frame_start, frame_end, frame_step):
+    """
+    :returns: A list of ``(start, end)`` inclusive ranges, aligned to the
+      frame step, covering the frames in ``out_dir`` that don't have a valid
+      PNG. Invalid PNGs are removed.
+    """
+    ranges = []
+    for f in range(frame_start, frame_end + 1, frame_step):
+        path = os.path.join(out_dir, PNG_NAME.format(f))
+        if is_valid_png(path):
+            continue
+        if os.path.exists(path):
+            os.remove(path)
+        if ranges and ranges[-1][1] == f - frame_step:
+            ranges[-1][1] = f
+        else:
+            ranges.append([f, f])
+    return [tuple(r) for r in ranges]
+
+
+def remove_frames(out_dir, frame_start, frame_end, frame_step):
+    """
+    Removes the PNGs of the given frame range from ``out_dir``, if present.
+    """
+    for f in range(frame_start, frame_end + 1, frame_step):
+        path = os.path.join(out_dir, PNG_NAME.format(f))
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def journal_mismatches(journal_path, settings):
+    """
+    Compares the settings of a render with the ones recorded in the journal
+    of a previous render into the same directory, to tell whether its PNGs
+    can be reused.
+
+    :param settings: JSON-serializable dict with the settings that determine
+      the rendered images, e.g. MVNX path, resolution, camera and frame range.
+    :returns: The list of keys of ``settings`` whose values differ from the
+      journal (empty if all match), or None if there is no journal.
+    """
+    if not os.path.isfile(journal_path):
+        return None
+    with open(journal_path) as f:
+        journal = json.load(f)
+    # compare as JSON, e.g. tuples as lists
+    settings = json.loads(json.dumps(settings))
+    return [k for k, v in settings.items() if journal.get(k) != v]
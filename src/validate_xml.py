@@ -3,10 +3,25 @@
 
 """
 https://lxml.de/validation.html
+
+Validates XML files against an XSD schema. Batch usage example, validating
+all MVNX files in a directory with 8 processes and saving a JSON report::
+
+  python validate_xml.py -x ~/datasets/mocap_library/MVNX -s mvnx_schemata/mvnx_schema_dance_dec19.xsd -j 8 -R /tmp/report.json
+
+Files are validated while being parsed with ``etree.iterparse``, clearing
+the processed elements, so memory stays bounded even on huge captures. Each
+process compiles the schema only once.
 """
 
 
+import os
+import sys
+import glob
+import json
+import time
 from os.path import basename
+from multiprocessing import Pool
 import argparse
 #
 from lxml import etree, objectify
@@ -22,16 +37,35 @@ __email__ = "aferro@em.uni-frankfurt.de"
 # ## GLOBALS
 # #############################################################################
 
+# compiled schemas by path, so each process compiles each XSD only once
+_SCHEMA_CACHE = {}
+# elements whose children are validated separately to locate schema errors
+SECTION_CONTAINERS = ("mvnx", "subject", "frames")
+
 # #############################################################################
 # ## HELPERS
 # #############################################################################
 
+def get_schema(xsd_path):
+    """
+    :returns: The compiled ``etree.XMLSchema`` for the given path. Schemas
+      are compiled once per process and then reused.
+    """
+    xsd_path = os.path.abspath(xsd_path)
+    if xsd_path not in _SCHEMA_CACHE:
+        _SCHEMA_CACHE[xsd_path] = etree.XMLSchema(file=xsd_path)
+    return _SCHEMA_CACHE[xsd_path]
+
+
 def load_and_validate(xml_path, xsd_path, raise_if_error=False):
     """
+    Parses the whole document into memory and validates it. For large files,
+    prefer ``stream_validate``, which keeps memory bounded.
+
     :param bool raise_if_error: if true, raise an exception if validation fails
     """
     x = etree.parse(xml_path, etree.ETCompatXMLParser())
-    s = etree.XMLSchema(file=xsd_path)
+    s = get_schema(xsd_path)
     if raise_if_error:
         s.assertValid(x)
         is_valid = True
@@ -40,6 +74,147 @@ def load_and_validate(xml_path, xsd_path, raise_if_error=False):
     # in case an exception wasn't thrown
     return is_valid
 
+
+def locate_schema_errors(xml_path, schema,
+                         containers=SECTION_CONTAINERS):
+    """
+    The streaming validator of libxml2 doesn't keep track of the source
+    lines, so its errors are reported at line 0 once the whole document
+    has been parsed. This function finds the actual lines by parsing the
+    XML again (without schema) and validating every section separately,
+    i.e. every element whose parent is one of the ``containers`` (e.g. each
+    ``<frame>``, or the ``<segments>`` of the subject). Sections are cleared
+    once validated, so memory stays bounded.
+
+    .. note::
+      This requires all sections to be declared as global elements in the
+      schema (as in the MVNX schemata). Errors in the structure of the
+      containers themselves (e.g. a missing section) aren't found here.
+
+    :param containers: Local names of the elements that aren't validated
+      as a whole, but section by section.
+    :returns: A list of errors, as dicts with ``line``, ``column`` and
+      ``message``, in file order.
+    """
+    errors = []
+    context = etree.iterparse(xml_path, events=("end",), huge_tree=True)
+    for _, elt in context:
+        parent = elt.getparent()
+        if (parent is None or etree.QName(elt).localname in containers or
+                etree.QName(parent).localname not in containers):
+            continue
+        if not schema.validate(elt):
+            errors.extend({"line": x.line, "column": x.column,
+                           "message": x.message} for x in schema.error_log)
+        elt.clear()
+        while elt.getprevious() is not None:
+            del parent[0]
+    del context
+    return errors
+
+
+def stream_validate(xml_path, xsd_path):
+    """
+    Validates the given XML while parsing it with ``etree.iterparse``. Every
+    element is cleared once closed, so memory stays bounded.
+
+    :returns: A JSON-serializable report in the form ``{"path": xml_path,
+      "valid": bool, "errors": [...], "seconds": float}``, where each error is
+      a dict with ``line``, ``column`` and ``message``. Since the streaming
+      validator doesn't provide line numbers, failed files are validated
+      again section by section to find them (see ``locate_schema_errors``).
+      If that doesn't find the errors, the ones of the streaming validator
+      are reported, with ``line`` 0.
+    """
+    t0 = time.time()
+    report = {"path": os.path.abspath(xml_path), "valid": True, "errors": []}
+    schema = get_schema(xsd_path)
+    # parse errors are collected in a global log, which may hold entries
+    # from previously validated files
+    etree.clear_error_log()
+    try:
+        context = etree.iterparse(xml_path, events=("end",), schema=schema,
+                                  huge_tree=True)
+        for _, elt in context:
+            elt.clear()
+            while elt.getprevious() is not None:
+                del elt.getparent()[0]
+        del context
+    except (etree.XMLSyntaxError, OSError) as e:
+        report["valid"] = False
+        entries = getattr(e, "error_log", None) or []
+        report["errors"] = [{"line": x.line, "column": x.column,
+                             "message": x.message} for x in entries]
+        if not report["errors"]:
+            report["errors"] = [{"line": getattr(e, "lineno", 0) or 0,
+                                 "column": 0, "message": str(e)}]
+        # schema errors come without lines: find them
+        if any(err["line"] == 0 for err in report["errors"]):
+            try:
+                located = locate_schema_errors(xml_path, schema)
+            except (etree.XMLSyntaxError, OSError):
+                located = []
+            if located:
+                report["errors"] = located
+    report["seconds"] = time.time() - t0
+    return report
+
+
+def _init_worker(xsd_path):
+    """
+    Pool initializer: compiles the schema once per worker process.
+    """
+    get_schema(xsd_path)
+
+
+def _stream_validate_star(args):
+    """
+    """
+    return stream_validate(*args)
+
+
+def batch_validate(xml_paths, xsd_path, num_workers=None):
+    """
+    Validates the given files in parallel via ``stream_validate``.
+
+    :param int num_workers: Number of processes. Defaults to all CPUs.
+    :returns: A JSON-serializable report with the per-file reports under
+      ``files``, in the same order as ``xml_paths``.
+    """
+    t0 = time.time()
+    if len(xml_paths) == 1:
+        # no need for a pool
+        reports = [stream_validate(xml_paths[0], xsd_path)]
+    else:
+        with Pool(num_workers, initializer=_init_worker,
+                  initargs=(xsd_path,)) as pool:
+            reports = pool.map(_stream_validate_star,
+                               [(p, xsd_path) for p in xml_paths],
+                               chunksize=1)
+    return {"xsd_path": os.path.abspath(xsd_path),
+            "seconds": time.time() - t0,
+            "n_valid": sum(r["valid"] for r in reports),
+            "n_invalid": sum(not r["valid"] for r in reports),
+            "files": reports}
+
+
+def expand_paths(paths, pattern="*.mvnx"):
+    """
+    :param paths: Collection of file paths, glob patterns and/or directories.
+      Directories are expanded into their files matching ``pattern``.
+    :returns: A sorted list of file paths, without duplicates.
+    """
+    result = set()
+    for p in paths:
+        p = os.path.expanduser(p)
+        if os.path.isdir(p):
+            result.update(glob.glob(os.path.join(p, pattern)))
+        elif glob.has_magic(p):
+            result.update(glob.glob(p))
+        else:
+            result.add(p)
+    return sorted(result)
+
 # #############################################################################
 # ## MAIN ROUTINE
 # #############################################################################
@@ -49,26 +224,45 @@ def main():
     """
     # parse arguments from command line:
     parser = argparse.ArgumentParser(description="Synch and trim MVN")
-    parser.add_argument("-x", "--xml_path",
-                        help="Absolute path to the XML file to validate",
+    parser.add_argument("-x", "--xml_path", nargs="+",
+                        help="Path(s) to the XML file(s) to validate. " +
+                        "Directories and glob patterns are expanded",
                         type=str, required=True)
     parser.add_argument("-s", "--xsd_path",
                         help="Abspath to the XML schema to validate against",
                         type=str, required=True)
     parser.add_argument("-I", "--raise_if_error",
-                        help="If given and validation fails, raise exception.",
+                        help="If given and validation fails, exit with " +
+                        "an error.",
                         action="store_true")
+    parser.add_argument("-p", "--pattern", type=str, default="*.mvnx",
+                        help="Files to validate inside given directories")
+    parser.add_argument("-j", "--num_workers", type=int, default=None,
+                        help="Number of processes for batch validation")
+    parser.add_argument("-R", "--report_path", type=str, default=None,
+                        help="If given, a JSON report is saved here")
     args = parser.parse_args()
 
     # main globals
-    XML_PATH = args.xml_path
+    XML_PATHS = expand_paths(args.xml_path, args.pattern)
     XSD_PATH = args.xsd_path
     RAISE_IF_ERROR = args.raise_if_error
+    REPORT_PATH = args.report_path
 
-    is_valid = load_and_validate(XML_PATH, XSD_PATH, RAISE_IF_ERROR)
-
-    msg = "[VALIDATION PASSED]:" if is_valid else "[VALIDATION FAILED]:"
-    print(msg, basename(XML_PATH), basename(XSD_PATH))
+    report = batch_validate(XML_PATHS, XSD_PATH, args.num_workers)
+    for r in report["files"]:
+        msg = "[VALIDATION PASSED]:" if r["valid"] else "[VALIDATION FAILED]:"
+        print(msg, basename(r["path"]), basename(XSD_PATH),
+              "(%.2fs)" % r["seconds"])
+        for err in r["errors"]:
+            print("  line %d, column %d: %s" % (
+                err["line"], err["column"], err["message"]))
+    if REPORT_PATH is not None:
+        with open(REPORT_PATH, "w") as f:
+            json.dump(report, f, indent=2)
+        print("saved report to", REPORT_PATH)
+    if RAISE_IF_ERROR and report["n_invalid"] > 0:
+        sys.exit("%d files failed validation" % report["n_invalid"])
 
 
 if __name__ == "__main__":
@@ -0,0 +1,54 @@
+# -*- coding:utf-8 -*-
+
+
+"""
+Shared pytest fixtures. The modules in ``src`` import each other as top-level
+modules, so ``src`` is added to the path. Test captures are generated with
+``mvnx_synth``, so no real recordings are needed.
+"""
+
+
+import os
+import sys
+#
+import pytest
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), "src")
+sys.path.insert(0, SRC_DIR)
+
+from mvnx_synth import write_synthetic_mvnx  # noqa: E402
+
+
+__author__ = "Andres FR"
+
+
+SCHEMA_PATH = os.path.join(os.path.dirname(SRC_DIR), "mvnx_schemata",
+                           "mvnx_schema_dance_dec19.xsd")
+SYNTH_DURATION_S = 2
+SYNTH_FPS = 60
+
+
+@pytest.fixture(scope="session")
+def synth_mvnx(tmp_path_factory):
+    """
+    Path to a short synthetic MVNX capture, shared by all tests (read only).
+    """
+    path = str(tmp_path_factory.mktemp("mvnx") / "synth.mvnx")
+    write_synthetic_mvnx(path, SYNTH_DURATION_S, SYNTH_FPS)
+    return path
+
+
+@pytest.fixture
+def synth_mvnx_copy(synth_mvnx, tmp_path):
+    """
+    :returns: A function ``f(relpath)`` that copies the synthetic capture to
+      ``tmp_path / relpath`` and returns the new path.
+    """
+    def copy(relpath):
+        dst = tmp_path / relpath
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        with open(synth_mvnx, "rb") as fi, open(dst, "wb") as fo:
+            fo.write(fi.read())
+        return str(dst)
+    return copy
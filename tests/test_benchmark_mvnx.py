@@ -0,0 +1,95 @@
+# -*- coding:utf-8 -*-
+
+
+"""
+Tests for ``benchmark_mvnx`` and the ``mvnx_synth`` command line.
+"""
+
+
+import os
+import sys
+import json
+import subprocess
+#
+import pytest
+#
+import benchmark_mvnx
+from mvnx import Mvnx
+from mvnx_cache import MvnxCache
+from validate_xml import stream_validate
+from conftest import SRC_DIR, SCHEMA_PATH, SYNTH_DURATION_S, SYNTH_FPS
+
+
+__author__ = "Andres FR"
+
+
+def bench_crash(mvnx_path, work_dir):
+    """
+    Benchmark whose process dies without a result, like when killed by OOM.
+    """
+    os._exit(3)
+
+
+def test_run_benchmark(synth_mvnx, tmp_path):
+    """
+    Runs report the processed frames and measurements.
+    """
+    r = benchmark_mvnx.run_benchmark("stream_columnar", synth_mvnx,
+                                     str(tmp_path))
+    assert r["error"] is None
+    assert r["n_frames"] == SYNTH_DURATION_S * SYNTH_FPS
+    assert r["peak_rss_bytes"] >= r["baseline_rss_bytes"] > 0
+    assert r["frames_per_second"] > 0
+
+
+def test_dead_process_is_reported(synth_mvnx, tmp_path, monkeypatch):
+    """
+    If the benchmark process dies, its exit code is reported instead of
+    waiting forever.
+    """
+    monkeypatch.setitem(benchmark_mvnx.BENCHMARKS, "crash", bench_crash)
+    r = benchmark_mvnx.run_benchmark("crash", synth_mvnx, str(tmp_path))
+    assert r["error"] == "exit code 3"
+    assert r["benchmark"] == "crash"
+
+
+def test_cache_load_setup(synth_mvnx, tmp_path):
+    """
+    The cache loading benchmark fails without a cache, and the cache is
+    built by its setup, outside of the measurement.
+    """
+    work_dir = str(tmp_path)
+    with pytest.raises(AssertionError, match="No cache entry"):
+        benchmark_mvnx.bench_cache_load(synth_mvnx, work_dir)
+    r = benchmark_mvnx.run_benchmark("cache_load", synth_mvnx, work_dir)
+    assert r["error"] is None
+    assert r["n_frames"] == SYNTH_DURATION_S * SYNTH_FPS
+    cache = MvnxCache(os.path.join(work_dir, "cache"))
+    assert cache.is_valid(synth_mvnx)
+
+
+def test_command_lines(tmp_path):
+    """
+    The generator writes valid captures of the requested length, and the
+    benchmark saves one result per run.
+    """
+    path = str(tmp_path / "gen.mvnx")
+    subprocess.run([sys.executable, os.path.join(SRC_DIR, "mvnx_synth.py"),
+                    "-o", path, "-d", "0.5", "--fps", "40", "-s", "25",
+                    "-n", "0", "-F", "jointAngle"], check=True)
+    assert stream_validate(path, SCHEMA_PATH)["errors"] == []
+    m = Mvnx(path)
+    _, _, frames = m.extract_frame_info(columnar=True)
+    assert len(frames["index"]) == 20
+    assert frames["position"].shape[1] == len(m.extract_segments()) == 25
+    assert "jointAngle" in frames and "velocity" not in frames
+    #
+    work_dir = str(tmp_path / "bench")
+    subprocess.run([sys.executable,
+                    os.path.join(SRC_DIR, "benchmark_mvnx.py"),
+                    "-w", work_dir, "-d", "0.5",
+                    "-b", "stream_columnar", "cache_load"], check=True)
+    with open(os.path.join(work_dir, "benchmark_results.json")) as f:
+        results = json.load(f)
+    assert [(r["benchmark"], r["n_frames"], r["error"]) for r in results] == [
+        ("stream_columnar", 30, None), ("cache_load", 30, None)]
@@ -0,0 +1,164 @@
+# -*- coding:utf-8 -*-
+
+
+"""
+Tests for ``mvnx``.
+"""
+
+
+import numpy as np
+import pytest
+from lxml import etree
+from lxml.builder import E
+#
+from mvnx import Mvnx, str_to_vec, bulk_str_to_array
+
+
+__author__ = "Andres FR"
+
+
+def node_texts(frames):
+    """
+    :returns: The given list of frame dicts, with the XML nodes that weren't
+      converted (e.g. ``footContacts``) replaced by their text, since the
+      in-memory mode yields objectified nodes and the streaming mode plain
+      ``etree`` nodes.
+    """
+    return [{k: (v.text if isinstance(v, etree._Element) else v)
+             for k, v in f.items()} for f in frames]
+
+
+def test_streaming_matches_in_memory(synth_mvnx):
+    """
+    Streaming the frames from disk extracts the same frames as loading the
+    whole tree.
+    """
+    meta, config, frames = Mvnx(synth_mvnx).extract_frame_info()
+    s_meta, s_config, s_frames = Mvnx(
+        synth_mvnx, streaming=True).extract_frame_info()
+    assert s_meta == meta and s_config == config
+    assert len(frames) > 0
+    assert node_texts(s_frames) == node_texts(frames)
+
+
+def test_columnar_matches_frames(synth_mvnx):
+    """
+    The columnar arrays hold the same values as the frame dicts, with one
+    row per normal frame.
+    """
+    m = Mvnx(synth_mvnx)
+    _, _, frames = m.extract_frame_info()
+    _, config, arrays = m.extract_frame_info(columnar=True, dtype=np.float64)
+    assert len(config) == 3
+    n = len(frames)
+    for k in ("index", "time", "ms"):
+        assert arrays[k].dtype == np.int64
+        np.testing.assert_array_equal(arrays[k], [f[k] for f in frames])
+    pos = np.array([f["position"] for f in frames])
+    assert arrays["position"].shape == (n, pos.shape[1] // 3, 3)
+    np.testing.assert_array_equal(arrays["position"].reshape(n, -1), pos)
+    assert arrays["orientation"].shape[-1] == 4
+    assert arrays["footContacts"].dtype == bool
+    np.testing.assert_array_equal(
+        arrays["footContacts"],
+        [[int(x) for x in f["footContacts"].text.split()] for f in frames])
+
+
+def test_bulk_decode():
+    """
+    Bulk decoding gives the same values as ``str_to_vec``, and reports the
+    frames with a wrong number of values.
+    """
+    texts = ["1.5 -2 3e-3 4", "5 6 7 8.25"]
+    result = bulk_str_to_array(texts, (2, 2), np.float64)
+    assert result.shape == (2, 2, 2)
+    for row, t in zip(result, texts):
+        assert row.ravel().tolist() == str_to_vec(E.position(t))
+    with pytest.raises(ValueError, match=r"frames \[11\]"):
+        bulk_str_to_array(texts + ["1 2 3"], (2, 2), frame_ids=[9, 10, 11],
+                          field="position")
+
+
+def test_frame_index(synth_mvnx):
+    """
+    The index has the attributes and byte offset of every frame, config
+    frames included.
+    """
+    index = Mvnx(synth_mvnx, streaming=True).get_frame_index()
+    _, _, frames = Mvnx(synth_mvnx).extract_frame_info(columnar=True)
+    n = len(frames["index"])
+    assert len(index["offset"]) == len(index["index"]) + 1 == n + 4
+    np.testing.assert_array_equal(index["ms"][3:], frames["ms"])
+    assert (index["index"][:3] == -1).all()
+    with open(synth_mvnx, "rb") as f:
+        data = f.read()
+    assert all(data[o:o + 7] == b"<frame " for o in index["offset"][:-1])
+    assert data[index["offset"][-1]:].startswith(b"</frames>")
+
+
+def test_ranged_extraction(synth_mvnx):
+    """
+    Ranged extraction returns the frames with keys in ``[start, stop)``, in
+    both modes, and the config frames.
+    """
+    _, config, frames = Mvnx(synth_mvnx).extract_frame_info(columnar=True)
+    start, stop = frames["ms"][10], frames["ms"][25]
+    for streaming in (False, True):
+        _, r_config, r_frames = Mvnx(
+            synth_mvnx, streaming=streaming).extract_frame_info(
+                columnar=True, start=start, stop=stop, key="ms")
+        assert r_config == config
+        assert r_frames.keys() == frames.keys()
+        for k, v in frames.items():
+            np.testing.assert_array_equal(r_frames[k], v[10:25], err_msg=k)
+    _, _, r_frames = Mvnx(synth_mvnx, streaming=True).extract_frame_info(
+        columnar=True, start=frames["index"][-1] + 1)
+    assert len(r_frames["index"]) == 0
+
+
+def test_field_projection(synth_mvnx):
+    """
+    Only the requested fields (plus the frame attributes) are extracted,
+    with the same values as a full extraction.
+    """
+    fields = ["position", "jointAngle"]
+    _, _, frames = Mvnx(synth_mvnx).extract_frame_info(columnar=True)
+    for streaming in (False, True):
+        m = Mvnx(synth_mvnx, streaming=streaming)
+        _, _, r_frames = m.extract_frame_info(columnar=True, fields=fields)
+        assert set(r_frames) == {"index", "time", "ms"} | set(fields)
+        for k, v in r_frames.items():
+            np.testing.assert_array_equal(v, frames[k], err_msg=k)
+        _, _, r_dicts = m.extract_frame_info(fields=fields)
+        assert {"orientation", "footContacts"}.isdisjoint(r_dicts[0])
+        assert set(fields) <= set(r_dicts[0])
+
+
+def test_export_round_trip(synth_mvnx, tmp_path):
+    """
+    Exported files parse back to the same frames, when copied (in both
+    modes, optionally ranged) and when written from edited arrays.
+    """
+    _, config, frames = Mvnx(synth_mvnx).extract_frame_info(columnar=True)
+    for streaming in (False, True):
+        path = str(tmp_path / ("copy_%d.mvnx" % streaming))
+        Mvnx(synth_mvnx, streaming=streaming).export(path)
+        _, e_config, e_frames = Mvnx(path).extract_frame_info(
+            columnar=True)
+        assert e_config == config
+        for k, v in frames.items():
+            np.testing.assert_array_equal(e_frames[k], v, err_msg=k)
+    # ranged copy
+    path = str(tmp_path / "ranged.mvnx")
+    Mvnx(synth_mvnx, streaming=True).export(path, start=frames["index"][5],
+                                            stop=frames["index"][9])
+    _, _, e_frames = Mvnx(path).extract_frame_info(columnar=True)
+    np.testing.assert_array_equal(e_frames["index"], frames["index"][5:9])
+    # from edited arrays
+    path = str(tmp_path / "arrays.mvnx")
+    edited = dict(frames, position=frames["position"] + 1)
+    Mvnx(synth_mvnx).export(path, normal_frames=edited, float_fmt="%.9g")
+    _, _, e_frames = Mvnx(path).extract_frame_info(columnar=True)
+    assert e_frames.keys() == frames.keys()
+    for k, v in edited.items():
+        np.testing.assert_array_equal(e_frames[k], v, err_msg=k)
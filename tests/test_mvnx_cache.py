@@ -0,0 +1,105 @@
+# -*- coding:utf-8 -*-
+
+
+"""
+Tests for ``mvnx_cache`` and the cached mode of ``mvnx.Mvnx``.
+"""
+
+
+import os
+#
+import numpy as np
+#
+from mvnx import Mvnx
+from mvnx_cache import MvnxCache
+
+
+__author__ = "Andres FR"
+
+
+def test_cached_mvnx(synth_mvnx_copy, tmp_path, capsys):
+    """
+    The first load parses the file and fills the cache, later loads read the
+    same frames, skeleton and frame index from the cache.
+    """
+    path = synth_mvnx_copy("synth.mvnx")
+    cache = MvnxCache(str(tmp_path / "cache"))
+    meta, config, frames = Mvnx(path).extract_frame_info(
+        columnar=True, dtype=np.float64)
+    skeleton = Mvnx(path).extract_skeleton()
+    Mvnx(path, cache=cache).get_frame_index()
+    assert "saved to cache" in capsys.readouterr().out
+    #
+    m = Mvnx(path, cache=cache)
+    assert "loaded from cache" in capsys.readouterr().out
+    assert m._frame_index is not None
+    c_meta, c_config, c_frames = m.extract_frame_info(columnar=True,
+                                                      dtype=np.float64)
+    assert c_meta == meta and c_config == config
+    assert c_frames.keys() == frames.keys()
+    for k, v in frames.items():
+        np.testing.assert_array_equal(c_frames[k], v, err_msg=k)
+    # other dtypes are cast, and ranges and fields still apply
+    _, _, c_frames = m.extract_frame_info(columnar=True, start=10, stop=20,
+                                          fields=["position"])
+    assert c_frames["position"].dtype == np.float32
+    assert set(c_frames) == {"index", "time", "ms", "position"}
+    np.testing.assert_array_equal(c_frames["index"], np.arange(10, 20))
+    c_joints, c_seg_detail, c_names = m.extract_skeleton()
+    assert c_names == skeleton[2]
+    assert ([(j[0], j[1], j[3]) for j in c_joints] ==
+            [(j[0], j[1], j[3]) for j in skeleton[0]])
+    for k, v in skeleton[1].items():
+        np.testing.assert_array_equal(c_seg_detail[k], v)
+
+
+def test_invalidation(synth_mvnx_copy, tmp_path):
+    """
+    Entries stay valid if only the mtime of the file changes, and become
+    invalid if its contents change.
+    """
+    path = synth_mvnx_copy("synth.mvnx")
+    cache = MvnxCache(str(tmp_path / "cache"))
+    cache.save(path, {"a": np.arange(3)}, {"b.xml": b"<b/>"}, {"c": 1})
+    arrays, blobs, extras = cache.load(path)
+    np.testing.assert_array_equal(arrays["a"], np.arange(3))
+    assert blobs == {"b.xml": b"<b/>"} and extras == {"c": 1}
+    assert cache.update(path, {"d": np.ones(2)})
+    assert "d" in cache.load(path)[0]
+    # touch
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    assert cache.is_valid(path)
+    # same size, different contents
+    with open(path, "r+b") as f:
+        f.seek(-10, os.SEEK_END)
+        tail = f.read()
+        f.seek(-10, os.SEEK_END)
+        f.write(tail.swapcase())
+    assert not cache.is_valid(path)
+    assert cache.load(path) is None
+    assert not cache.update(path, {"d": np.ones(2)})
+
+
+def test_eviction(synth_mvnx_copy, tmp_path):
+    """
+    Least recently used entries are evicted above the size limit, but never
+    the one just saved.
+    """
+    paths = [synth_mvnx_copy("%d.mvnx" % i) for i in range(3)]
+    arr = np.zeros(1000, dtype=np.float64)
+    cache = MvnxCache(str(tmp_path / "cache"), max_bytes=2.5 * arr.nbytes)
+    cache.save(paths[0], {"a": arr})
+    cache.save(paths[1], {"a": arr})
+    # make the first entry the most recently used
+    meta_path = os.path.join(cache.entry_dir(paths[1]), MvnxCache.META_NAME)
+    os.utime(meta_path, (0, 0))
+    assert cache.load(paths[0]) is not None
+    cache.save(paths[2], {"a": arr})
+    assert [cache.is_valid(p) for p in paths] == [True, False, True]
+    # an entry above the limit is kept until the next save
+    cache.max_bytes = 1
+    cache.save(paths[1], {"a": arr})
+    assert [cache.is_valid(p) for p in paths] == [False, True, False]
+    cache.clear()
+    assert not any(cache.is_valid(p) for p in paths)
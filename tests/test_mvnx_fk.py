@@ -0,0 +1,79 @@
+# -*- coding:utf-8 -*-
+
+
+"""
+Tests for ``mvnx_fk``.
+"""
+
+
+import numpy as np
+import pytest
+#
+from mvnx import Mvnx
+from mvnx_fk import ForwardKinematics, DOT_SPEC
+from quaternions import from_axis_angle
+
+
+__author__ = "Andres FR"
+
+
+@pytest.fixture(scope="module")
+def fk_frames(synth_mvnx):
+    """
+    :returns: The tuple ``(fk, frames)`` for the synthetic capture.
+    """
+    m = Mvnx(synth_mvnx)
+    _, _, frames = m.extract_frame_info(columnar=True, dtype=np.float64)
+    return ForwardKinematics.from_mvnx(m), frames
+
+
+def test_world_points():
+    """
+    Offsets are rotated by the (normalized) segment orientation and added
+    to its position.
+    """
+    fk = ForwardKinematics([], {("A", "p"): np.array([1.0, 0, 0])}, ["A"])
+    position = np.array([[[0, 0, 1.0]], [[2, 0, 0]]])
+    orientation = from_axis_angle(np.array([0, 0, 1.0]),
+                                  np.array([[0], [np.pi / 2]]))
+    points = fk.segment_points(position, orientation * 3, [("A", "p")])
+    np.testing.assert_allclose(points, [[[1, 0, 1]], [[2, 1, 0]]],
+                               atol=1e-12)
+
+
+def test_joints_connect_segments(fk_frames):
+    """
+    Both ends of every joint land on the same world point, i.e. the chained
+    segments of the capture are reproduced.
+    """
+    fk, frames = fk_frames
+    pos, ori = frames["position"], frames["orientation"]
+    ends1 = [tuple(j[1].split("/")) for j in fk.joints]
+    ends2 = [tuple(j[3].split("/")) for j in fk.joints]
+    assert len(ends1) == len(pos[0]) - 1
+    np.testing.assert_allclose(fk.segment_points(pos, ori, ends1),
+                               fk.segment_points(pos, ori, ends2),
+                               atol=1e-4)
+
+
+def test_dots(fk_frames):
+    """
+    There is one dot per spec entry and frame. Dots at a bone tail are at
+    the origin of the child segment, and dots at a bone head at the origin
+    of their own segment.
+    """
+    fk, frames = fk_frames
+    pos, ori = frames["position"], frames["orientation"]
+    dots = fk.dots(pos, ori)
+    assert dots.shape == (len(pos), len(DOT_SPEC), 3)
+    names = [d[0] for d in DOT_SPEC]
+    assert all(seg in fk.seg_idx for _, seg, _, _ in DOT_SPEC)
+    np.testing.assert_allclose(dots[:, names.index("RightUpperArm")],
+                               pos[:, fk.seg_idx["RightForeArm"]], atol=1e-4)
+    np.testing.assert_allclose(dots[:, names.index("Column")],
+                               pos[:, fk.seg_idx["L5"]], atol=1e-12)
+    # widened hips are beside the upper leg heads, by a fraction of the bone
+    hip = dots[:, names.index("RightHip")]
+    dist = np.linalg.norm(hip - pos[:, fk.seg_idx["RightUpperLeg"]], axis=-1)
+    np.testing.assert_allclose(dist, 0.15 * fk.bone_length("RightUpperLeg"))
+    assert fk.bone_length("RightUpperLeg") > 0
@@ -0,0 +1,102 @@
+# -*- coding:utf-8 -*-
+
+
+"""
+Tests for ``mvnx_library``.
+"""
+
+
+import os
+import json
+#
+import mvnx_library
+from conftest import SYNTH_DURATION_S
+
+
+__author__ = "Andres FR"
+
+
+def crash_on_b(mvnx, out_dir, fields=None, fps=None, fmt="csv"):
+    """
+    Extractor that kills its worker when processing a file named ``b*``.
+    """
+    if os.path.basename(out_dir).startswith("b"):
+        os._exit(1)
+    return []
+
+
+def test_worker_crash_is_reported(synth_mvnx_copy, tmp_path, monkeypatch):
+    """
+    A worker dying only marks the file that killed it as error, and the
+    files processed at the same time are not lost.
+    """
+    monkeypatch.setitem(mvnx_library.EXTRACTORS, "crash", crash_on_b)
+    paths = [synth_mvnx_copy(n + ".mvnx") for n in "abcd"]
+    manifest = mvnx_library.process_library(
+        paths, str(tmp_path / "out"), ["crash"], num_workers=2)
+    status = {os.path.basename(e["source"]): e["status"]
+              for e in manifest["files"]}
+    assert status == {"a.mvnx": "ok", "b.mvnx": "error", "c.mvnx": "ok",
+                      "d.mvnx": "ok"}
+    assert (manifest["n_ok"], manifest["n_error"]) == (3, 1)
+
+
+def test_same_name_in_different_dirs(synth_mvnx_copy, tmp_path):
+    """
+    Files with the same name in different directories get separate outputs
+    and manifest entries.
+    """
+    paths = [synth_mvnx_copy("x/rec.mvnx"), synth_mvnx_copy("y/rec.mvnx")]
+    out_dir = str(tmp_path / "out")
+    manifest = mvnx_library.process_library(paths, out_dir, ["summary"],
+                                            num_workers=2)
+    assert manifest["n_ok"] == 2
+    outputs = [e["outputs"]["summary"][0] for e in manifest["files"]]
+    assert len(set(outputs)) == 2
+    assert all(os.path.isfile(p) for p in outputs)
+
+
+def test_format_and_fps(synth_mvnx_copy, tmp_path):
+    """
+    Tables are saved in the requested format, and the summary is resampled
+    to the requested frame rate.
+    """
+    path = synth_mvnx_copy("rec.mvnx")
+    manifest = mvnx_library.process_library(
+        [path], str(tmp_path / "out"), ["tabular", "dots", "summary"],
+        fields=["position"], num_workers=1, fps=30, fmt="parquet")
+    entry = manifest["files"][0]
+    assert entry["status"] == "ok" and entry["format"] == "parquet"
+    assert all(p.endswith(".parquet") for p in entry["outputs"]["tabular"] +
+               entry["outputs"]["dots"])
+    with open(entry["outputs"]["summary"][0]) as f:
+        summary = json.load(f)
+    # 2 seconds at 60 fps, resampled to 30 fps
+    assert summary["n_frames"] == SYNTH_DURATION_S * 30
+
+
+def test_up_to_date_files_are_skipped(synth_mvnx_copy, tmp_path):
+    """
+    Rerunning skips the files already processed with the same settings, and
+    processes them again if their contents, the settings or the outputs
+    changed.
+    """
+    paths = [synth_mvnx_copy(n + ".mvnx") for n in "ab"]
+    out_dir = str(tmp_path / "out")
+
+    def run(**kwargs):
+        manifest = mvnx_library.process_library(paths, out_dir, ["summary"],
+                                                num_workers=1, **kwargs)
+        return {os.path.basename(e["source"]): e["status"]
+                for e in manifest["files"]}
+    assert run() == {"a.mvnx": "ok", "b.mvnx": "ok"}
+    assert run() == {"a.mvnx": "skipped", "b.mvnx": "skipped"}
+    # edit a, delete the output of b
+    with open(paths[0], "ab") as f:
+        f.write(b"\n")
+    manifest = mvnx_library.load_manifest(out_dir)
+    os.remove(manifest[os.path.abspath(paths[1])]["outputs"]["summary"][0])
+    assert run() == {"a.mvnx": "ok", "b.mvnx": "ok"}
+    assert run(fps=30) == {"a.mvnx": "ok", "b.mvnx": "ok"}
+    assert run(fps=30) == {"a.mvnx": "skipped", "b.mvnx": "skipped"}
+    assert run(fps=30, force=True) == {"a.mvnx": "ok", "b.mvnx": "ok"}
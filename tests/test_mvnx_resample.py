@@ -0,0 +1,82 @@
+# -*- coding:utf-8 -*-
+
+
+"""
+Tests for ``mvnx_resample``.
+"""
+
+
+import numpy as np
+#
+from mvnx import Mvnx
+from mvnx_resample import resample_frames
+from conftest import SYNTH_FPS
+
+
+__author__ = "Andres FR"
+
+
+def make_frames(n, fps=60, drop=()):
+    """
+    :returns: Columnar frames at the given rate, with timestamps rounded to
+      ms, and without the frames whose positions are in ``drop``.
+    """
+    keep = np.setdiff1d(np.arange(n), drop)
+    ms = np.round(1000 + np.arange(n) * 1000 / fps).astype(np.int64)[keep]
+    t = (ms - ms[0]) / 1000
+    return {"index": keep.astype(np.int64), "ms": ms,
+            "position": np.stack([t, 2 * t, np.zeros_like(t)], axis=-1)[
+                :, None],
+            "jointAngle": ((100 * t + 170 + 180) % 360 - 180)[:, None]}
+
+
+def test_same_fps_is_identity(synth_mvnx):
+    """
+    Resampling to the frame rate of the capture returns the same frames.
+    """
+    _, _, frames = Mvnx(synth_mvnx).extract_frame_info(
+        columnar=True, dtype=np.float64)
+    result = resample_frames(frames, SYNTH_FPS)
+    assert result.keys() == frames.keys()
+    for k, v in frames.items():
+        np.testing.assert_array_equal(result[k], v, err_msg=k)
+
+
+def test_downsample(synth_mvnx):
+    """
+    Halving the frame rate keeps every other frame, approximately (the
+    fields are low-passed).
+    """
+    _, _, frames = Mvnx(synth_mvnx).extract_frame_info(
+        columnar=True, dtype=np.float64)
+    result = resample_frames(frames, SYNTH_FPS / 2)
+    np.testing.assert_array_equal(result["ms"], frames["ms"][::2])
+    np.testing.assert_allclose(result["position"], frames["position"][::2],
+                               atol=1e-2)
+    np.testing.assert_allclose(
+        np.linalg.norm(result["orientation"], axis=-1), 1, atol=1e-6)
+
+
+def test_dropped_frames():
+    """
+    Dropped frames are filled by interpolation.
+    """
+    full = make_frames(50)
+    result = resample_frames(make_frames(50, drop=[10, 11, 30]), 60, 60)
+    np.testing.assert_array_equal(result["ms"], full["ms"])
+    np.testing.assert_allclose(result["position"], full["position"],
+                               atol=1e-3)
+
+
+def test_joint_angle_wrap():
+    """
+    Joint angles are interpolated along the shortest path across +-180.
+    """
+    frames = make_frames(30)
+    angles = frames["jointAngle"][:, 0]
+    assert (np.abs(np.diff(angles)) > 300).any()
+    result = resample_frames(frames, 120, 60, anti_alias=False)
+    out = result["jointAngle"][:, 0]
+    assert (np.abs(out) <= 180).all()
+    steps = np.abs((np.diff(out) + 180) % 360 - 180)
+    assert steps.max() < 1
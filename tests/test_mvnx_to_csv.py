@@ -0,0 +1,156 @@
+# -*- coding:utf-8 -*-
+
+
+"""
+Tests for ``mvnx_to_csv``.
+"""
+
+
+import os
+import time
+import filecmp
+#
+import numpy as np
+import pandas as pd
+import pytest
+#
+from mvnx import Mvnx
+from mvnx_to_csv import MvnxToTabular, OUTPUT_FORMATS, META_COLUMNS, \
+    TableWriter, save_tables, load_table
+
+
+__author__ = "Andres FR"
+
+
+FIELDS = ["position", "orientation", "jointAngle"]
+
+
+@pytest.fixture(scope="module")
+def tables(synth_mvnx):
+    """
+    The tables of the synthetic capture, for ``FIELDS``.
+    """
+    return MvnxToTabular(Mvnx(synth_mvnx))(FIELDS)
+
+
+def test_tables_match_frames(synth_mvnx, tables):
+    """
+    Each table has one row per normal frame, and its columns hold the frame
+    vectors in segment order.
+    """
+    m = Mvnx(synth_mvnx)
+    _, _, frames = m.extract_frame_info(columnar=True, dtype=np.float64)
+    pos = tables["position"]
+    assert len(pos) == len(frames["index"])
+    np.testing.assert_array_equal(pos["frame_idx"], frames["index"])
+    np.testing.assert_array_equal(pos["Pelvis_x"],
+                                  frames["position"][:, 0, 0])
+    np.testing.assert_array_equal(
+        pos.iloc[:, 2:].to_numpy(),
+        frames["position"].reshape(len(pos), -1))
+
+
+def test_chunks_match_tables(synth_mvnx, tables):
+    """
+    Concatenating the chunks of the chunked mode gives the whole tables.
+    """
+    tab = MvnxToTabular(Mvnx(synth_mvnx, streaming=True), chunk_size=7)
+    chunks = list(tab.iter_chunks(FIELDS))
+    assert len(chunks) > 1
+    for fld in FIELDS:
+        pd.testing.assert_frame_equal(
+            pd.concat([c[fld] for c in chunks]), tables[fld])
+
+
+@pytest.mark.parametrize("fmt", sorted(OUTPUT_FORMATS))
+def test_round_trip(tables, tmp_path, fmt):
+    """
+    Saved tables are loaded back unchanged, and a subset of their columns
+    can be loaded.
+    """
+    paths = save_tables(tables, str(tmp_path), fmt)
+    assert len(paths) == len(FIELDS)
+    for fld, path in zip(tables, paths):
+        assert path.endswith(OUTPUT_FORMATS[fmt])
+        df = load_table(path)
+        pd.testing.assert_frame_equal(df.reset_index(drop=True),
+                                      tables[fld].reset_index(drop=True))
+    cols = ["frame_idx", "Pelvis_x"]
+    df = load_table(paths[0], columns=cols)
+    assert list(df.columns) == cols
+    np.testing.assert_array_equal(df["Pelvis_x"], tables["position"][
+        "Pelvis_x"])
+
+
+def test_hdf5_chunks(tables, tmp_path):
+    """
+    HDF5 tables are appended chunk by chunk in bounded time, with the
+    ``META_COLUMNS`` as data columns, and load back whole or by column.
+    """
+    tb = pytest.importorskip("tables")
+    df = tables["position"]
+    chunks = [df.iloc[i:i + 15] for i in range(0, len(df), 15)]
+    assert len(chunks) >= 3
+    t0 = time.time()
+    with TableWriter(str(tmp_path), "hdf5") as writer:
+        for chunk in chunks:
+            writer.write({"position": chunk})
+    # with all columns as data columns, each append took several seconds
+    assert time.time() - t0 < 5
+    path = writer.outputs[0]
+    with tb.open_file(path) as h5:
+        names = h5.root.position.table.colnames
+    assert set(META_COLUMNS) <= set(names)
+    assert "Pelvis_x" not in names
+    pd.testing.assert_frame_equal(load_table(path), df)
+    cols = ["ms", "Pelvis_x"]
+    pd.testing.assert_frame_equal(load_table(path, columns=cols), df[cols])
+
+
+def test_joint_and_sensor_tables(synth_mvnx):
+    """
+    Joint angles get one column per joint axis, sensor fields one per sensor
+    axis, in the order of the MVNX joints and sensors.
+    """
+    m = Mvnx(synth_mvnx)
+    fields = ["jointAngle", "sensorFreeAcceleration"]
+    tables = MvnxToTabular(m)(fields)
+    _, _, frames = m.extract_frame_info(columnar=True, dtype=np.float64,
+                                        fields=fields)
+    joints = [j[0] for j in m.extract_skeleton()[0]]
+    sensors = m.extract_sensors()
+    for fld, names in zip(fields, (joints, sensors)):
+        df = tables[fld]
+        assert list(df.columns[2:5]) == [names[0] + "_" + a for a in "xyz"]
+        assert len(df.columns) == 2 + 3 * len(names)
+        np.testing.assert_array_equal(df.iloc[:, 2:].to_numpy(),
+                                      frames[fld].reshape(len(df), -1))
+
+
+@pytest.mark.parametrize("single_file", [False, True])
+@pytest.mark.parametrize("fmt", sorted(OUTPUT_FORMATS))
+def test_chunked_files_match(synth_mvnx, tables, tmp_path, fmt, single_file):
+    """
+    Writing the tables chunk by chunk gives the same files as writing them
+    at once: byte-identical for CSV, and with the same tables otherwise.
+    """
+    name = "synth" if single_file else None
+    (tmp_path / "whole").mkdir()
+    (tmp_path / "chunked").mkdir()
+    whole = save_tables(tables, str(tmp_path / "whole"), fmt,
+                        single_file_name=name)
+    tab = MvnxToTabular(Mvnx(synth_mvnx, streaming=True), chunk_size=7)
+    with TableWriter(str(tmp_path / "chunked"), fmt,
+                     single_file_name=name) as writer:
+        for dataframes in tab.iter_chunks(FIELDS):
+            writer.write(dataframes)
+    assert ([os.path.basename(p) for p in writer.outputs] ==
+            [os.path.basename(p) for p in whole])
+    keys = FIELDS if (single_file and fmt == "hdf5") else [None]
+    for path, chunked_path in zip(whole, writer.outputs):
+        if fmt == "csv":
+            assert filecmp.cmp(path, chunked_path, shallow=False)
+        for key in keys:
+            pd.testing.assert_frame_equal(
+                load_table(chunked_path, key=key).reset_index(drop=True),
+                load_table(path, key=key).reset_index(drop=True))
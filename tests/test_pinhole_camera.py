@@ -0,0 +1,82 @@
+# -*- coding:utf-8 -*-
+
+
+"""
+Tests for ``pinhole_camera``.
+"""
+
+
+import numpy as np
+#
+from pinhole_camera import PinholeCamera, euler_to_matrix, \
+    transform_points, FRONTAL_CAM, SENSOR_WIDTH
+
+
+__author__ = "Andres FR"
+
+
+def test_euler_xyz_order():
+    """
+    Blender's XYZ Euler rotation is ``Rz @ Ry @ Rx``.
+    """
+    def rx(a):
+        c, s = np.cos(a), np.sin(a)
+        return np.array([[1, 0, 0], [0, c, -s], [0, s, c]])
+
+    def ry(a):
+        c, s = np.cos(a), np.sin(a)
+        return np.array([[c, 0, s], [0, 1, 0], [-s, 0, c]])
+
+    def rz(a):
+        c, s = np.cos(a), np.sin(a)
+        return np.array([[c, -s, 0], [s, c, 0], [0, 0, 1]])
+    x, y, z = 0.3, -1.1, 2.0
+    np.testing.assert_allclose(euler_to_matrix((x, y, z)),
+                               rz(z) @ ry(y) @ rx(x), atol=1e-12)
+
+
+def test_looks_down_by_default():
+    """
+    With zero rotation, the camera looks along -Z: points below it project
+    to the image center, at their distance.
+    """
+    cam = PinholeCamera((1, 2, 10), (0, 0, 0), 50, (200, 100))
+    view = cam.world_to_camera_view(np.array([1.0, 2, 4]))
+    np.testing.assert_allclose(view, [0.5, 0.5, 6])
+    np.testing.assert_allclose(cam.view_to_pixels(view), [100, 50])
+
+
+def test_projection():
+    """
+    Lateral offsets scale with focal length over depth. The sensor spans
+    the larger dimension, pixels are square and image y points up in view
+    coordinates (down in pixels).
+    """
+    w, h = 200, 100
+    cam = PinholeCamera((0, 0, 0), (0, 0, 0), 36, (w, h))
+    assert cam.focal_px == 36 / SENSOR_WIDTH * w
+    # 1m right and 0.5m up (camera frame), at 10m depth
+    pixels = cam.world_to_pixels(np.array([[1.0, 0.5, -10]]))
+    np.testing.assert_allclose(pixels, [[w / 2 + cam.focal_px / 10,
+                                         h / 2 - cam.focal_px / 20]])
+    # behind the camera
+    view = cam.world_to_camera_view(np.array([[0, 0, 1.0], [0, 0, 0]]))
+    assert not cam.in_view(view).any()
+    np.testing.assert_allclose(view[1], [0.5, 0.5, 0])
+
+
+def test_frontal_cam_vectorized():
+    """
+    The frontal cam looks at the origin, and batched projection matches
+    the projection of single points.
+    """
+    cam = PinholeCamera.from_preset(FRONTAL_CAM)
+    x, _, z = FRONTAL_CAM["location"]
+    view = cam.world_to_camera_view(np.array([0, 0.04, z]))
+    np.testing.assert_allclose(view, [0.5, 0.5, x], atol=1e-12)
+    rng = np.random.default_rng(0)
+    points = transform_points(rng.normal(size=(5, 4, 3)), (0, 0, 1),
+                              (0, 0, 0.1))
+    batch = cam.world_to_pixels(points)
+    assert batch.shape == (5, 4, 2)
+    np.testing.assert_allclose(batch[3, 2], cam.world_to_pixels(points[3, 2]))
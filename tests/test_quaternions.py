@@ -0,0 +1,119 @@
+# -*- coding:utf-8 -*-
+
+
+"""
+Tests for ``quaternions``.
+"""
+
+
+import numpy as np
+import pytest
+#
+from quaternions import normalize, multiply, rotate, relative_rotation, \
+    angular_distance, make_continuous, slerp, from_axis_angle, \
+    to_rotation_matrix, from_rotation_matrix, to_euler, from_euler
+
+
+__author__ = "Andres FR"
+
+
+def random_quaternions(shape, seed=0):
+    """
+    :returns: Random unit quaternions of the given shape plus ``(4,)``.
+    """
+    return normalize(np.random.default_rng(seed).normal(size=shape + (4,)))
+
+
+def axis_matrix(axis, angle):
+    """
+    :returns: The matrix of the rotation by ``angle`` about the given axis.
+    """
+    c, s = np.cos(angle), np.sin(angle)
+    i = "xyz".index(axis)
+    j, k = (i + 1) % 3, (i + 2) % 3
+    rot = np.eye(3)
+    rot[j, j], rot[j, k], rot[k, j], rot[k, k] = c, -s, s, c
+    return rot
+
+
+def test_rotation_matrix():
+    """
+    Matrices rotate like the quaternions, compose like them and convert
+    back to them (up to sign).
+    """
+    q1, q2 = random_quaternions((2, 5))
+    v = np.random.default_rng(1).normal(size=(5, 3))
+    rot1, rot2 = to_rotation_matrix(q1), to_rotation_matrix(q2)
+    np.testing.assert_allclose(np.einsum("nij,nj->ni", rot1, v),
+                               rotate(q1, v), atol=1e-12)
+    np.testing.assert_allclose(to_rotation_matrix(multiply(q1, q2)),
+                               rot1 @ rot2, atol=1e-12)
+    q = from_rotation_matrix(rot1)
+    np.testing.assert_allclose(q, np.sign(q1[:, :1]) * q1, atol=1e-12)
+    # a rotation by 90 degrees about z
+    q = from_axis_angle(np.array([0, 0, 2.0]), np.pi / 2)
+    np.testing.assert_allclose(rotate(q, np.array([1.0, 0, 0])), [0, 1, 0],
+                               atol=1e-12)
+
+
+@pytest.mark.parametrize("order", ["ZXY", "XYZ", "YZX", "zxy", "xzy"])
+def test_euler(order):
+    """
+    Intrinsic angles compose as ``R_a @ R_b @ R_c`` and extrinsic ones as
+    ``R_c @ R_b @ R_a``. Converting back gives the same angles.
+    """
+    rng = np.random.default_rng(2)
+    angles = rng.uniform(-np.pi, np.pi, size=(20, 3))
+    angles[:, 1] /= 2
+    q = from_euler(angles, order)
+    for n in (0, 7):
+        mats = [axis_matrix(a, x) for a, x in zip(order.lower(), angles[n])]
+        if order.islower():
+            mats = mats[::-1]
+        np.testing.assert_allclose(to_rotation_matrix(q[n]),
+                                   mats[0] @ mats[1] @ mats[2], atol=1e-12)
+    np.testing.assert_allclose(to_euler(q, order), angles, atol=1e-9)
+
+
+def test_relative_and_distance():
+    """
+    The relative rotation recovers the child orientation in the parent
+    frame, and the distance is its angle (sign-agnostic).
+    """
+    parent, local = random_quaternions((2, 4), seed=3)
+    child = multiply(parent, local)
+    np.testing.assert_allclose(relative_rotation(parent, child), local,
+                               atol=1e-12)
+    q = from_axis_angle(np.array([1.0, 1, 0]), 0.3)
+    np.testing.assert_allclose(angular_distance(parent, multiply(parent, q)),
+                               0.3, atol=1e-9)
+    np.testing.assert_allclose(angular_distance(parent, -parent), 0,
+                               atol=1e-6)
+
+
+def test_slerp():
+    """
+    SLERP hits the endpoints, moves at constant angular speed along the
+    shortest path, and handles (almost) equal quaternions.
+    """
+    q0 = from_axis_angle(np.array([0, 0, 1.0]), 0.2)
+    q1 = from_axis_angle(np.array([0, 0, 1.0]), 1.0)
+    np.testing.assert_allclose(slerp(q0, q1, 0.0), q0, atol=1e-12)
+    np.testing.assert_allclose(slerp(q0, q1, 1.0), q1, atol=1e-12)
+    w = np.linspace(0, 1, 5)[:, None]
+    expected = from_axis_angle(np.array([0, 0, 1.0]), 0.2 + 0.8 * w[:, 0])
+    np.testing.assert_allclose(slerp(q0, q1, w), expected, atol=1e-12)
+    np.testing.assert_allclose(slerp(q0, -q1, w), expected, atol=1e-12)
+    np.testing.assert_allclose(slerp(q0, q0, 0.5), q0, atol=1e-12)
+
+
+def test_make_continuous():
+    """
+    Sign flips between consecutive quaternions are removed, along any axis.
+    """
+    q = from_axis_angle(np.array([0, 1.0, 0]), np.linspace(0, 3, 30))
+    flipped = q * np.where(np.arange(30) % 3 == 1, -1, 1)[:, None]
+    np.testing.assert_allclose(make_continuous(flipped), q)
+    np.testing.assert_allclose(
+        make_continuous(np.stack([flipped, -flipped], axis=1), axis=0),
+        np.stack([q, -q], axis=1))
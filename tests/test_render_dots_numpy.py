@@ -0,0 +1,114 @@
+# -*- coding:utf-8 -*-
+
+
+"""
+Tests for ``render_dots_numpy``.
+"""
+
+
+import io
+#
+import numpy as np
+import pytest
+#
+from mvnx import Mvnx
+from pinhole_camera import PinholeCamera, CAMERAS
+from render_dots_numpy import render_frames, render_video, project_dots
+
+
+__author__ = "Andres FR"
+
+
+WH = (160, 120)
+
+
+def test_disc_area():
+    """
+    The total coverage of a disc inside the image is its area.
+    """
+    radius = 10.3
+    frames = render_frames(np.array([[[80.2, 60.7]]]), np.array([[radius]]),
+                           WH, dot_gray=255, background_gray=0)
+    assert frames.shape == (1, WH[1], WH[0]) and frames.dtype == np.uint8
+    area = frames.astype(np.float64).sum() / 255
+    assert abs(area - np.pi * radius ** 2) < 0.01 * np.pi * radius ** 2
+    assert frames[0, 60, 80] == 255 and frames[0, 0, 0] == 0
+
+
+def test_cropping_and_overlap():
+    """
+    Dots are cropped to the image, overlapping dots are combined via max,
+    and dots with radius 0 or outside the image aren't drawn.
+    """
+    pixels = np.array([[[0, 0], [5, 5], [500, 500], [80, 60]],
+                       [[80, 60], [80, 60], [80, 60], [80, 60]]], dtype=float)
+    radii = np.array([[4, 3, 9, 0], [2, 1000, 0, 0]], dtype=float)
+    frames = render_frames(pixels, radii, WH, dot_gray=200,
+                           background_gray=10)
+    assert frames[0].max() == 200 and frames[0, 0, 0] == 200
+    assert frames[0, 60, 80] == 10 and frames[0, -1, -1] == 10
+    # the huge dot covers the whole image
+    assert (frames[1] == 200).all()
+
+
+def render_frames_per_dot(pixels, radii, resolution_wh, dot_gray,
+                          background_gray):
+    """
+    Reference rasterizer, drawing the dots one by one on their bounding box.
+    """
+    w, h = resolution_wh
+    frames = np.full((len(radii), h, w), background_gray, dtype=np.uint8)
+    combine = np.maximum if dot_gray >= background_gray else np.minimum
+    for f, d in zip(*np.nonzero(radii > 0)):
+        (cx, cy), r = pixels[f, d], radii[f, d]
+        xs, xe = max(int(np.floor(cx - r - 0.5)), 0), \
+            min(int(np.ceil(cx + r + 0.5)), w)
+        ys, ye = max(int(np.floor(cy - r - 0.5)), 0), \
+            min(int(np.ceil(cy + r + 0.5)), h)
+        if xs >= xe or ys >= ye:
+            continue
+        dx = np.arange(xs, xe) + 0.5 - cx
+        dy = np.arange(ys, ye) + 0.5 - cy
+        coverage = np.clip(
+            r + 0.5 - np.sqrt(dy[:, None] ** 2 + dx[None, :] ** 2), 0, 1)
+        patch = np.round(background_gray + coverage *
+                         (dot_gray - background_gray)).astype(np.uint8)
+        region = frames[f, ys:ye, xs:xe]
+        combine(region, patch, out=region)
+    return frames
+
+
+@pytest.mark.parametrize("max_patch_pixels", [1, 500, 2 ** 20])
+@pytest.mark.parametrize("grays", [(255, 0), (40, 200)])
+def test_batches_match_reference(max_patch_pixels, grays):
+    """
+    The batched rasterization gives the same frames as drawing the dots one
+    by one, for any batch size, also with huge and partially visible dots.
+    """
+    rng = np.random.default_rng(0)
+    pixels = rng.uniform(-30, 190, size=(6, 17, 2))
+    radii = rng.uniform(0, 12, size=(6, 17))
+    radii[radii < 1] = 0
+    radii[2, 3] = 500
+    frames = render_frames(pixels, radii, WH, *grays,
+                           max_patch_pixels=max_patch_pixels)
+    np.testing.assert_array_equal(
+        frames, render_frames_per_dot(pixels, radii, WH, *grays))
+
+
+def test_render_video(synth_mvnx):
+    """
+    The chunked rendering writes all frames, in order, with one or more
+    workers.
+    """
+    camera = PinholeCamera.from_preset(CAMERAS["FrontalCam"], WH)
+    idxs, pixels, radii = project_dots(Mvnx(synth_mvnx), camera,
+                                       frame_step=10)
+    assert pixels.shape == radii.shape + (2,) == (len(idxs), 17, 2)
+    assert (radii > 0).all()
+    expected = render_frames(pixels, radii, WH)
+    for num_workers in (1, 2):
+        out = io.BytesIO()
+        assert render_video(pixels, radii, out, WH, num_workers=num_workers,
+                            chunk_size=5) == len(idxs)
+        assert out.getvalue() == expected.tobytes()
@@ -0,0 +1,82 @@
+# -*- coding:utf-8 -*-
+
+
+"""
+Tests for ``render_dots_sharded``. Blender is replaced by a fake executable
+that writes the PNGs of its shard.
+"""
+
+
+import os
+import sys
+import stat
+#
+import render_dots_sharded
+from render_dots_sharded import make_shards, shard_frames, missing_pngs, \
+    render_shards, stitch_shards
+from render_sequence import FRAME_STEP, PNG_NAME, is_valid_png
+from test_render_sequence import write_png
+from conftest import SRC_DIR
+
+
+__author__ = "Andres FR"
+
+
+# writes the PNGs of the shard, truncated on the first attempt (i.e. when
+# there is a single log file in the shard dir)
+FAKE_BLENDER = """#!{python}
+import os, sys
+sys.path.insert(0, {src_dir!r})
+from render_sequence import PNG_NAME, PNG_SIGNATURE, PNG_IEND
+args = sys.argv[sys.argv.index("--") + 1:]
+out_dir = args[args.index("-o") + 1]
+start = int(args[args.index("--render_start") + 1])
+end = int(args[args.index("--render_end") + 1])
+first = len([p for p in os.listdir(out_dir) if p.startswith("log_")]) == 1
+for f in range(start, end + 1, {step}):
+    with open(os.path.join(out_dir, PNG_NAME.format(f)), "wb") as png:
+        png.write(PNG_SIGNATURE + (b"" if first else PNG_IEND))
+"""
+
+
+def test_make_shards():
+    """
+    Shards are contiguous, aligned to the frame step and cover all frames.
+    """
+    shards = make_shards(0, 99, 4, 3)
+    frames = [f for s in shards for f in shard_frames(s, 4)]
+    assert frames == list(range(0, 100, 4))
+    assert all(s % 4 == 0 for s, _ in shards)
+
+
+def test_missing_pngs(tmp_path):
+    """
+    Truncated PNGs count as missing.
+    """
+    write_png(tmp_path / PNG_NAME.format(0))
+    write_png(tmp_path / PNG_NAME.format(4), complete=False)
+    assert missing_pngs(str(tmp_path), (0, 8), 4) == [
+        str(tmp_path / PNG_NAME.format(f)) for f in (4, 8)]
+
+
+def test_truncated_shards_are_retried(tmp_path, monkeypatch):
+    """
+    A shard that exits fine but leaves truncated PNGs is rendered again.
+    """
+    blender = tmp_path / "blender"
+    blender.write_text(FAKE_BLENDER.format(
+        python=sys.executable, step=FRAME_STEP, src_dir=SRC_DIR))
+    blender.chmod(blender.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setattr(render_dots_sharded, "POLL_SECONDS", 0.05)
+    shards = make_shards(0, 39, FRAME_STEP, 3)
+    shards_dir = str(tmp_path / "shards")
+    failed = render_shards(str(blender), shards, shards_dir, [], 2,
+                           retries=0)
+    assert len(failed) == len(shards)
+    failed = render_shards(str(blender), shards, shards_dir, [], 2,
+                           retries=1)
+    assert not failed
+    pngs = stitch_shards(shards, shards_dir, str(tmp_path))
+    assert [os.path.basename(p) for p in pngs] == [
+        PNG_NAME.format(f) for f in range(0, 40, FRAME_STEP)]
+    assert all(is_valid_png(p) for p in pngs)
@@ -0,0 +1,80 @@
+# -*- coding:utf-8 -*-
+
+
+"""
+Tests for ``render_sequence``.
+"""
+
+
+import os
+import json
+#
+from render_sequence import PNG_NAME, PNG_SIGNATURE, PNG_IEND, \
+    JOURNAL_NAME, is_valid_png, missing_frame_ranges, remove_frames, \
+    journal_mismatches
+
+
+__author__ = "Andres FR"
+
+
+def write_png(path, complete=True):
+    """
+    Writes a fake PNG: signature, some bytes and, if complete, the IEND
+    chunk.
+    """
+    with open(path, "wb") as f:
+        f.write(PNG_SIGNATURE + b"\x00" * 100 + (PNG_IEND if complete
+                                                   else b""))
+
+
+def test_is_valid_png(tmp_path):
+    """
+    Only complete PNGs are valid.
+    """
+    write_png(tmp_path / "ok.png")
+    write_png(tmp_path / "truncated.png", complete=False)
+    (tmp_path / "empty.png").write_bytes(b"")
+    assert is_valid_png(str(tmp_path / "ok.png"))
+    assert not is_valid_png(str(tmp_path / "truncated.png"))
+    assert not is_valid_png(str(tmp_path / "empty.png"))
+    assert not is_valid_png(str(tmp_path / "missing.png"))
+
+
+def test_missing_frame_ranges(tmp_path):
+    """
+    Frames without a valid PNG are grouped into step-aligned ranges, and
+    invalid PNGs are removed.
+    """
+    for f in [0, 4, 16, 28]:
+        write_png(tmp_path / PNG_NAME.format(f))
+    write_png(tmp_path / PNG_NAME.format(20), complete=False)
+    assert missing_frame_ranges(str(tmp_path), 0, 30, 4) == [
+        (8, 12), (20, 24)]
+    assert not os.path.exists(tmp_path / PNG_NAME.format(20))
+    assert missing_frame_ranges(str(tmp_path), 16, 16, 4) == []
+
+
+def test_remove_frames(tmp_path):
+    """
+    Only the PNGs of the given range are removed.
+    """
+    for f in [0, 4, 8]:
+        write_png(tmp_path / PNG_NAME.format(f))
+    remove_frames(str(tmp_path), 4, 20, 4)
+    assert os.listdir(tmp_path) == [PNG_NAME.format(0)]
+
+
+def test_journal_mismatches(tmp_path):
+    """
+    The settings of a render are compared with the ones in the journal.
+    """
+    journal_path = str(tmp_path / JOURNAL_NAME)
+    settings = {"mvnx": "/data/a.mvnx", "resolution": (1920, 1080),
+                "camera": "FrontalCam", "frame_start": 0, "frame_end": 99,
+                "frame_step": 4}
+    assert journal_mismatches(journal_path, settings) is None
+    with open(journal_path, "w") as f:
+        json.dump(dict(settings, n_done=3), f)
+    assert journal_mismatches(journal_path, settings) == []
+    other = dict(settings, mvnx="/data/b.mvnx", resolution=(960, 540))
+    assert journal_mismatches(journal_path, other) == ["mvnx", "resolution"]
@@ -0,0 +1,94 @@
+# -*- coding:utf-8 -*-
+
+
+"""
+Tests for ``validate_xml``.
+"""
+
+
+import os
+import sys
+import subprocess
+#
+import validate_xml
+from conftest import SRC_DIR, SCHEMA_PATH
+
+
+__author__ = "Andres FR"
+
+
+def corrupt_frame(src_path, dst_path, frame_num):
+    """
+    Copies the MVNX adding a forbidden attribute to its ``frame_num``-th
+    ``<frame>`` tag.
+
+    :returns: The (1-based) line of the corrupted tag.
+    """
+    with open(src_path) as f:
+        lines = f.read().split("\n")
+    frame_lines = [i for i, l in enumerate(lines) if "<frame " in l]
+    i = frame_lines[frame_num]
+    lines[i] = lines[i].replace("<frame ", '<frame bogus="1" ', 1)
+    with open(dst_path, "w") as f:
+        f.write("\n".join(lines))
+    return i + 1
+
+
+def test_valid(synth_mvnx):
+    """
+    The synthetic capture passes validation.
+    """
+    report = validate_xml.stream_validate(synth_mvnx, SCHEMA_PATH)
+    assert report["valid"] and not report["errors"]
+
+
+def test_schema_error_line(synth_mvnx, tmp_path):
+    """
+    Schema errors deep into the file are reported at their actual line.
+    """
+    bad_path = str(tmp_path / "bad.mvnx")
+    line = corrupt_frame(synth_mvnx, bad_path, 100)
+    report = validate_xml.stream_validate(bad_path, SCHEMA_PATH)
+    assert not report["valid"]
+    assert [e["line"] for e in report["errors"]] == [line]
+    assert "bogus" in report["errors"][0]["message"]
+
+
+def test_syntax_error_line(synth_mvnx, tmp_path):
+    """
+    Errors of previously validated files aren't carried over, and syntax
+    errors keep the line given by the parser.
+    """
+    bad_path = str(tmp_path / "bad.mvnx")
+    corrupt_frame(synth_mvnx, bad_path, 100)
+    validate_xml.stream_validate(bad_path, SCHEMA_PATH)
+    truncated_path = str(tmp_path / "truncated.mvnx")
+    with open(synth_mvnx) as f:
+        lines = f.read().split("\n")
+    with open(truncated_path, "w") as f:
+        f.write("\n".join(lines[:len(lines) // 2]))
+    report = validate_xml.stream_validate(truncated_path, SCHEMA_PATH)
+    assert not report["valid"]
+    assert all(e["line"] > 0 for e in report["errors"])
+    assert not any("bogus" in e["message"] for e in report["errors"])
+
+
+def test_single_file_cli(synth_mvnx, tmp_path):
+    """
+    A single file is also validated in streaming mode, reporting the lines
+    of its errors, and ``-I`` exits with an error if it fails.
+    """
+    bad_path = str(tmp_path / "bad.mvnx")
+    line = corrupt_frame(synth_mvnx, bad_path, 100)
+    script = os.path.join(SRC_DIR, "validate_xml.py")
+    result = subprocess.run([sys.executable, script, "-x", synth_mvnx,
+                             "-s", SCHEMA_PATH, "-I"],
+                            capture_output=True, text=True)
+    assert result.returncode == 0
+    assert "[VALIDATION PASSED]" in result.stdout
+    result = subprocess.run([sys.executable, script, "-x", bad_path,
+                             "-s", SCHEMA_PATH, "-I"],
+                            capture_output=True, text=True)
+    assert result.returncode != 0
+    assert "[VALIDATION FAILED]" in result.stdout
+    assert "line %d," % line in result.stdout